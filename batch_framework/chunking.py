@@ -0,0 +1,88 @@
+"""
+Content-defined chunking of byte streams
+
+A chunk boundary is placed where the gear-sum of the last `WINDOW` bytes
+matches a bit mask, so boundaries move along with the content: inserting or
+removing bytes only changes the chunks around the edit, and the unchanged
+chunks keep their content hashes between uploads.
+"""
+import hashlib
+from typing import Iterable, Iterator, List
+import numpy as np
+
+__all__ = ['content_chunks', 'dropbox_content_hash']
+
+WINDOW = 48
+_GEAR = np.random.default_rng(20230801).integers(
+    0, 2 ** 32, 256, dtype=np.uint32)
+
+
+def _cut_points(data: np.ndarray, min_size: int,
+                max_size: int, mask: int) -> List[int]:
+    """Chunk ends in `data` (starting at a chunk boundary)
+
+    Returns:
+        List[int]: end offsets of the complete chunks
+    """
+    cuts = []
+    if len(data) <= WINDOW:
+        return cuts
+    csum = np.cumsum(_GEAR[data], dtype=np.uint32)
+    sums = csum[WINDOW:] - csum[:-WINDOW]
+    candidates = np.flatnonzero((sums & mask) == 0) + WINDOW + 1
+    start = 0
+    for candidate in candidates.tolist():
+        while candidate - start > max_size:
+            start += max_size
+            cuts.append(start)
+        if candidate - start >= min_size:
+            cuts.append(candidate)
+            start = candidate
+    while len(data) - start > max_size:
+        start += max_size
+        cuts.append(start)
+    return cuts
+
+
+def content_chunks(blocks: Iterable[bytes],
+                   avg_size: int = 2000000) -> Iterator[bytes]:
+    """Re-chunk a byte stream at content-defined boundaries
+
+    Args:
+        blocks (Iterable[bytes]): consecutive parts of the stream (any size)
+        avg_size (int): the targeted average chunk size. Chunks are
+            between `avg_size / 4` and `avg_size * 4` bytes
+            (except the last one).
+    Returns:
+        Iterator[bytes]: the chunks
+    """
+    min_size = max(avg_size // 4, WINDOW + 1)
+    max_size = avg_size * 4
+    # boundaries are expected every `min_size + mask + 1` bytes
+    mask = (1 << max(1, (avg_size - min_size).bit_length() - 1)) - 1
+    buff = bytearray()
+    for block in blocks:
+        buff += block
+        if len(buff) < 2 * max_size:
+            continue
+        cuts = _cut_points(np.frombuffer(bytes(buff), dtype=np.uint8),
+                           min_size, max_size, mask)
+        for start, end in zip([0] + cuts, cuts):
+            yield bytes(buff[start:end])
+        buff = buff[cuts[-1]:]
+    cuts = _cut_points(np.frombuffer(bytes(buff), dtype=np.uint8),
+                       min_size, max_size, mask)
+    for start, end in zip([0] + cuts, cuts):
+        yield bytes(buff[start:end])
+    if len(cuts) == 0 or cuts[-1] < len(buff):
+        yield bytes(buff[cuts[-1] if cuts else 0:])
+
+
+def dropbox_content_hash(data: bytes) -> str:
+    """The content hash dropbox reports for a file with this content
+    (sha256 of the sha256 digests of its 4MB blocks)
+    """
+    block = 4 * 1024 * 1024
+    digests = b''.join(hashlib.sha256(data[i:i + block]).digest()
+                       for i in range(0, len(data), block))
+    return hashlib.sha256(digests).hexdigest()
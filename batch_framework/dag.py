@@ -0,0 +1,165 @@
+"""
+Compiled DAG for running ETL flows
+
+`ETL.build` fills the vertices and edges of a DAG one at a time. paradag
+checks for cycles on every added edge and rebuilds the vertex set on every
+lookup, and its `dag_run` re-scans the idle vertices on every completion,
+which grows quadratically with the number of units (e.g., the partitions
+of a MapReduce). CompiledDAG collects the vertices and edges first, then
+indexes the vertices by integers and computes the adjacency lists and a
+topological order once; `run_dag` schedules over them.
+"""
+from typing import Dict, Hashable, List, Set
+from paradag import DAGVertexNotFoundError, DAGCycleError, VertexExecutionError
+
+__all__ = ['CompiledDAG', 'run_dag']
+
+
+class CompiledDAG:
+    """
+    DAG with vertices indexed by integers.
+
+    It can be filled by `ETL.build` like paradag.DAG.
+    The topological order is computed (and cycles reported) on `compile`.
+    """
+
+    def __init__(self):
+        self._index: Dict[Hashable, int] = dict()
+        self._vertices: List[Hashable] = []
+        self._successors: List[Set[int]] = []
+        self._predecessors: List[Set[int]] = []
+        self._order = None
+
+    def add_vertex(self, *vertices):
+        """Add one or more vertices"""
+        for vertex in vertices:
+            if vertex not in self._index:
+                self._index[vertex] = len(self._vertices)
+                self._vertices.append(vertex)
+                self._successors.append(set())
+                self._predecessors.append(set())
+                self._order = None
+
+    def add_edge(self, v_from, *v_tos):
+        """Add edge(s) from one vertex to others"""
+        for vertex in (v_from,) + v_tos:
+            if vertex not in self._index:
+                raise DAGVertexNotFoundError(
+                    f'Vertex "{vertex}" does not belong to DAG '
+                    f'(used by edge {v_from} -> {", ".join(map(str, v_tos))})')
+        i = self._index[v_from]
+        for v_to in v_tos:
+            j = self._index[v_to]
+            self._successors[i].add(j)
+            self._predecessors[j].add(i)
+        self._order = None
+
+    def compile(self) -> 'CompiledDAG':
+        """Compute the topological order
+
+        Raises:
+            DAGCycleError: when the edges form a cycle (the cycle is reported)
+        """
+        if self._order is not None:
+            return self
+        indegree = [len(predecessors) for predecessors in self._predecessors]
+        order = [i for i, degree in enumerate(indegree) if degree == 0]
+        for i in order:
+            for j in self._successors[i]:
+                indegree[j] -= 1
+                if indegree[j] == 0:
+                    order.append(j)
+        if len(order) < len(self._vertices):
+            raise DAGCycleError(
+                'Cycle in DAG: ' + ' -> '.join(map(str, self._find_cycle(indegree))))
+        self._order = order
+        return self
+
+    def _find_cycle(self, indegree: List[int]) -> List[Hashable]:
+        """A cycle among the vertices left with positive indegree
+        (each of them has a predecessor left, so following the
+        predecessors eventually repeats a vertex)"""
+        i = next(i for i, degree in enumerate(indegree) if degree > 0)
+        path = []
+        visited = dict()
+        while i not in visited:
+            visited[i] = len(path)
+            path.append(i)
+            i = next(j for j in self._predecessors[i] if indegree[j] > 0)
+        cycle = path[visited[i]:] + [i]
+        return [self._vertices[j] for j in reversed(cycle)]
+
+    @property
+    def order(self) -> List[Hashable]:
+        """Vertices in topological order"""
+        self.compile()
+        return [self._vertices[i] for i in self._order]
+
+    def vertices(self) -> Set[Hashable]:
+        return set(self._vertices)
+
+    def vertex_size(self) -> int:
+        return len(self._vertices)
+
+    def edge_size(self) -> int:
+        return sum([len(successors) for successors in self._successors])
+
+    def successors(self, vertex) -> Set[Hashable]:
+        return set([self._vertices[j] for j in self._successors[self._index[vertex]]])
+
+    def predecessors(self, vertex) -> Set[Hashable]:
+        return set([self._vertices[j] for j in self._predecessors[self._index[vertex]]])
+
+    def indegree(self, vertex) -> int:
+        return len(self._predecessors[self._index[vertex]])
+
+    def outdegree(self, vertex) -> int:
+        return len(self._successors[self._index[vertex]])
+
+    def all_starts(self) -> Set[Hashable]:
+        return set([self._vertices[i] for i, predecessors in enumerate(
+            self._predecessors) if len(predecessors) == 0])
+
+    def all_terminals(self) -> Set[Hashable]:
+        return set([self._vertices[i] for i, successors in enumerate(
+            self._successors) if len(successors) == 0])
+
+
+def run_dag(dag: CompiledDAG, processor, executor) -> List[Hashable]:
+    """Run the vertices of a DAG after their predecessors
+    (the contract of `paradag.dag_run` with the full selector).
+
+    Each vertex is handed to the processor once, when it becomes ready,
+    so the scheduling cost is linear in the vertices and edges.
+
+    Args:
+        dag (CompiledDAG): the DAG
+        processor: paradag SequentialProcessor or MultiThreadProcessor
+        executor: an executor with `param` and `execute` methods
+    Returns:
+        List[Hashable]: the vertices in the order they completed
+    """
+    dag.compile()
+    vertices = dag._vertices
+    indegree = [len(predecessors) for predecessors in dag._predecessors]
+    ready = [i for i, degree in enumerate(indegree) if degree == 0]
+    running = 0
+    completed = []
+    while ready or running:
+        to_run = [(vertices[i], executor.param(vertices[i])) for i in ready]
+        running += len(ready)
+        ready = []
+        try:
+            results = processor.process(to_run, executor.execute)
+        except VertexExecutionError:
+            if hasattr(processor, 'abort'):
+                processor.abort()
+            raise
+        running -= len(results)
+        for vertex, _ in results:
+            completed.append(vertex)
+            for j in dag._successors[dag._index[vertex]]:
+                indegree[j] -= 1
+                if indegree[j] == 0:
+                    ready.append(j)
+    return completed
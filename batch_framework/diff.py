@@ -0,0 +1,201 @@
+"""
+Key difference between a table and its previous version.
+
+The difference is computed with columnar set operations
+(EXCEPT / INTERSECT) and keyed anti-joins in DuckDB.
+"""
+from typing import List, Dict, Optional, Union
+import pandas as pd
+import pyarrow as pa
+from .rdb import RDB, DuckDBBackend
+
+__all__ = [
+    'diff_sqls',
+    'diff_tables',
+    'delta_tables',
+    'upsert_table'
+]
+
+DIFF_KINDS = ['added', 'removed', 'unchanged']
+
+
+def diff_sqls(current: str, previous: str,
+              keys: List[str]) -> Dict[str, str]:
+    """Build the SQLs comparing the keys of two tables
+
+    Args:
+        current (str): name of the current table
+        previous (str): name of the previous table
+        keys (List[str]): key columns
+    Returns:
+        Dict[str, str]: sql of each kind of difference
+            - added: keys in current but not in previous
+            - removed: keys in previous but not in current
+            - unchanged: keys in both current and previous
+    """
+    key_str = ', '.join([_quote(key) for key in keys])
+    return {
+        'added': f"""
+            SELECT {key_str} FROM {current}
+            EXCEPT
+            SELECT {key_str} FROM {previous}
+        """,
+        'removed': f"""
+            SELECT {key_str} FROM {previous}
+            EXCEPT
+            SELECT {key_str} FROM {current}
+        """,
+        'unchanged': f"""
+            SELECT {key_str} FROM {current}
+            INTERSECT
+            SELECT {key_str} FROM {previous}
+        """
+    }
+
+
+def diff_tables(current: Union[pd.DataFrame, pa.Table],
+                previous: Union[pd.DataFrame, pa.Table],
+                keys: List[str],
+                rdb: Optional[RDB] = None) -> Dict[str, pa.Table]:
+    """Compare the keys of two in-memory tables
+
+    Args:
+        current: the current table
+        previous: the previous table
+        keys (List[str]): key columns
+        rdb (Optional[RDB]): RDB to run the comparison on (default: new DuckDBBackend)
+    Returns:
+        Dict[str, pa.Table]: key table of `added`, `removed` and `unchanged`.
+    """
+    if rdb is None:
+        rdb = DuckDBBackend()
+    cursor = rdb.get_conn()
+    try:
+        cursor.register('diff_current', current)
+        cursor.register('diff_previous', previous)
+        return dict([
+            (kind, cursor.execute(sql).arrow())
+            for kind, sql in diff_sqls('diff_current', 'diff_previous', keys).items()
+        ])
+    finally:
+        cursor.close()
+
+
+def _quote(column: str) -> str:
+    """Quote a column name (keys such as `from` / `to` are SQL keywords)"""
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _key_match(left: str, right: str, keys: List[str]) -> str:
+    return ' AND '.join(
+        [f'{left}.{_quote(key)} IS NOT DISTINCT FROM {right}.{_quote(key)}' for key in keys])
+
+
+def _column_names(table: Union[pd.DataFrame, pa.Table]) -> List[str]:
+    if isinstance(table, pa.Table):
+        return table.column_names
+    return list(table.columns)
+
+
+def delta_tables(current: Union[pd.DataFrame, pa.Table],
+                 previous: Optional[Union[pd.DataFrame, pa.Table]],
+                 keys: List[str],
+                 rdb: Optional[RDB] = None) -> Dict[str, pa.Table]:
+    """Get the row-level changes of a table compared with its previous version
+
+    Args:
+        current: the current table
+        previous: the previous table (None if there is no previous version)
+        keys (List[str]): key columns
+        rdb (Optional[RDB]): RDB to run the comparison on (default: new DuckDBBackend)
+    Returns:
+        Dict[str, pa.Table]:
+            - added: rows of current with keys not in previous
+            - removed: keys in previous but not in current (key columns only)
+            - changed: rows of current with keys in previous but different content
+    """
+    if rdb is None:
+        rdb = DuckDBBackend()
+    key_str = ', '.join([_quote(key) for key in keys])
+    cursor = rdb.get_conn()
+    try:
+        cursor.register('delta_current', current)
+        if previous is None:
+            cursor.execute(
+                'CREATE OR REPLACE TEMP VIEW delta_previous AS SELECT * FROM delta_current WHERE false')
+            same_columns = True
+        else:
+            cursor.register('delta_previous', previous)
+            same_columns = _column_names(current) == _column_names(previous)
+        # rows in current but not in previous: new keys or changed content
+        if same_columns:
+            modified = 'SELECT * FROM delta_current EXCEPT SELECT * FROM delta_previous'
+        else:
+            modified = 'SELECT * FROM delta_current'
+        return {
+            'added': cursor.execute(f"""
+                SELECT * FROM delta_current AS c
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM delta_previous AS p
+                    WHERE {_key_match('c', 'p', keys)}
+                )
+            """).arrow(),
+            'removed': cursor.execute(f"""
+                SELECT {key_str} FROM delta_previous
+                EXCEPT
+                SELECT {key_str} FROM delta_current
+            """).arrow(),
+            'changed': cursor.execute(f"""
+                SELECT * FROM ({modified}) AS c
+                WHERE EXISTS (
+                    SELECT 1 FROM delta_previous AS p
+                    WHERE {_key_match('c', 'p', keys)}
+                )
+            """).arrow()
+        }
+    finally:
+        cursor.close()
+
+
+def upsert_table(previous: Optional[Union[pd.DataFrame, pa.Table]],
+                 upserts: Union[pd.DataFrame, pa.Table],
+                 removed: Union[pd.DataFrame, pa.Table],
+                 keys: List[str],
+                 rdb: Optional[RDB] = None) -> pa.Table:
+    """Merge changes into a previous table by keys
+
+    Rows of `previous` whose keys are in `removed` or `upserts` are
+    dropped, and then rows of `upserts` are appended.
+
+    Args:
+        previous: the previous table (None if there is no previous version)
+        upserts: rows to be inserted or to replace rows with the same keys
+        removed: keys to be deleted
+        keys (List[str]): key columns
+        rdb (Optional[RDB]): RDB to run the merge on (default: new DuckDBBackend)
+    Returns:
+        pa.Table: the merged table
+    """
+    if rdb is None:
+        rdb = DuckDBBackend()
+    cursor = rdb.get_conn()
+    try:
+        cursor.register('upsert_rows', upserts)
+        if previous is None:
+            return cursor.execute('SELECT * FROM upsert_rows').arrow()
+        cursor.register('upsert_previous', previous)
+        cursor.register('upsert_removed', removed)
+        return cursor.execute(f"""
+            SELECT * FROM upsert_previous AS p
+            WHERE NOT EXISTS (
+                SELECT 1 FROM upsert_removed AS r
+                WHERE {_key_match('p', 'r', keys)}
+            ) AND NOT EXISTS (
+                SELECT 1 FROM upsert_rows AS u
+                WHERE {_key_match('p', 'u', keys)}
+            )
+            UNION ALL BY NAME
+            SELECT * FROM upsert_rows
+        """).arrow()
+    finally:
+        cursor.close()
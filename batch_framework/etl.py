@@ -6,23 +6,38 @@ TODO:
 - [ ] Add multi-threading to SQLExecutor
 """
 from paradag import DAG
-from paradag import dag_run
 from paradag import MultiThreadProcessor, SequentialProcessor
-from typing import List, Dict, Optional
-from threading import Semaphore
+from typing import List, Dict, Optional, Set, Generic, TypeVar
+from threading import Semaphore, Lock
 from dill.source import getsource
 import traceback
+import re
 import abc
-from .storage import Storage, PyArrowStorage
-from .filesystem import FileSystem
+import pandas as pd
+import pyarrow as pa
+from .storage import Storage, PyArrowStorage, table_storage, convert, is_convertible
+from .filesystem import FileSystem, LocalBackend
 from .rdb import RDB
+from .backend import Backend
+from .diff import DIFF_KINDS, diff_sqls, delta_tables, upsert_table
+from .remap import dictionary_sql, remap_macro_sql, remap_sql
+from .journal import RunJournal
+from .dag import CompiledDAG, run_dag
 
 __all__ = [
     'ObjProcessor',
     'SQLExecutor',
-    'ETLGroup'
+    'ETLGroup',
+    'DiffProcessor',
+    'DictionaryEncoder',
+    'IncrementalProcessor',
+    'Delta'
 ]
 
+T = TypeVar('T')
+# sets of kwargs whose sqls are kept by each SQLExecutor
+SQL_CACHE_SIZE = 8
+
 
 class ETL:
     """
@@ -31,17 +46,21 @@ class ETL:
 
     def __init__(self, input_storage: Optional[Storage] = None,
                  output_storage: Optional[Storage] = None, make_cache: bool = False):
+        input_ids = self.input_ids
+        output_ids = self.output_ids
         assert isinstance(
-            self.input_ids, list), f'property input_ids is not a list of string but {type(self.input_ids)} on {self}'
+            input_ids, list), f'property input_ids is not a list of string but {type(input_ids)} on {self}'
         assert isinstance(
-            self.output_ids, list), f'property output_ids is not a list of string but {type(self.output_ids)} on {self}'
-        assert len(set(self.input_ids) & set(self.output_ids)
+            output_ids, list), f'property output_ids is not a list of string but {type(output_ids)} on {self}'
+        input_set = set(input_ids)
+        output_set = set(output_ids)
+        assert len(input_set & output_set
                    ) == 0, 'There should not be an object_id on both input_ids and output_ids'
-        assert len(self.input_ids) == len(set(self.input_ids)
-                                          ), 'There should no be repeated id in self.input_ids'
-        assert len(self.output_ids) == len(set(self.output_ids)
-                                           ), 'There should no be repeated id in self.output_ids'
-        assert all([id in self.input_ids for id in self.external_input_ids]
+        assert len(input_ids) == len(input_set
+                                     ), 'There should no be repeated id in self.input_ids'
+        assert len(output_ids) == len(output_set
+                                      ), 'There should no be repeated id in self.output_ids'
+        assert all([id in input_set for id in self.external_input_ids]
                    ), 'external input ids should be defined in input ids'
         self._input_storage = input_storage
         self._output_storage = output_storage
@@ -91,29 +110,24 @@ class ETL:
     @property
     def exists_cache(self) -> bool:
         assert self._make_cache, 'cannot check cache existence when make_cache=False'
-        for id in self.input_ids:
-            if not self._input_storage.check_exists(id + '_cache'):
-                print(f'{id}_cache does not exists')
-                return False
-        for id in self.output_ids:
-            if not self._output_storage.check_exists(id + '_cache'):
-                print(f'{id}_cache does not exists')
-                return False
+        for storage, ids in [(self._input_storage, self.input_ids),
+                             (self._output_storage, self.output_ids)]:
+            exists = storage.exists_many([id + '_cache' for id in ids])
+            for id, exist in zip(ids, exists):
+                if not exist:
+                    print(f'{id}_cache does not exists')
+                    return False
         return True
 
     def _save_cache(self):
         assert self._make_cache, 'cannot save cache when make_cache=False'
+        self._input_storage.copy_many(
+            [(id, id + '_cache') for id in self.input_ids])
         for id in self.input_ids:
-            self._input_storage.copy(
-                id,
-                id + '_cache'
-            )
             print(id + '_cache', 'copied')
+        self._output_storage.copy_many(
+            [(id, id + '_cache') for id in self.output_ids])
         for id in self.output_ids:
-            self._output_storage.copy(
-                id,
-                id + '_cache'
-            )
             print(id + '_cache', 'copied')
 
     def load_cache(self, id: str):
@@ -126,6 +140,26 @@ class ETL:
             raise ValueError(
                 'id to be loaded in load_cache should be in self.input_ids or self.output_ids')
 
+    @property
+    def journal_key(self) -> str:
+        """Identify this unit across runs in a RunJournal"""
+        return f"{type(self).__name__}({','.join(self.input_ids)})->({','.join(self.output_ids)})"
+
+    def fingerprints(self) -> Dict[str, Dict[str, Optional[str]]]:
+        """
+        Returns:
+            Dict[str, Dict[str, Optional[str]]]: fingerprint of
+                each id in `inputs` and `outputs`.
+        """
+        def fingerprint(storage: Optional[Storage], id: str):
+            if storage is None:
+                return None
+            return storage.fingerprint(id)
+        return {
+            'inputs': dict([(id, fingerprint(self._input_storage, id)) for id in self.input_ids]),
+            'outputs': dict([(id, fingerprint(self._output_storage, id)) for id in self.output_ids])
+        }
+
     @abc.abstractmethod
     def end(self, **kwargs) -> None:
         """Define some action after execute end
@@ -153,10 +187,11 @@ class ETL:
             for input_id in self.input_ids:
                 dag.add_edge(input_id, self)
             # Step3: add all output_ids into dag
-            for output_id in self.output_ids:
+            output_ids = self.output_ids
+            for output_id in output_ids:
                 dag.add_vertex(output_id)
             # Step4: connect execute to ouput_id
-            for output_id in self.output_ids:
+            for output_id in output_ids:
                 dag.add_edge(self, output_id)
         except BaseException as e:
             raise ValueError(f'Dag Build Error on {self}') from e
@@ -177,16 +212,72 @@ class ETL:
                 self._rdb.drop(id)
 
 
+class RefCounter:
+    """Reference counts of the intermediate objects of a DAG.
+
+    An object is dropped (by the unit producing it) as soon as every
+    vertex consuming it has run, instead of at the end of the group.
+    """
+
+    def __init__(self, dag: CompiledDAG, keep_ids: Set[str]):
+        """
+        Args:
+            dag (CompiledDAG): The DAG of the ETL units.
+            keep_ids (Set[str]): Objects never to be dropped
+                (the inputs and outputs of the group).
+        """
+        self._producers = dict()
+        for vertex in dag.vertices():
+            if isinstance(vertex, ETL):
+                for id in vertex.output_ids:
+                    if id not in keep_ids:
+                        self._producers[id] = vertex
+        self._counts = dict([(id, dag.outdegree(id)) for id in self._producers])
+        self._lock = Lock()
+
+    def release(self, vertex, dag: CompiledDAG):
+        """Count a finished vertex off the objects it consumes and
+        drop those left without consumers."""
+        if isinstance(vertex, str):
+            return
+        dead_ids = []
+        with self._lock:
+            for id in dag.predecessors(vertex):
+                if id in self._counts:
+                    self._counts[id] -= 1
+                    if self._counts[id] == 0:
+                        dead_ids.append(id)
+            if isinstance(vertex, ETL):
+                # objects nobody consumes are dead once produced
+                dead_ids.extend([id for id in vertex.output_ids
+                                 if self._counts.get(id) == 0 and id not in dead_ids])
+        for id in dead_ids:
+            print(f'@Drop Released Object: {id}')
+            self._producers[id].drop(id)
+
+
 class DagExecutor:
     """Executing Unit for Tasks in the Dag"""
 
-    def __init__(self, limit_pool: Optional[Semaphore] = None):
+    def __init__(self, limit_pool: Optional[Semaphore] = None,
+                 dag: Optional[CompiledDAG] = None, ref_counter: Optional[RefCounter] = None):
         self._limit_pool = limit_pool
+        self._dag = dag
+        self._ref_counter = ref_counter
 
     def param(self, vertex):
         return vertex
 
     def execute(self, param):
+        self._run(param)
+        self.release(param)
+
+    def release(self, param):
+        """Drop the objects no longer needed after a vertex has run"""
+        if self._ref_counter is not None:
+            self._ref_counter.release(param, self._dag)
+
+    def _run(self, param):
         if self._limit_pool is not None:
             self._limit_pool.acquire()
         try:
@@ -235,34 +326,156 @@ class DagExecutor:
                 self._limit_pool.release()
 
 
+class JournalDagExecutor(DagExecutor):
+    """Executing Unit skipping the ETL units completed
+    in a previous run and journaling the completed ones"""
+
+    def __init__(self, journal: RunJournal, completed: Set[ETL],
+                 limit_pool: Optional[Semaphore] = None,
+                 dag: Optional[CompiledDAG] = None, ref_counter: Optional[RefCounter] = None):
+        self._journal = journal
+        self._completed = completed
+        super().__init__(limit_pool=limit_pool, dag=dag, ref_counter=ref_counter)
+
+    def execute(self, param):
+        if param in self._completed:
+            print('@Skip Completed:', type(param), 'outputs:', param.output_ids)
+        else:
+            self._run(param)
+            if isinstance(param, ETL):
+                self._journal.record(param.journal_key, **param.fingerprints())
+        self.release(param)
+
+
 class ETLGroup(ETL):
     """Interface for connecting multiple ETL units
+
+    Attributes:
+        fuse_sql (bool): fuse chains of SQLExecutors sharing a RDB
+            into single queries when the group runs (see `fuse_sql_executors`).
+            Off by default.
     """
+    fuse_sql = False
 
     def __init__(self, *etl_units: List[ETL]):
         self.etl_units = etl_units
+        self._dag = None
+        self._internal_ids = None
 
     def execute(self, **kwargs):
         self._execute(**kwargs)
 
     def _execute(self, **kwargs):
         """Execute ETL units
+
+        Args:
+            sequential (bool): run the units one by one.
+            max_active_run (int): maximum number of units running at once.
+            resume (bool): journal completed units and skip the ones
+                completed by a previous failed run. The journal is removed
+                once the run completes.
+            journal_fs (FileSystem): where the journal is kept
+                (default: local `./.journal/`).
+            early_drop (bool): drop each intermediate object as soon as
+                its last consumer finishes (default: True). Otherwise,
+                they are dropped when the group ends.
         """
-        dag = DAG()
-        self.build(dag)
-        if 'sequential' in kwargs and kwargs['sequential']:
-            dag_run(dag, processor=SequentialProcessor(),
-                    executor=DagExecutor()
-                    )
-        elif 'max_active_run' in kwargs:
+        dag = self.compiled_dag
+        limit_pool = None
+        if 'max_active_run' in kwargs:
             limit_pool = Semaphore(value=kwargs['max_active_run'])
-            dag_run(dag, processor=MultiThreadProcessor(),
-                    executor=DagExecutor(limit_pool=limit_pool)
+        ref_counter = None
+        if kwargs.get('early_drop', True):
+            ref_counter = RefCounter(
+                dag, set(self.input_ids) | set(self.output_ids))
+        if kwargs.get('resume', False):
+            journal_fs = kwargs.get('journal_fs', None)
+            if journal_fs is None:
+                journal_fs = LocalBackend('./.journal/')
+            journal = RunJournal(journal_fs, f'{type(self).__name__}_journal')
+            executor = JournalDagExecutor(
+                journal, self._completed_units(dag, journal), limit_pool=limit_pool,
+                dag=dag, ref_counter=ref_counter)
+        else:
+            journal = None
+            executor = DagExecutor(
+                limit_pool=limit_pool, dag=dag, ref_counter=ref_counter)
+        if 'sequential' in kwargs and kwargs['sequential']:
+            run_dag(dag, processor=SequentialProcessor(),
+                    executor=executor
                     )
         else:
-            dag_run(dag, processor=MultiThreadProcessor(),
-                    executor=DagExecutor()
+            run_dag(dag, processor=MultiThreadProcessor(),
+                    executor=executor
                     )
+        if journal is not None:
+            journal.clear()
+
+    @staticmethod
+    def _completed_units(dag: DAG, journal: RunJournal) -> Set[ETL]:
+        """Select the ETL units of the dag whose journaled results are still valid.
+
+        A unit stays completed when its inputs and outputs still have
+        the journaled fingerprints and the producers of its inputs are completed.
+        An output may be gone (e.g., dropped as internal object) if
+        all of its consumers are completed.
+        """
+        units = [vertex for vertex in dag.vertices() if isinstance(vertex, ETL)]
+        producers = dict()
+        consumers = dict()
+        for unit in units:
+            for id in unit.output_ids:
+                producers[id] = unit
+            for id in unit.input_ids:
+                consumers.setdefault(id, []).append(unit)
+        entries = dict()
+        for unit in units:
+            entry = journal.get(unit.journal_key)
+            if entry is not None:
+                entries[unit] = (entry, unit.fingerprints())
+        completed = set(entries.keys())
+
+        def is_valid(unit: ETL) -> bool:
+            entry, current = entries[unit]
+            for id in unit.input_ids:
+                if id in producers and producers[id] not in completed:
+                    return False
+                if current['inputs'][id] is not None and current['inputs'][id] != entry['inputs'].get(id):
+                    return False
+            for id in unit.output_ids:
+                if entry['outputs'].get(id) is None:
+                    return False
+                if current['outputs'][id] is None:
+                    if not consumers.get(id) or not all(
+                            [consumer in completed for consumer in consumers[id]]):
+                        return False
+                elif current['outputs'][id] != entry['outputs'][id]:
+                    return False
+            return True
+        changed = True
+        while changed:
+            invalid = [unit for unit in completed if not is_valid(unit)]
+            completed -= set(invalid)
+            changed = len(invalid) > 0
+        return completed
+
+    @property
+    def compiled_dag(self) -> CompiledDAG:
+        """The DAG of the ETL units, built and compiled once for the group
+        (the units of a group do not change after construction).
+
+        Raises:
+            ValueError: when an input id is produced by no unit (dangling id).
+            DAGCycleError: when the units form a cycle.
+        """
+        if self._dag is None:
+            dag = CompiledDAG()
+            self.build(dag)
+            self._dag = dag.compile()
+            if self.fuse_sql:
+                self._dag = fuse_sql_executors(
+                    self._dag, set(self.input_ids) | set(self.output_ids))
+        return self._dag
 
     def build(self, dag: DAG):
         # Step0: add external_ids to dag
@@ -272,9 +485,9 @@ class ETLGroup(ETL):
         for etl_unit in self.etl_units:
             etl_unit.build(dag)
         # Step2: make sure all output ids are already in the dag
+        vertices = dag.vertices()
         for _id in self.output_ids:
-            assert _id in dag.vertices(
-            ), f'output_id {_id} is not in dag input vertices'
+            assert _id in vertices, f'output_id {_id} is not in dag input vertices'
         # Step3: Add start and end to dag
         dag.add_vertex(self.start)
         dag.add_vertex(self._end)
@@ -290,6 +503,8 @@ class ETLGroup(ETL):
         """
         Get internal inputs ids and its located ETL units
         """
+        if self._internal_ids is not None:
+            return self._internal_ids
         results = dict()
         for etl_unit in self.etl_units:
             for id in etl_unit.input_ids:
@@ -300,6 +515,7 @@ class ETLGroup(ETL):
             del results[id]
         for id in self.output_ids:
             del results[id]
+        self._internal_ids = results
         return results
 
     def drop_internal_objs(self):
@@ -319,21 +535,32 @@ class SQLExecutor(ETL):
     """
 
     def __init__(
-            self, rdb: RDB, input_fs: Optional[FileSystem] = None, output_fs: Optional[FileSystem] = None, make_cache: bool = False):
+            self, rdb: RDB, input_fs: Optional[Backend] = None, output_fs: Optional[Backend] = None, make_cache: bool = False):
+        """
+        Args:
+            rdb (RDB): The database executing the sqls.
+            input_fs (Optional[Backend]): FileSystem of the input tables,
+                or `rdb` itself to read its native tables.
+            output_fs (Optional[Backend]): FileSystem of the output tables,
+                or `rdb` itself to keep them as its native tables.
+            make_cache (bool): Whether to cache the outputs.
+        """
         assert isinstance(rdb, RDB), 'rdb is not RDB type'
         self._rdb = rdb
+        self._sql_cache = dict()
         if input_fs is not None:
             assert isinstance(
-                input_fs, FileSystem), 'input_storage of SQLExecutor should be FileSystem'
-            input_storage = PyArrowStorage(input_fs)
+                input_fs, FileSystem) or input_fs is rdb, 'input_storage of SQLExecutor should be FileSystem or its rdb'
+            input_storage = self.storage_of(input_fs, is_output=False)
         else:
             input_storage = None
         if output_fs is not None:
             assert isinstance(
-                output_fs, FileSystem), 'output_storage of SQLExecutor should be FileSystem'
-            output_storage = PyArrowStorage(output_fs)
+                output_fs, FileSystem) or output_fs is rdb, 'output_storage of SQLExecutor should be FileSystem or its rdb'
+            output_storage = self.storage_of(output_fs, is_output=True)
         else:
             output_storage = None
+        self._output_in_rdb = output_fs is None or output_fs is rdb
 
         if make_cache:
             assert input_storage is not None and output_storage is not None, 'In SQLExecutor, cache mechanism only support when input/output file system (input/output_fs) provided.'
@@ -342,13 +569,20 @@ class SQLExecutor(ETL):
                    ), f'using . in SQLExecutor input id is not allowed. See: {self.input_ids}'
         assert all(['.' not in id for id in self.output_ids]
                    ), f'using . in SQLExecutor output id is not allowed. See: {self.output_ids}'
+        sqls = self.get_sqls()
         for id in self.output_ids:
-            assert id in self.sqls(
-            ), f'output_id {id} does not have corresponding sql'
-        for key in self.sqls():
+            assert id in sqls, f'output_id {id} does not have corresponding sql'
+        for key, sql in sqls.items():
             assert key in self.output_ids, f'sql of field {key} does not have corresponding output_id'
+            rdb.check_sql(sql)
         super().__init__(input_storage, output_storage, make_cache=make_cache)
 
+    def storage_of(self, fs: Backend, is_output: bool) -> Storage:
+        """Storage of the input (or output) tables on a filesystem:
+        Arrow IPC on temporary filesystems and Parquet otherwise.
+        """
+        return table_storage(fs)
+
     @abc.abstractmethod
     def sqls(self, **kwargs) -> Dict[str, str]:
         """Select SQL for transforming the input tables.
@@ -363,39 +597,245 @@ class SQLExecutor(ETL):
         """
         raise NotImplementedError
 
+    def get_sqls(self, **kwargs) -> Dict[str, str]:
+        """The SQLs of `sqls`, generated once for each set of kwargs
+        (so repeated runs of the executor reuse them).
+
+        Args:
+            **kwargs: some additional variable passed from scheduling engine (e.g., Airflow)
+
+        Returns:
+            Dict[str, str]: The transformation SQLs.
+        """
+        key = repr(sorted(kwargs.items()))
+        if key not in self._sql_cache:
+            if len(self._sql_cache) >= SQL_CACHE_SIZE:
+                self._sql_cache.pop(next(iter(self._sql_cache)))
+            self._sql_cache[key] = self.sqls(**kwargs)
+        return self._sql_cache[key]
+
     def _execute(self, **kwargs):
         """
         Args:
             **kwargs: some additional variable passed from scheduling engine (e.g., Airflow)
         """
-        assert set(self.sqls(**kwargs).keys()) == set(
+        sqls = self.get_sqls(**kwargs)
+        assert set(sqls.keys()) == set(
             self.output_ids), 'sqls key should corresponds to the output_ids'
+        # Copy outputs selecting an input as it is at storage level
+        copied = self._copy_identity_outputs(sqls)
+        sqls = dict([(id, sql) for id, sql in sqls.items() if id not in copied])
+        if len(sqls) == 0:
+            return
         # Extract Table and Load into RDB from FileSystem
         cursor = self._rdb.get_conn()
         try:
-            if self._input_storage is not None:
-                for id in self.input_ids:
-                    if self._input_storage.check_exists(id):
-                        print(f'@{self} Start Registering Input: {id}')
-                        cursor.register(id, self._input_storage.download(id))
-                        print(f'@{self} End Registering Input: {id}')
-                    else:
-                        raise ValueError(f'{id} does not exists')
-            if self._output_storage is not None:
-                for output_id, sql in self.sqls(**kwargs).items():
+            self._prepare(cursor, **kwargs)
+            if not self._output_in_rdb:
+                for output_id, sql in sqls.items():
                     print(f'@{self} Start Uploading Output: {output_id}')
                     table = cursor.execute(f'SELECT * FROM ({sql})').arrow()
                     self._output_storage.upload(table, output_id)
                     print(f'@{self} End Uploading Output: {output_id}')
             else:
-                for output_id, sql in self.sqls(**kwargs).items():
+                for output_id, sql in sqls.items():
                     cursor.execute(f'''
-                    CREATE TABLE {output_id} AS ({sql});
+                    CREATE OR REPLACE TABLE {output_id} AS ({sql});
                     ''')
 
         finally:
             cursor.close()
 
+    def _copy_identity_outputs(self, sqls: Dict[str, str]) -> Set[str]:
+        """Copy the outputs whose sql selects an input as it is
+        (`SELECT * FROM input`) from the input storage to the output
+        storage, when both store the object the same way.
+
+        Returns:
+            Set[str]: the copied output ids
+        """
+        copied = set()
+        if self._input_storage is None or self._output_in_rdb:
+            return copied
+        for output_id, sql in sqls.items():
+            source = identity_source(sql)
+            if source in self.input_ids and self._input_storage.copy_to(
+                    source, self._output_storage, output_id):
+                print(f'@{self} Copied Output: {output_id} (from {source})')
+                copied.add(output_id)
+        return copied
+
+    def _prepare(self, cursor, **kwargs):
+        """Make the tables of the sqls available on the cursor
+
+        Args:
+            cursor: The DB connection on which the sqls are executed.
+            **kwargs: some additional variable passed from scheduling engine (e.g., Airflow)
+        """
+        self._register_inputs(cursor)
+
+    def _register_inputs(self, cursor):
+        """Register input tables from the input FileSystem onto the cursor.
+        Inputs the storage can scan in place become views on the cursor.
+
+        Args:
+            cursor: The DB connection on which the sqls are executed.
+        """
+        self._register_ids(cursor, self.input_ids)
+
+    def _register_ids(self, cursor, ids: List[str]):
+        """Register some input tables onto the cursor (see `_register_inputs`)"""
+        if self._input_storage is not None:
+            exists = self._input_storage.exists_many(ids)
+            for id, exist in zip(ids, exists):
+                if exist:
+                    print(f'@{self} Start Registering Input: {id}')
+                    scan = self._input_storage.scan(id, self._rdb)
+                    if scan is None:
+                        cursor.register(id, self._input_storage.download(id))
+                    elif scan != id:
+                        cursor.execute(
+                            f'CREATE OR REPLACE TEMP VIEW {id} AS SELECT * FROM {scan}')
+                    print(f'@{self} End Registering Input: {id}')
+                else:
+                    raise ValueError(f'{id} does not exists')
+
+
+class FusedSQLExecutor(SQLExecutor):
+    """Two SQLExecutors on the same RDB run as one query.
+
+    The outputs of `upstream`, consumed only by `downstream`, become
+    temporary views of the sqls of `downstream` instead of tables
+    materialized (and uploaded) between them.
+
+    The `start` hooks of both executors run before the query and their
+    `end` hooks after it (upstream first).
+    """
+
+    def __init__(self, upstream: SQLExecutor, downstream: SQLExecutor):
+        self._upstream = upstream
+        self._downstream = downstream
+        self._rdb = downstream._rdb
+        self._sql_cache = dict()
+        self._output_in_rdb = downstream._output_in_rdb
+        ETL.__init__(self, None, downstream._output_storage)
+
+    @property
+    def input_ids(self):
+        return self._upstream.input_ids + self._downstream_input_ids
+
+    @property
+    def _downstream_input_ids(self) -> List[str]:
+        """inputs of downstream not provided by upstream"""
+        upstream_ids = set(self._upstream.input_ids + self._upstream.output_ids)
+        return [id for id in self._downstream.input_ids if id not in upstream_ids]
+
+    @property
+    def output_ids(self):
+        return self._downstream.output_ids
+
+    def sqls(self, **kwargs) -> Dict[str, str]:
+        return self._downstream.get_sqls(**kwargs)
+
+    def start(self, **kwargs):
+        self._upstream.start(**kwargs)
+        self._downstream.start(**kwargs)
+
+    def _end(self, **kwargs):
+        self._upstream._end(**kwargs)
+        self._downstream._end(**kwargs)
+
+    def _prepare(self, cursor, **kwargs):
+        self._upstream._prepare(cursor, **kwargs)
+        for id, sql in self._upstream.get_sqls(**kwargs).items():
+            cursor.execute(f'CREATE OR REPLACE TEMP VIEW {id} AS {sql}')
+        self._downstream._register_ids(cursor, self._downstream_input_ids)
+
+    def drop(self, id: str):
+        if id in self._upstream.input_ids:
+            self._upstream.drop(id)
+        else:
+            self._downstream.drop(id)
+
+    def fingerprints(self) -> Dict[str, Dict[str, Optional[str]]]:
+        upstream = self._upstream.fingerprints()
+        downstream = self._downstream.fingerprints()
+        inputs = dict(upstream['inputs'])
+        for id in self._downstream_input_ids:
+            inputs[id] = downstream['inputs'][id]
+        return {'inputs': inputs, 'outputs': downstream['outputs']}
+
+
+def identity_source(sql: str) -> Optional[str]:
+    """The table selected by a `SELECT * FROM table` sql (None for other sqls)"""
+    match = re.fullmatch(r'\s*SELECT\s+\*\s+FROM\s+(\w+)\s*;?\s*',
+                         sql, flags=re.IGNORECASE)
+    return match.group(1) if match else None
+
+
+def _fusable(unit: ETL) -> bool:
+    """Whether a unit is a plain SQLExecutor (inputs registered and outputs
+    written by SQLExecutor itself) that can be fused with another one"""
+    if isinstance(unit, FusedSQLExecutor):
+        return True
+    return isinstance(unit, SQLExecutor) and not unit._make_cache and all([
+        getattr(type(unit), method) is getattr(SQLExecutor, method)
+        for method in ['_execute', '_prepare', '_register_inputs', '_register_ids']])
+
+
+def fuse_sql_executors(dag: CompiledDAG, keep_ids: Set[str]) -> CompiledDAG:
+    """Fuse each SQLExecutor whose outputs are consumed by only one other
+    SQLExecutor on the same RDB into it (see FusedSQLExecutor).
+
+    Args:
+        dag (CompiledDAG): The DAG of the ETL units.
+        keep_ids (Set[str]): Objects that must be materialized
+            (the inputs and outputs of the group).
+    Returns:
+        CompiledDAG: the DAG with the fused units (`dag` if nothing is fused).
+    """
+    replaced = dict()
+    removed_ids = set()
+    for vertex in dag.order:
+        if not isinstance(vertex, SQLExecutor) or not _fusable(vertex):
+            continue
+        upstream = replaced.get(vertex, vertex)
+        consumers = set()
+        for id in vertex.output_ids:
+            if id in keep_ids or dag.predecessors(id) != {vertex}:
+                consumers = None
+                break
+            consumers |= dag.successors(id)
+        if not consumers or len(consumers) != 1:
+            continue
+        downstream = next(iter(consumers))
+        # a downstream is fused with one upstream (it reads its other inputs itself)
+        if not isinstance(downstream, SQLExecutor) or not _fusable(downstream) \
+                or downstream in replaced or downstream._rdb is not vertex._rdb:
+            continue
+        fused = FusedSQLExecutor(upstream, downstream)
+        print(f'@Fuse: {upstream.journal_key} into {downstream.journal_key}')
+        for unit, current in list(replaced.items()):
+            if current is upstream:
+                replaced[unit] = fused
+        replaced[vertex] = fused
+        replaced[downstream] = fused
+        removed_ids |= set(vertex.output_ids)
+    if len(replaced) == 0:
+        return dag
+    result = CompiledDAG()
+    for vertex in dag.order:
+        if vertex not in removed_ids:
+            result.add_vertex(replaced.get(vertex, vertex))
+    for vertex in dag.order:
+        if vertex in removed_ids:
+            continue
+        for successor in dag.successors(vertex):
+            if successor not in removed_ids:
+                result.add_edge(replaced.get(vertex, vertex),
+                                replaced.get(successor, successor))
+    return result.compile()
+
 
 class ObjProcessor(ETL):
     """
@@ -411,10 +851,10 @@ class ObjProcessor(ETL):
             input_storage, Storage), f'input_storage should be Storage rather than: {type(self._input_storage)}'
         assert isinstance(
             output_storage, Storage), f'output_storage should be Storage rather than: {type(self._output_storage)}'
-        assert self.get_input_type() == input_storage.get_download_type(
-        ), f'storage download type: {input_storage.get_download_type()} != transform input type: {self.get_input_type()}'
-        assert self.get_output_type() == output_storage.get_upload_type(
-        ), f'storage upload type: {output_storage.get_upload_type()} != transform output type: {self.get_output_type()}'
+        assert is_convertible(input_storage.get_download_type(), self.get_input_type(
+        )), f'storage download type: {input_storage.get_download_type()} cannot be converted to transform input type: {self.get_input_type()}'
+        assert is_convertible(self.get_output_type(), output_storage.get_upload_type(
+        )), f'transform output type: {self.get_output_type()} cannot be converted to storage upload type: {output_storage.get_upload_type()}'
         super().__init__(input_storage, output_storage, make_cache=make_cache)
 
     @abc.abstractmethod
@@ -464,7 +904,8 @@ class ObjProcessor(ETL):
         input_tables = []
         for id in self.input_ids:
             print(f'@{self} Start Extracting Input: {id}')
-            table = self._input_storage.download(id)
+            table = convert(self._input_storage.download(id),
+                            self.get_input_type())
             input_tables.append(table)
             print(f'@{self} End Extracting Input: {id}')
         return input_tables
@@ -476,5 +917,273 @@ class ObjProcessor(ETL):
         """
         for id, table in zip(self.output_ids, output_tables):
             print(f'@{self} Start Loading Output: {id}')
-            self._output_storage.upload(table, id)
+            self._output_storage.upload(
+                convert(table, self._output_storage.get_upload_type()), id)
             print(f'@{self} End Loading Output: {id}')
+
+
+class DiffProcessor(SQLExecutor):
+    """
+    Compare the keys of an object with its version of the previous run.
+
+    The previous version is the `{obj_id}_cache` object saved by the cache
+    mechanism. When it does not exist yet (i.e., first run), all keys
+    are regarded as added.
+
+    Outputs (key columns only):
+        - {obj_id}_added: keys in current but not in previous
+        - {obj_id}_removed: keys in previous but not in current
+        - {obj_id}_unchanged: keys in both current and previous
+    """
+
+    def __init__(self, obj_id: str, keys: List[str], rdb: RDB,
+                 input_fs: FileSystem, output_fs: FileSystem, kinds: List[str] = DIFF_KINDS):
+        assert len(keys) > 0, 'keys of DiffProcessor should not be empty'
+        assert all([kind in DIFF_KINDS for kind in kinds]
+                   ), f'kinds should be some of {DIFF_KINDS}, but it is {kinds}'
+        self._obj_id = obj_id
+        self._keys = keys
+        self._kinds = kinds
+        super().__init__(rdb, input_fs=input_fs,
+                         output_fs=output_fs, make_cache=True)
+
+    @property
+    def input_ids(self):
+        return [self._obj_id]
+
+    @property
+    def output_ids(self):
+        return [self.diff_id(kind) for kind in self._kinds]
+
+    @property
+    def previous_id(self) -> str:
+        return self._obj_id + '_cache'
+
+    def diff_id(self, kind: str) -> str:
+        """
+        Args:
+            kind (str): added, removed, or unchanged
+        Returns:
+            str: output id of the kind of difference
+        """
+        return f'{self._obj_id}_{kind}'
+
+    def sqls(self, **kwargs) -> Dict[str, str]:
+        sqls = diff_sqls(self._obj_id, self.previous_id, self._keys)
+        return dict([(self.diff_id(kind), sqls[kind]) for kind in self._kinds])
+
+    def _register_inputs(self, cursor):
+        super()._register_inputs(cursor)
+        if self._input_storage.check_exists(self.previous_id):
+            print(f'@{self} Start Registering Previous: {self.previous_id}')
+            cursor.register(
+                self.previous_id,
+                self._input_storage.download(self.previous_id))
+            print(f'@{self} End Registering Previous: {self.previous_id}')
+        else:
+            print(f'@{self} {self.previous_id} does not exists')
+            cursor.execute(f"""
+            CREATE OR REPLACE TEMP VIEW {self.previous_id} AS
+            SELECT {', '.join(self._keys)} FROM {self._obj_id} WHERE false
+            """)
+
+
+class DictionaryEncoder(SQLExecutor):
+    """
+    Encode the id columns of tables as dense integers.
+
+    The ids are looked up in a dictionary (`key`, `id`) persisted as
+    the `dictionary_id` object of `dictionary_fs`. On each run, the keys
+    not in the dictionary yet get the following ids, so the ids of
+    existing keys stay stable. The dictionary is not an object of the
+    DAG, so it is kept across runs (like the models of a processor).
+
+    Outputs:
+        - the encoded table of each input (see `encoded_id`)
+    """
+
+    def __init__(self, dictionary_id: str, columns: Dict[str, List[str]], rdb: RDB,
+                 input_fs: Backend, output_fs: Backend,
+                 dictionary_fs: Optional[Backend] = None, id_type: str = 'BIGINT'):
+        """
+        Args:
+            dictionary_id (str): object id of the dictionary
+            columns (Dict[str, List[str]]): id columns of each input table
+            dictionary_fs (Optional[Backend]): where the dictionary is
+                persisted (output_fs by default)
+            id_type (str): type of the dense ids (BIGINT or INTEGER)
+        """
+        assert len(columns) > 0, 'columns of DictionaryEncoder should not be empty'
+        self._dictionary_id = dictionary_id
+        self._columns = columns
+        self._id_type = id_type
+        super().__init__(rdb, input_fs=input_fs, output_fs=output_fs)
+        self._dictionary_storage = PyArrowStorage(
+            output_fs if dictionary_fs is None else dictionary_fs)
+
+    @property
+    def input_ids(self):
+        return list(self._columns.keys())
+
+    @property
+    def output_ids(self):
+        return [self.encoded_id(id) for id in self._columns]
+
+    def encoded_id(self, id: str) -> str:
+        """
+        Args:
+            id (str): input id
+        Returns:
+            str: output id of the encoded input
+        """
+        return id + '_encoded'
+
+    def sqls(self, **kwargs) -> Dict[str, str]:
+        return dict([(self.encoded_id(id), remap_sql(id, columns, macro='encode_id'))
+                     for id, columns in self._columns.items()])
+
+    @property
+    def keys_sql(self) -> str:
+        """Select sql of all the ids of the inputs (as a `key` column)"""
+        return ' UNION '.join([
+            f'SELECT {column} AS key FROM {id}'
+            for id, columns in self._columns.items() for column in columns])
+
+    def _prepare(self, cursor, **kwargs):
+        """Extend the dictionary with the new ids (persisting it)
+        and create the encoding macro"""
+        super()._prepare(cursor, **kwargs)
+        storage = self._dictionary_storage
+        if storage.check_exists(self._dictionary_id):
+            cursor.register('_previous_dictionary',
+                            storage.download(self._dictionary_id))
+        else:
+            print(f'@{self} {self._dictionary_id} does not exists')
+            cursor.execute(f"""
+            CREATE OR REPLACE TEMP VIEW _previous_dictionary AS
+            SELECT key, CAST(NULL AS {self._id_type}) AS id
+            FROM ({self.keys_sql}) WHERE false
+            """)
+        cursor.execute(f"""
+        CREATE OR REPLACE TEMP TABLE _dictionary AS
+        {dictionary_sql(self.keys_sql, '_previous_dictionary', self._id_type)}
+        """)
+        added = cursor.execute("""
+        SELECT (SELECT COUNT(*) FROM _dictionary) - (SELECT COUNT(*) FROM _previous_dictionary)
+        """).fetchone()[0]
+        print(f'@{self} # new ids of {self._dictionary_id}:', added)
+        if added > 0:
+            storage.upload(cursor.execute('SELECT * FROM _dictionary').arrow(),
+                           self._dictionary_id)
+        cursor.execute(remap_macro_sql(
+            '_dictionary', macro='encode_id', key='key', value='id', keep_unmapped=False))
+
+
+class Delta(Generic[T]):
+    """Changes of a table compared with its previous version
+
+    Attributes:
+        added (T): rows with keys not in the previous version
+        removed (T): keys no longer exist (key columns only)
+        changed (T): rows with existing keys but different content
+    """
+
+    def __init__(self, added: T, removed: T, changed: T):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+
+class IncrementalProcessor(ObjProcessor):
+    """
+    Object processing unit that only processes the changes of its inputs.
+
+    `transform` takes one `Delta` per input id, computed by keys against the
+    inputs of the previous run, and returns one `Delta` per output id.
+    The output `Delta`s are merged by keys into the outputs of the previous run:
+    rows with keys in `removed` are deleted and rows in `added` / `changed`
+    are upserted. On the first run, all input rows are `added`.
+
+    The Deltas hold pd.DataFrame or pa.Table; storages of any
+    convertible type (see `storage.convert`) can be used.
+    """
+
+    def __init__(self, input_storage: Storage,
+                 output_storage: Optional[Storage] = None, make_cache: bool = True):
+        assert make_cache, 'IncrementalProcessor requires the cache of the previous run (make_cache=True)'
+        super().__init__(input_storage, output_storage, make_cache=make_cache)
+        for id in self.input_ids + self.output_ids:
+            assert id in self.keys, f'key columns of {id} is not provided in keys'
+        for _type in [self.get_input_type(), self.get_output_type()]:
+            assert _type in [
+                pd.DataFrame, pa.Table], f'IncrementalProcessor only support pd.DataFrame or pa.Table but it is {_type}'
+
+    @abc.abstractproperty
+    def keys(self) -> Dict[str, List[str]]:
+        """
+        Returns:
+            Dict[str, List[str]]: key columns of each input and output id
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def transform(self, inputs: List[Delta], **kwargs) -> List[Delta]:
+        """
+        Args:
+            inputs: List of changes of the input objects.
+        Returns:
+            List[Delta]: List of changes to be merged into the output objects.
+        """
+        raise NotImplementedError
+
+    def get_input_type(self):
+        return super().get_input_type().__args__[0]
+
+    def get_output_type(self):
+        return super().get_output_type().__args__[0]
+
+    def _execute(self, **kwargs):
+        """
+        Args:
+            **kwargs: some additional variable passed from scheduling engine (e.g., Airflow)
+        Run ETL on the changes of inputs and merge the changes into outputs
+        """
+        input_deltas = []
+        for id in self.input_ids:
+            print(f'@{self} Start Extracting Input Delta: {id}')
+            delta = delta_tables(
+                convert(self._input_storage.download(id), pa.Table),
+                self._load_previous(self._input_storage, id),
+                keys=self.keys[id])
+            input_deltas.append(Delta(
+                **dict([(kind, convert(table, self.get_input_type()))
+                        for kind, table in delta.items()])
+            ))
+            print(f'@{self} End Extracting Input Delta: {id}')
+        output_deltas = self.transform(input_deltas, **kwargs)
+        assert isinstance(
+            output_deltas, list), 'Output of transform should be a list of Delta'
+        assert all([isinstance(delta, Delta) for delta in output_deltas]
+                   ), f'One of the output {output_deltas} is not Delta'
+        for id, delta in zip(self.output_ids, output_deltas):
+            print(f'@{self} Start Merging Output Delta: {id}')
+            table = upsert_table(
+                self._load_previous(self._output_storage, id),
+                self._concat([delta.added, delta.changed]),
+                delta.removed,
+                keys=self.keys[id])
+            self._output_storage.upload(
+                convert(table, self._output_storage.get_upload_type()), id)
+            print(f'@{self} End Merging Output Delta: {id}')
+
+    def _load_previous(self, storage: Storage, id: str):
+        if storage.check_exists(id + '_cache'):
+            return convert(storage.download(id + '_cache'), pa.Table)
+        else:
+            return None
+
+    def _concat(self, tables: List[object]) -> object:
+        if self.get_output_type() == pa.Table:
+            return pa.concat_tables(tables)
+        else:
+            return pd.concat(tables)
@@ -0,0 +1,181 @@
+"""
+In-process fake of the Dropbox server, client and filesystem.
+
+The fake server charges a latency per request, shares its bandwidth among the
+requests in flight and answers 429 (RateLimitError) above its capacity.
+Used by the DropboxBackend tests and by `examples/benchmark_transfer.py`,
+and to try out a pipeline on dropbox without an account.
+"""
+import io
+import time
+import datetime
+import threading
+import dropbox
+from fsspec.implementations.memory import MemoryFileSystem
+from .chunking import dropbox_content_hash
+
+
+class FakeServer:
+    def __init__(self, latency=0.05, bandwidth=400e6, capacity=12):
+        self._latency = latency
+        self._bandwidth = bandwidth
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.throttled = 0
+        self.written = 0
+
+    def request(self, nbytes: int):
+        with self._lock:
+            if self._in_flight >= self._capacity:
+                self.throttled += 1
+                raise dropbox.exceptions.RateLimitError('fake-request', None)
+            self._in_flight += 1
+            share = self._bandwidth / self._in_flight
+        try:
+            time.sleep(self._latency + nbytes / share)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+class FakeUpload(io.BytesIO):
+    def __init__(self, fs, path):
+        self._fs = fs
+        self._path = path
+        super().__init__()
+
+    def close(self):
+        if not self.closed:
+            data = self.getvalue()
+            self._fs.server.request(len(data))
+            self._fs.server.written += len(data)
+            with MemoryFileSystem.open(self._fs, self._path, 'wb') as f:
+                f.write(data)
+        super().close()
+
+
+class FakeResponse:
+    """The part of `requests.Response` used by ranged reads"""
+
+    def __init__(self, status_code, content=b''):
+        self.status_code = status_code
+        self.content = content
+
+    def raise_for_status(self):
+        assert self.status_code < 400, f'status code {self.status_code}'
+
+
+class FakeDbx:
+    """The part of the dropbox client used by DropboxMetadata and DropboxBackend"""
+    # temporary links are valid for all clients, as the store
+    links = dict()
+
+    def __init__(self, fs):
+        self._fs = fs
+        self._snapshots = dict()
+
+    def _listing(self, path):
+        path = path if path else '/'
+        if not self._fs.exists(path):
+            return dict()
+        listing = dict()
+        for name, info in self._fs.find(path, withdirs=True, detail=True).items():
+            lower = '/' + name.strip('/').lower()
+            if info['type'] == 'directory':
+                listing[lower] = dropbox.files.FolderMetadata(
+                    name=lower.split('/')[-1], id='id:' + lower, path_lower=lower)
+            else:
+                content = self._fs.store[name].getvalue()
+                content_hash = dropbox_content_hash(content)
+                listing[lower] = dropbox.files.FileMetadata(
+                    name=lower.split('/')[-1], id='id:' + lower,
+                    client_modified=datetime.datetime(2023, 1, 1),
+                    server_modified=datetime.datetime(2023, 1, 1),
+                    rev=content_hash[:16], size=info['size'], path_lower=lower,
+                    content_hash=content_hash)
+        return listing
+
+    def _result(self, path, entries):
+        cursor = f'{path}#{len(self._snapshots)}'
+        self._snapshots[cursor] = (path, self._listing(path))
+        return dropbox.files.ListFolderResult(
+            entries=entries, cursor=cursor, has_more=False)
+
+    def files_copy_v2(self, from_path, to_path):
+        self._fs.server.request(0)
+        if from_path not in self._fs.store:
+            raise dropbox.exceptions.ApiError('fake-request', dropbox.files.RelocationError.from_lookup(
+                dropbox.files.LookupError.not_found), None, None)
+        self._fs.store[to_path] = self._fs.store[from_path]
+
+    def files_delete_batch(self, entries):
+        for entry in entries:
+            self._fs.rm(entry.path)
+        return dropbox.files.DeleteBatchLaunch.complete(
+            dropbox.files.DeleteBatchResult(entries=[]))
+
+    def files_list_folder(self, path, recursive=False):
+        return self._result(path, list(self._listing(path).values()))
+
+    def files_list_folder_continue(self, cursor):
+        path, before = self._snapshots[cursor]
+        after = self._listing(path)
+        # like dropbox, a deleted folder is reported without its content
+        deleted = [p for p in before if p not in after]
+        entries = [dropbox.files.DeletedMetadata(name=p.split('/')[-1], path_lower=p)
+                   for p in deleted if p.rsplit('/', 1)[0] not in deleted]
+        entries += [entry for p, entry in after.items() if p not in before or
+                    getattr(entry, 'content_hash', None) != getattr(before[p], 'content_hash', None)]
+        return self._result(path, entries)
+
+    def files_get_temporary_link(self, path):
+        link = f'https://fake.dropbox/{len(self.links)}'
+        self.links[link] = path
+        return dropbox.files.GetTemporaryLinkResult(
+            metadata=self._listing(path)[path.lower()], link=link)
+
+    def get(self, link, headers=dict()):
+        """Answer a (ranged) GET request on a temporary link, as `requests.get`"""
+        path = self.links.get(link)
+        if path is None or not self._fs.exists(path):
+            return FakeResponse(410)
+        data = self._fs.store[path].getvalue()
+        if 'Range' in headers:
+            start, end = headers['Range'][len('bytes='):].split('-')
+            data = data[int(start): int(end) + 1]
+        self._fs.server.request(len(data))
+        return FakeResponse(206 if 'Range' in headers else 200, data)
+
+
+class FakeDropboxFS(MemoryFileSystem):
+    store = dict()
+    pseudo_dirs = ['']
+
+    def __init__(self, server, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.server = server
+        self.dbx = FakeDbx(self)
+
+    def rm(self, path, recursive=False, maxdepth=None):
+        # dropbox deletes folders with their content
+        super().rm(path, recursive=True, maxdepth=maxdepth)
+
+    def open(self, path, mode='rb', **kwargs):
+        # dropbox tolerates the `//` left by nested DirFileSystem
+        path = '/' + '/'.join(part for part in path.split('/') if part)
+        if 'r' in mode:
+            with MemoryFileSystem.open(self, path, 'rb') as f:
+                data = f.read()
+            self.server.request(len(data))
+            return io.BytesIO(data)
+        return FakeUpload(self, path)
+
+
+def fake_dropbox(server, directory='/bench'):
+    fs = FakeDropboxFS(server, skip_instance_cache=True)
+    fs.store.clear()
+    fs.dbx.links.clear()
+    fs.pseudo_dirs[:] = ['']
+    fs.mkdir(directory)
+    return fs
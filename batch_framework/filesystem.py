@@ -8,18 +8,27 @@ TODO:
 """
 import os
 import io
+import json
+import time
+import hashlib
 import tqdm
+import threading
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 from concurrent.futures import ThreadPoolExecutor
-from threading import Semaphore
 from fsspec.implementations.local import LocalFileSystem
 from fsspec.implementations.dirfs import DirFileSystem
 from fsspec import AbstractFileSystem
+from fsspec.spec import AbstractBufferedFile
 import webbrowser
 import dropbox
 import requests
 import base64
 from dropboxdrivefs import DropboxDriveFileSystem
 from .backend import Backend
+from .chunking import content_chunks, dropbox_content_hash
 
 
 class DropboxConfig:
@@ -104,8 +113,34 @@ class FileSystem(Backend):
     Example: DropBoxStorage
     """
 
-    def __init__(self, fsspec_fs: AbstractFileSystem):
+    def __init__(self, fsspec_fs: AbstractFileSystem, temporary: bool = False):
+        """
+        Args:
+            fsspec_fs (AbstractFileSystem): The underlying fsspec filesystem.
+            temporary (bool): Whether the filesystem only keeps short-lived
+                intermediate objects (see `storage.table_storage`).
+        """
         self._fs = fsspec_fs
+        self._temporary = temporary
+
+    @property
+    def temporary(self) -> bool:
+        return self._temporary
+
+    @property
+    def chunksize(self) -> int:
+        """Size of the chunks passed to `upload_stream`"""
+        return 8 * 1024 * 1024
+
+    def chunksize_for(self, size: Optional[int]) -> int:
+        """Size of the chunks passed to `upload_stream` for an object
+
+        Args:
+            size (Optional[int]): (estimated) size of the object in bytes
+        Returns:
+            int: chunk size in bytes
+        """
+        return self.chunksize
 
     def upload_core(self, file_obj: io.BytesIO, remote_path: str):
         """Upload file object to local storage
@@ -121,6 +156,22 @@ class FileSystem(Backend):
         except BaseException as e:
             raise ValueError(f'{remote_path} upload failed') from e
 
+    def upload_stream(self, chunks: Iterable[bytes], remote_path: str):
+        """Upload a file given as consecutive chunks of bytes.
+        Chunks are written as soon as they are produced, so
+        producing the file overlaps with the transfer.
+
+        Args:
+            chunks (Iterable[bytes]): consecutive parts of the file
+            remote_path (str): remote file path
+        """
+        try:
+            with self._fs.open(remote_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        except BaseException as e:
+            raise ValueError(f'{remote_path} upload failed') from e
+
     def download_core(self, remote_path: str) -> io.BytesIO:
         """Download file from remote storage
 
@@ -137,9 +188,34 @@ class FileSystem(Backend):
         except BaseException as e:
             raise ValueError(f'{remote_path} download failed') from e
 
+    def download_to(self, remote_path: str, file_obj: io.RawIOBase):
+        """Download file from remote storage into a writable file
+        without holding the whole content in memory
+
+        Args:
+            remote_path (str): remote file path
+            file_obj (io.RawIOBase): writable file receiving the content
+        """
+        try:
+            with self._fs.open(remote_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(self.chunksize), b''):
+                    file_obj.write(chunk)
+        except BaseException as e:
+            raise ValueError(f'{remote_path} download failed') from e
+
     def check_exists(self, remote_path: str) -> bool:
         return self._fs.exists(remote_path)
 
+    def exists_many(self, remote_paths: List[str]) -> List[bool]:
+        """Check the existence of multiple files
+
+        Args:
+            remote_paths (List[str]): remote file paths
+        Returns:
+            List[bool]: whether each file exists
+        """
+        return [self.check_exists(remote_path) for remote_path in remote_paths]
+
     def drop_file(self, remote_path: str):
         try:
             return self._fs.rm(remote_path)
@@ -152,16 +228,557 @@ class FileSystem(Backend):
         self.drop_file(dest_file)
         self._fs.cp(src_file, dest_file, recursive=True)
 
+    def copy_files(self, file_pairs: List[Tuple[str, str]]):
+        """Copy multiple files
+
+        Args:
+            file_pairs (List[Tuple[str, str]]): pairs of source and destination file
+        """
+        for src_file, dest_file in file_pairs:
+            self.copy_file(src_file, dest_file)
+
+    def fingerprint(self, remote_path: str) -> Optional[str]:
+        """Identify the current content of a file without reading it
+
+        Args:
+            remote_path (str): remote file path
+        Returns:
+            Optional[str]: the fingerprint (None if the file does not exist)
+        """
+        if not self.check_exists(remote_path):
+            return None
+        info = self._fs.info(remote_path)
+        return '-'.join([str(info.get(key))
+                        for key in ['size', 'mtime', 'ino']])
+
+    def atomic_write(self, data: bytes, remote_path: str):
+        """Write a small file so that readers see either
+        the old or the new content.
+
+        Args:
+            data (bytes): content of the file
+            remote_path (str): remote file path
+        """
+        tmp_path = remote_path + '.uploading'
+        try:
+            with self._fs.open(tmp_path, 'wb') as f:
+                f.write(data)
+            self._fs.mv(tmp_path, remote_path)
+        except BaseException as e:
+            raise ValueError(f'{remote_path} write failed') from e
+
+    def read_bytes(self, remote_path: str) -> bytes:
+        """Read a small file written by `atomic_write`
+
+        Args:
+            remote_path (str): remote file path
+        Returns:
+            bytes: content of the file
+        """
+        return self._fs.cat_file(remote_path)
+
+    def check_file(self, remote_path: str) -> bool:
+        """Check a small file written by `atomic_write` exists
+        """
+        return self._fs.exists(remote_path)
+
+    def size(self, remote_path: str) -> int:
+        """Size of a file in bytes"""
+        return self._fs.size(remote_path)
+
+    def read_range(self, remote_path: str, start: int, end: int) -> bytes:
+        """Read part of a file
+
+        Args:
+            remote_path (str): remote file path
+            start (int): first byte offset
+            end (int): byte offset after the last byte
+        Returns:
+            bytes: the bytes in [start, end)
+        """
+        with self._fs.open(remote_path, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start)
+
 
 class LocalBackend(FileSystem):
-    def __init__(self, directory='./'):
+    """
+    Local FileSystem.
+
+    Files are always replaced rather than overwritten in place,
+    so copies can be made as hardlinks (snapshot of the current content)
+    without duplicating the data.
+    """
+
+    def __init__(self, directory='./', temporary: bool = False):
         root_fs = LocalFileSystem()
         if not root_fs.exists(directory):
             root_fs.mkdir(directory)
-        super().__init__(DirFileSystem(directory))
+        super().__init__(DirFileSystem(directory), temporary=temporary)
+
+    def upload_core(self, file_obj: io.BytesIO, remote_path: str):
+        """Upload file object to a temporary file and
+        then rename it as the remote path.
+
+        Args:
+            file_obj (io.BytesIO): file to be upload
+            remote_path (str): remote file path
+        """
+        tmp_path = remote_path + '.uploading'
+        super().upload_core(file_obj, tmp_path)
+        try:
+            os.replace(self.local_path(tmp_path),
+                       self.local_path(remote_path))
+        except BaseException as e:
+            raise ValueError(f'{remote_path} upload failed') from e
+
+    def upload_stream(self, chunks: Iterable[bytes], remote_path: str):
+        tmp_path = remote_path + '.uploading'
+        super().upload_stream(chunks, tmp_path)
+        try:
+            os.replace(self.local_path(tmp_path),
+                       self.local_path(remote_path))
+        except BaseException as e:
+            raise ValueError(f'{remote_path} upload failed') from e
+
+    def copy_file(self, src_file: str, dest_file):
+        """Copy file as hardlink. Fallback to byte copy when hardlink
+        is not supported (e.g., directory or cross-device copy).
+        """
+        assert '.' in src_file, f'requires file ext .xxx provided in `src_file` but it is {src_file}'
+        assert '.' in dest_file, f'requires file ext .xxx provided in `dest_file` but it is {dest_file}'
+        self.drop_file(dest_file)
+        try:
+            os.link(self.local_path(src_file), self.local_path(dest_file))
+        except OSError:
+            self._fs.cp(src_file, dest_file, recursive=True)
+
+    def local_path(self, remote_path: str) -> str:
+        """Get the path of a file on the local disk"""
+        return self._fs._join(remote_path)
+
+
+class TransferController:
+    """
+    Adaptive chunk size and concurrency of the transfers of one backend.
+
+    The number of requests in flight follows AIMD: it grows by one after
+    each window of requests whose throughput did not degrade, and is halved
+    when the server throttles (429) or fails (5xx); such requests are
+    retried after a backoff. Concurrent transfers share the limit fairly:
+    a transfer exceeds its share only while no other transfer is waiting.
+    """
+
+    def __init__(self, min_chunksize: int = 2000000, max_chunksize: int = 64000000,
+                 min_concurrency: int = 1, max_concurrency: int = 16,
+                 initial_concurrency: int = 4, max_retries: int = 5,
+                 backoff: float = 1.0, tolerance: float = 0.1):
+        """
+        Args:
+            min_chunksize (int): chunk size of small objects and of streams of unknown size.
+            max_chunksize (int): chunk size upper bound.
+            min_concurrency (int): lower bound of requests in flight.
+            max_concurrency (int): upper bound of requests in flight.
+            initial_concurrency (int): requests in flight before any feedback.
+            max_retries (int): retries of a throttled request.
+            backoff (float): seconds to wait before the first retry (doubled per retry).
+            tolerance (float): relative throughput drop regarded as degradation.
+        """
+        assert 1 <= min_concurrency <= initial_concurrency <= max_concurrency
+        assert 0 < min_chunksize <= max_chunksize
+        self._min_chunksize = min_chunksize
+        self._max_chunksize = max_chunksize
+        self._min_concurrency = min_concurrency
+        self._max_concurrency = max_concurrency
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._tolerance = tolerance
+        self._limit = initial_concurrency
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._running = dict()
+        self._waiting = dict()
+        self._reset_window(None)
+
+    @property
+    def concurrency(self) -> int:
+        """Current limit of requests in flight"""
+        return self._limit
+
+    @property
+    def max_concurrency(self) -> int:
+        return self._max_concurrency
+
+    def chunksize_for(self, size: Optional[int]) -> int:
+        """Chunk size giving each request slot about two chunks of the object
+
+        Args:
+            size (Optional[int]): size of the object in bytes (None if unknown)
+        Returns:
+            int: chunk size in bytes
+        """
+        if size is None:
+            return self._min_chunksize
+        target = -(-size // (2 * self._limit))
+        return max(self._min_chunksize, min(self._max_chunksize, target))
+
+    @contextmanager
+    def transfer(self):
+        """Register a transfer sharing the request slots
 
+        Yields:
+            object: the token passed to `run`
+        """
+        token = object()
+        with self._cond:
+            self._running[token] = 0
+            self._waiting[token] = 0
+        try:
+            yield token
+        finally:
+            with self._cond:
+                del self._running[token]
+                del self._waiting[token]
+                self._cond.notify_all()
+
+    def run(self, token: object, request: Callable[[], object], nbytes: int) -> object:
+        """Run a request of a transfer once a slot is granted
+
+        Args:
+            token (object): token of the transfer
+            request (Callable): the request
+            nbytes (int): bytes moved by the request
+        Returns:
+            object: result of the request
+        """
+        for attempt in range(self._max_retries + 1):
+            self._acquire(token)
+            try:
+                result = request()
+            except BaseException as e:
+                self._release(token)
+                if attempt == self._max_retries or not TransferController.is_throttle(e):
+                    raise e
+                self._on_throttle()
+                backoff = getattr(e, 'backoff', None)
+                time.sleep(backoff if backoff else self._backoff * 2 ** attempt)
+                continue
+            self._release(token)
+            self._on_success(nbytes)
+            return result
+
+    @staticmethod
+    def is_throttle(error: BaseException) -> bool:
+        """Whether an error asks the client to slow down (429 / 5xx)"""
+        if isinstance(error, (dropbox.exceptions.RateLimitError,
+                              dropbox.exceptions.InternalServerError)):
+            return True
+        if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+            return error.response.status_code == 429 or error.response.status_code >= 500
+        return False
+
+    def _fair_share(self) -> int:
+        return max(1, self._limit // len(self._running))
+
+    def _may_start(self, token: object) -> bool:
+        if self._in_flight >= self._limit:
+            return False
+        if self._running[token] < self._fair_share():
+            return True
+        # above its share: only take slots no other transfer is waiting for
+        return all(count == 0 for other, count in self._waiting.items() if other is not token)
+
+    def _acquire(self, token: object):
+        with self._cond:
+            self._waiting[token] += 1
+            while not self._may_start(token):
+                self._cond.wait()
+            self._waiting[token] -= 1
+            self._running[token] += 1
+            self._in_flight += 1
+
+    def _release(self, token: object):
+        with self._cond:
+            self._running[token] -= 1
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _reset_window(self, throughput: Optional[float]):
+        self._window_start = time.time()
+        self._window_bytes = 0
+        self._window_count = 0
+        self._last_throughput = throughput
+
+    def _on_success(self, nbytes: int):
+        with self._cond:
+            self._window_bytes += nbytes
+            self._window_count += 1
+            if self._window_count < self._limit:
+                return
+            elapsed = max(time.time() - self._window_start, 1e-6)
+            throughput = self._window_bytes / elapsed
+            last = self._last_throughput
+            if last is None or throughput >= last * (1 - self._tolerance):
+                # additive increase
+                self._limit = min(self._max_concurrency, self._limit + 1)
+            else:
+                # the last increase did not pay off
+                self._limit = max(self._min_concurrency, self._limit - 1)
+            self._reset_window(throughput)
+            self._cond.notify_all()
+
+    def _on_throttle(self):
+        with self._cond:
+            # multiplicative decrease
+            self._limit = max(self._min_concurrency, self._limit // 2)
+            self._reset_window(None)
+
+
+class StagingArea:
+    """
+    Local directory keeping copies of remote files for memory-mapping.
+
+    Files are named by the fingerprint (content hash) of the remote file,
+    so an unchanged object (or a copy of it, e.g., `{id}_cache`) is
+    downloaded once and reused across runs. Content is streamed to
+    disk and the least recently used files are evicted when the
+    directory grows over `max_bytes`.
+
+    The paths handed out by `stage` are pinned until the consumer calls
+    `unpin`: pinned files are never evicted, and releasing a pinned file
+    is deferred until it is unpinned.
+    """
 
-limit_pool = Semaphore(value=8)
+    def __init__(self, directory: str = './.staging/',
+                 max_bytes: int = 16 * 1024 ** 3):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._path_locks = dict()
+        self._pins: Dict[str, int] = dict()
+        self._released = set()
+
+    def _path(self, fingerprint: str, remote_path: str) -> str:
+        ext = remote_path.split('.', 1)[1]
+        return os.path.join(self._directory, f'{fingerprint}.{ext}')
+
+    def stage(self, backend: FileSystem, remote_path: str) -> str:
+        """Get a local copy of a remote file (pinned until `unpin` is called)
+
+        Args:
+            backend (FileSystem): The filesystem holding the file.
+            remote_path (str): remote file path
+        Returns:
+            str: path of the local copy
+        """
+        fingerprint = backend.fingerprint(remote_path)
+        assert fingerprint is not None, f'{remote_path} does not exists in {backend}'
+        path = self._path(fingerprint, remote_path)
+        with self._lock:
+            os.makedirs(self._directory, exist_ok=True)
+            path_lock = self._path_locks.setdefault(path, threading.Lock())
+            self._pins[path] = self._pins.get(path, 0) + 1
+            self._released.discard(path)
+        try:
+            with path_lock:
+                if os.path.exists(path):
+                    os.utime(path)
+                    return path
+                tmp_path = path + '.downloading'
+                with open(tmp_path, 'wb') as f:
+                    backend.download_to(remote_path, f)
+                os.replace(tmp_path, path)
+        except BaseException:
+            self.unpin(path)
+            raise
+        self.evict()
+        return path
+
+    def unpin(self, path: str):
+        """Mark a staged path as no longer used by one of its consumers
+
+        Args:
+            path (str): path returned by `stage`
+        """
+        with self._lock:
+            count = self._pins.get(path, 0) - 1
+            if count > 0:
+                self._pins[path] = count
+                return
+            self._pins.pop(path, None)
+            if path in self._released:
+                self._released.discard(path)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def release(self, backend: FileSystem, remote_path: str):
+        """Remove the local copy of a remote file (e.g., before it is dropped).
+        The removal of a pinned copy is deferred until it is unpinned.
+
+        Args:
+            backend (FileSystem): The filesystem holding the file.
+            remote_path (str): remote file path
+        """
+        fingerprint = backend.fingerprint(remote_path)
+        if fingerprint is None:
+            return
+        path = self._path(fingerprint, remote_path)
+        with self._lock:
+            if path in self._pins:
+                self._released.add(path)
+            elif os.path.exists(path):
+                os.remove(path)
+
+    def evict(self, keep: Optional[str] = None):
+        """Remove the least recently used (unpinned) files until the
+        directory holds at most `max_bytes`.
+
+        Args:
+            keep (Optional[str]): path never to be removed
+        """
+        with self._lock:
+            files = []
+            for name in os.listdir(self._directory):
+                path = os.path.join(self._directory, name)
+                if not name.endswith('.downloading'):
+                    files.append((os.path.getmtime(path), os.path.getsize(path), path))
+            total = sum([size for _, size, _ in files])
+            for _, size, path in sorted(files):
+                if total <= self._max_bytes:
+                    break
+                if path != keep and path not in self._pins:
+                    os.remove(path)
+                    total -= size
+
+
+class DropboxMetadata:
+    """
+    Cache of the metadata of all files and folders under a dropbox directory.
+
+    It is populated by one recursive `list_folder` and kept up to date
+    incrementally with `list_folder/continue` on its cursor, so existence,
+    size and content hash lookups need no round trip within a run. Writes
+    through the backend mark the cache stale, and the next lookup
+    refreshes it (one round trip for all the preceding writes).
+
+    Backends on the same client and directory share one cache (see
+    `shared`); changes by other processes are picked up by `refresh`.
+    """
+    _registry = weakref.WeakKeyDictionary()
+    _registry_lock = threading.Lock()
+
+    def __init__(self, dbx: dropbox.Dropbox, directory: str):
+        self._dbx = dbx
+        self._directory = DropboxMetadata.normalize(directory)
+        self._lock = threading.Lock()
+        self._entries = None
+        self._by_hash = None
+        self._cursor = None
+        self._stale = True
+
+    @classmethod
+    def shared(cls, dbx: dropbox.Dropbox, directory: str) -> 'DropboxMetadata':
+        """
+        Args:
+            dbx (dropbox.Dropbox): dropbox client
+            directory (str): absolute dropbox path
+        Returns:
+            DropboxMetadata: the cache of the directory shared by the client's users
+        """
+        with cls._registry_lock:
+            caches = cls._registry.setdefault(dbx, dict())
+            directory = DropboxMetadata.normalize(directory)
+            if directory not in caches:
+                caches[directory] = cls(dbx, directory)
+            return caches[directory]
+
+    @staticmethod
+    def normalize(path: str) -> str:
+        parts = [part for part in path.split('/') if part]
+        if len(parts) == 0:
+            return ''
+        return ('/' + '/'.join(parts)).lower()
+
+    def invalidate(self):
+        """Mark the cache to be refreshed before the next lookup"""
+        self._stale = True
+
+    def refresh(self):
+        """Apply the changes since the last listing"""
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        if self._cursor is None:
+            self._entries = dict()
+            self._by_hash = dict()
+            try:
+                result = self._dbx.files_list_folder(
+                    self._directory, recursive=True)
+            except dropbox.exceptions.ApiError as e:
+                if e.error.is_path() and e.error.get_path().is_not_found():
+                    # directory not created yet: list again on next refresh
+                    self._stale = False
+                    return
+                raise e
+        else:
+            result = self._dbx.files_list_folder_continue(self._cursor)
+        while True:
+            for entry in result.entries:
+                if isinstance(entry, dropbox.files.DeletedMetadata):
+                    prefix = entry.path_lower + '/'
+                    for path in [path for path in self._entries
+                                 if path == entry.path_lower or path.startswith(prefix)]:
+                        content_hash = getattr(
+                            self._entries.pop(path), 'content_hash', None)
+                        if self._by_hash.get(content_hash) == path:
+                            del self._by_hash[content_hash]
+                else:
+                    self._entries[entry.path_lower] = entry
+                    if isinstance(entry, dropbox.files.FileMetadata) and entry.content_hash:
+                        self._by_hash[entry.content_hash] = entry.path_lower
+            if not result.has_more:
+                break
+            result = self._dbx.files_list_folder_continue(result.cursor)
+        self._cursor = result.cursor
+        self._stale = False
+
+    def _get_entries(self) -> Dict[str, object]:
+        with self._lock:
+            if self._stale or self._entries is None:
+                self._refresh()
+            return self._entries
+
+    def get(self, path: str) -> Optional[object]:
+        """
+        Args:
+            path (str): absolute dropbox path
+        Returns:
+            Optional[object]: FileMetadata / FolderMetadata (None if not exists)
+        """
+        return self._get_entries().get(DropboxMetadata.normalize(path))
+
+    def find(self, content_hash: str) -> Optional[str]:
+        """
+        Args:
+            content_hash (str): dropbox content hash
+        Returns:
+            Optional[str]: path of a file with this content (None if not found)
+        """
+        self._get_entries()
+        return self._by_hash.get(content_hash)
+
+    def list_files(self, path: str) -> List[object]:
+        """
+        Args:
+            path (str): absolute dropbox path of a folder
+        Returns:
+            List[object]: FileMetadata of the files directly in the folder
+        """
+        prefix = DropboxMetadata.normalize(path) + '/'
+        return [entry for key, entry in self._get_entries().items()
+                if key.startswith(prefix) and '/' not in key[len(prefix):]
+                and isinstance(entry, dropbox.files.FileMetadata)]
 
 
 class DropboxBackend(FileSystem):
@@ -169,11 +786,61 @@ class DropboxBackend(FileSystem):
     Storage object with IO interface left abstract
     """
 
-    def __init__(self, directory='/', chunksize=2000000):
+    def __init__(self, directory='/', chunksize=2000000, temporary: bool = False,
+                 staging: Optional[StagingArea] = None,
+                 transfer: Optional[TransferController] = None,
+                 root_fs: Optional[AbstractFileSystem] = None,
+                 dedup: bool = True):
+        """
+        Args:
+            directory (str): The root directory on dropbox.
+            chunksize (int): The minimum size of uploaded chunks
+                (the average size of content-defined chunks when `dedup`).
+            temporary (bool): Whether the filesystem only keeps intermediates.
+            staging (Optional[StagingArea]): Local copies for memory-mapping.
+            transfer (Optional[TransferController]): Chunk size and concurrency
+                control of the transfers of this backend.
+            root_fs (Optional[AbstractFileSystem]): filesystem speaking the dropbox
+                API (with a `dbx` client). Defaults to `MyDropboxFS`.
+            dedup (bool): Whether to upload content-defined chunks named by
+                their content hash, so unchanged chunks are not transferred again.
+        """
         assert directory.startswith('/')
-        root_fs = MyDropboxFS(token='')
-        super().__init__(DirFileSystem(directory, root_fs))
-        self._chunksize = chunksize
+        if root_fs is None:
+            root_fs = MyDropboxFS(token='')
+        super().__init__(DirFileSystem(directory, root_fs), temporary=temporary)
+        self._transfer = transfer if transfer is not None else TransferController(
+            min_chunksize=chunksize)
+        self._dedup = dedup
+        self._indices = dict()
+        self._links = dict()
+        self._staging = staging if staging is not None else StagingArea()
+        self._metadata = None
+
+    @property
+    def metadata(self) -> DropboxMetadata:
+        if self._metadata is None:
+            self._metadata = DropboxMetadata.shared(
+                self._fs.fs.dbx, self._fs.path)
+        return self._metadata
+
+    def stage(self, remote_path: str) -> str:
+        """Get a local copy of a file in the staging area (pinned until `unpin`)
+
+        Args:
+            remote_path (str): remote file path
+        Returns:
+            str: path of the local copy
+        """
+        return self._staging.stage(self, remote_path)
+
+    def unpin(self, path: str):
+        """Mark a path returned by `stage` as no longer used
+
+        Args:
+            path (str): local path of the staged file
+        """
+        self._staging.unpin(path)
 
     def upload_core(self, file_obj: io.BytesIO, remote_path: str):
         """Upload file object to local storage
@@ -182,47 +849,174 @@ class DropboxBackend(FileSystem):
             file_obj (io.BytesIO): file to be upload
             remote_path (str): remote file path
         """
+        try:
+            file_obj.seek(0)
+            buff = file_obj.getbuffer()
+        except BaseException as e:
+            raise ValueError(f'{remote_path} upload failed') from e
+        self.upload_stream(self.__split_bytes(
+            buff, self.chunksize_for(len(buff))), remote_path)
+
+    @property
+    def transfer(self) -> TransferController:
+        return self._transfer
+
+    @property
+    def chunksize(self) -> int:
+        return self._transfer.chunksize_for(None)
+
+    def chunksize_for(self, size: Optional[int]) -> int:
+        return self._transfer.chunksize_for(size)
+
+    def upload_stream(self, chunks: Iterable[bytes], remote_path: str):
+        """Upload chunks into the chunk folder of the remote path.
+        Each chunk is uploaded by the thread pool once it is produced, and
+        the production is held back while the uploads are behind.
+
+        Args:
+            chunks (Iterable[bytes]): consecutive parts of the file
+            remote_path (str): remote file path
+        """
         assert '.' in remote_path, f'requires file ext .xxx provided in `remote_path` but it is {remote_path}'
+        if self._dedup:
+            return self._upload_dedup(chunks, remote_path)
         file_name = remote_path.split('.')[0]
         ext = remote_path.split('.')[1]
 
-        if self._fs.exists(f'{file_name}'):
+        if self._exists(file_name):
             self._fs.rm(f'{file_name}')
             self._fs.mkdir(f'{file_name}')
         else:
             self._fs.mkdir(f'{file_name}')
+        self.metadata.invalidate()
         dfs = DirFileSystem(f'/{file_name}', self._fs)
 
-        def partial_upload(item):
-            limit_pool.acquire()
-            try:
-                index = item[0]
-                chunk = item[1]
+        def partial_upload(token, index, chunk):
+            def request():
                 with dfs.open(f'{index}.{ext}', 'wb') as f:
                     f.write(chunk)
-            finally:
-                limit_pool.release()
+                return len(chunk)
+            return self._transfer.run(token, request, len(chunk))
         try:
-            file_obj.seek(0)
-            buff = file_obj.getbuffer()
-            with ThreadPoolExecutor(max_workers=8) as executor:
-                input_pipe = self.__split_bytes(buff)
-                output_pipe = executor.map(
-                    partial_upload, enumerate(input_pipe))
-                _ = list(tqdm.tqdm(output_pipe,
-                                   total=len(buff) // self._chunksize))
+            with self._transfer.transfer() as token, ThreadPoolExecutor(
+                    max_workers=self._transfer.max_concurrency) as executor:
+                output_pipe = self._submit_window(
+                    executor, lambda item: partial_upload(token, *item), enumerate(chunks))
+                local_size = sum(tqdm.tqdm(output_pipe))
             # Checking Data Size Correctness
-            local_size = len(buff)
             remote_file_info = dict([(_fn['name'].split('/')[-1], _fn['size'])
                                     for _fn in self._fs.ls(f'{file_name}') if _fn['type'] == 'file'])
             remote_size = sum(remote_file_info.values())
             assert local_size == remote_size, f'local size ({local_size}) != remote size ({remote_size})'
         except BaseException as e:
             raise ValueError(f'{remote_path} upload failed') from e
+        finally:
+            self.metadata.invalidate()
 
-    def __split_bytes(self, buff: bytes):
-        for i in range(len(buff) // self._chunksize + 1):
-            yield buff[i * self._chunksize: (i + 1) * self._chunksize]
+    def _submit_window(self, executor: ThreadPoolExecutor,
+                       function: Callable, items: Iterable) -> Iterable:
+        """Map items by the executor in order, with at most two items per
+        request slot submitted ahead, so a generator of chunks is consumed
+        only as fast as its chunks are uploaded.
+        """
+        futures = deque()
+        for item in items:
+            futures.append(executor.submit(function, item))
+            while len(futures) >= 2 * self._transfer.concurrency:
+                yield futures.popleft().result()
+        while len(futures):
+            yield futures.popleft().result()
+
+    def _upload_dedup(self, chunks: Iterable[bytes], remote_path: str):
+        """Upload content-defined chunks named by their content hash.
+        Chunks already in the folder are kept, chunks found elsewhere
+        on dropbox are copied server-side, and only the others are
+        transferred. The chunk order is committed in `_index.json`,
+        after which the chunks no longer referenced are deleted.
+
+        Args:
+            chunks (Iterable[bytes]): consecutive parts of the file
+            remote_path (str): remote file path
+        """
+        file_name = remote_path.split('.')[0]
+        ext = remote_path.split('.')[1]
+        folder = self._fs._join(file_name)
+        # chunks may be changed by others since the last listing
+        self.metadata.refresh()
+        if not self._exists(file_name, refresh=False):
+            self._fs.mkdir(f'{file_name}')
+            self.metadata.invalidate()
+        dfs = DirFileSystem(f'/{file_name}', self._fs)
+        dbx = self._fs.fs.dbx
+        present = dict([(entry.name, entry.size)
+                       for entry in self.metadata.list_files(folder)])
+        claimed = set()
+        lock = threading.Lock()
+        counts = {'kept': 0, 'copied': 0, 'uploaded': 0}
+
+        def put_chunk(token, chunk):
+            content_hash = dropbox_content_hash(chunk)
+            name = f'{content_hash}.{ext}'
+            source = self.metadata.find(content_hash)
+            with lock:
+                kept = name in claimed or present.get(name) == len(chunk)
+                claimed.add(name)
+                action = 'kept' if kept else (
+                    'uploaded' if source is None else 'copied')
+                counts[action] += 1
+            if action == 'kept':
+                return name, len(chunk)
+            if action == 'copied':
+                try:
+                    self._transfer.run(token, lambda: dbx.files_copy_v2(
+                        source, f'{folder}/{name}'), len(chunk))
+                    return name, len(chunk)
+                except dropbox.exceptions.ApiError as e:
+                    if not (e.error.is_from_lookup() and e.error.get_from_lookup().is_not_found()):
+                        raise e
+                    # the source is deleted since it was listed: upload the chunk
+                    with lock:
+                        counts['copied'] -= 1
+                        counts['uploaded'] += 1
+
+            def request():
+                with dfs.open(name, 'wb') as f:
+                    f.write(chunk)
+            self._transfer.run(token, request, len(chunk))
+            return name, len(chunk)
+        try:
+            with self._transfer.transfer() as token, ThreadPoolExecutor(
+                    max_workers=self._transfer.max_concurrency) as executor:
+                index = list(tqdm.tqdm(self._submit_window(
+                    executor, lambda chunk: put_chunk(token, chunk),
+                    content_chunks(chunks, avg_size=self.chunksize))))
+            with dfs.open('_index.json', 'wb') as f:
+                f.write(json.dumps(index).encode())
+            self.metadata.invalidate()
+            # Checking Data Size Correctness
+            remote_file_info = dict([(entry.name, entry.size)
+                                    for entry in self.metadata.list_files(folder)])
+            for name, size in index:
+                assert remote_file_info.get(
+                    name) == size, f'remote size of {name} ({remote_file_info.get(name)}) != local size ({size})'
+            referenced = set([name for name, _ in index] + ['_index.json'])
+            stales = [dropbox.files.DeleteArg(f'{folder}/{name}')
+                      for name in remote_file_info if name not in referenced]
+            if len(stales):
+                launch = dbx.files_delete_batch(stales)
+                if launch.is_async_job_id():
+                    DropboxBackend.__wait_batch(
+                        dbx.files_delete_batch_check, launch.get_async_job_id())
+            print(f'{remote_path}: {counts["uploaded"]} chunks uploaded, '
+                  f'{counts["copied"]} copied and {counts["kept"]} kept')
+        except BaseException as e:
+            raise ValueError(f'{remote_path} upload failed') from e
+        finally:
+            self.metadata.invalidate()
+
+    def __split_bytes(self, buff: bytes, chunksize: int):
+        for i in range(len(buff) // chunksize + 1):
+            yield buff[i * chunksize: (i + 1) * chunksize]
 
     def download_core(self, remote_path: str) -> io.BytesIO:
         """Download file from remote storage
@@ -233,58 +1027,187 @@ class DropboxBackend(FileSystem):
         Returns:
             io.BytesIO: downloaded file
         """
-        assert '.' in remote_path, f'requires file ext .xxx provided in `remote_path` but it is {remote_path}'
+        result = io.BytesIO()
+        self.download_to(remote_path, result)
+        result.seek(0)
+        return result
+
+    def download_to(self, remote_path: str, file_obj: io.RawIOBase):
+        """Download chunks in parallel and write them to a file in order.
+        The chunk order is read from `_index.json` (deduplicated uploads)
+        or from the chunk numbering. At most two chunks per request slot
+        are held in memory. The listing is refreshed first, and once more
+        for a retry if the file is rewritten during the download.
+
+        Args:
+            remote_path (str): remote file path
+            file_obj (io.RawIOBase): writable file receiving the content
+        """
+        start = file_obj.tell()
+        # the file may be rewritten by others since the last listing
+        self.metadata.refresh()
+        try:
+            self._download_to(remote_path, file_obj)
+        except ValueError:
+            # chunks deleted by a rewrite during the download: retry once
+            self.metadata.refresh()
+            file_obj.seek(start)
+            file_obj.truncate()
+            self._download_to(remote_path, file_obj)
+
+    def _download_to(self, remote_path: str, file_obj: io.RawIOBase):
         file_name = remote_path.split('.')[0]
-        ext = remote_path.split('.')[1]
-        assert self._fs.exists(
-            f'{file_name}'), f'{file_name} folder does not exists for FileSystem: {self._fs}'
-        remote_file_info = dict([(_fn['name'].split('/')[-1], _fn['size'])
-                                for _fn in self._fs.ls(f'{file_name}') if _fn['type'] == 'file'])
         dfs = DirFileSystem(file_name, self._fs)
 
-        def partial_download(index):
-            limit_pool.acquire()
-            try:
-                fn = f'{index}.{ext}'
-                assert dfs.exists(fn), f'{fn} does not exists in {dfs}'
+        def partial_download(token, position):
+            fn, size = index[position]
+
+            def request():
                 with dfs.open(fn, 'rb') as f:
-                    _result = f.read()
-                assert len(
-                    _result) == remote_file_info[fn], f'download size does not match with remote size. download size:{len(_result)}; remote size: {remote_file_info[fn]}; remote'
-                return _result
-            finally:
-                limit_pool.release()
+                    return f.read()
+            _result = self._transfer.run(token, request, size)
+            assert len(
+                _result) == size, f'download size does not match with remote size. download size:{len(_result)}; remote size: {size}; remote'
+            return _result
 
         try:
-            with ThreadPoolExecutor(max_workers=8) as executor:
-                output_pipe = executor.map(
-                    partial_download, range(
-                        len(remote_file_info)))
-                output_pipe = tqdm.tqdm(
-                    output_pipe, total=len(remote_file_info))
-                results = list(output_pipe)
-            buff = b''.join(results)
-            result = io.BytesIO(buff)
+            index = self._chunks(remote_path)
+            local_size = 0
+            with self._transfer.transfer() as token, ThreadPoolExecutor(
+                    max_workers=self._transfer.max_concurrency) as executor:
+                futures = dict()
+                for position in tqdm.tqdm(range(len(index))):
+                    window = 2 * self._transfer.concurrency
+                    for ahead in range(position, min(position + window, len(index))):
+                        if ahead not in futures:
+                            futures[ahead] = executor.submit(
+                                partial_download, token, ahead)
+                    chunk = futures.pop(position).result()
+                    file_obj.write(chunk)
+                    local_size += len(chunk)
             # Checking Data Size Correctness
-            local_size = len(buff)
-            remote_size = sum(remote_file_info.values())
+            remote_size = sum([size for _, size in index])
             assert local_size == remote_size, f'local size ({local_size}) != remote size ({remote_size})'
-            return result
         except BaseException as e:
             raise ValueError(f'{remote_path} download failed') from e
 
+    def _chunks(self, remote_path: str) -> List[Tuple[str, int]]:
+        """Names and sizes of the chunks of a file in order.
+        The chunk order is read from `_index.json` (deduplicated uploads)
+        or from the chunk numbering.
+        """
+        assert '.' in remote_path, f'requires file ext .xxx provided in `remote_path` but it is {remote_path}'
+        file_name = remote_path.split('.')[0]
+        ext = remote_path.split('.')[1]
+        assert self._exists(
+            file_name), f'{file_name} folder does not exists for FileSystem: {self._fs}'
+        folder = self._fs._join(file_name)
+        entries = dict([(entry.name, entry)
+                       for entry in self.metadata.list_files(folder)])
+        if '_index.json' in entries:
+            content_hash = entries.pop('_index.json').content_hash
+            cached = self._indices.get(folder)
+            if cached is None or cached[0] != content_hash:
+                with self._fs.open(f'{file_name}/_index.json', 'rb') as f:
+                    names = [name for name, _ in json.loads(f.read())]
+                cached = (content_hash, names)
+                self._indices[folder] = cached
+            names = cached[1]
+        else:
+            names = [f'{i}.{ext}' for i in range(len(entries))]
+        for name in names:
+            assert name in entries, f'{name} does not exists in {folder}'
+        return [(name, entries[name].size) for name in names]
+
+    def size(self, remote_path: str) -> int:
+        return sum([size for _, size in self._chunks(remote_path)])
+
+    def read_range(self, remote_path: str, start: int, end: int) -> bytes:
+        """Read part of a file by ranged requests on the chunks it spans
+
+        Args:
+            remote_path (str): remote file path
+            start (int): first byte offset
+            end (int): byte offset after the last byte
+        Returns:
+            bytes: the bytes in [start, end)
+        """
+        try:
+            return self._read_range(remote_path, start, end)
+        except ValueError:
+            # chunks deleted by a rewrite of others: refresh and retry once
+            self.metadata.refresh()
+            return self._read_range(remote_path, start, end)
+
+    def _read_range(self, remote_path: str, start: int, end: int) -> bytes:
+        folder = self._fs._join(remote_path.split('.')[0])
+        parts = []
+        offset = 0
+        try:
+            with self._transfer.transfer() as token:
+                for name, size in self._chunks(remote_path):
+                    lower, upper = max(start, offset), min(end, offset + size)
+                    if lower < upper:
+                        parts.append(self._transfer.run(token, lambda: self._read_chunk(
+                            f'{folder}/{name}', lower - offset, upper - offset), upper - lower))
+                    offset += size
+                    if offset >= end:
+                        break
+        except BaseException as e:
+            raise ValueError(f'{remote_path} read failed') from e
+        return b''.join(parts)
+
+    def _read_chunk(self, path: str, start: int, end: int) -> bytes:
+        """Ranged download of a chunk through its temporary link"""
+        key = (path, self.metadata.get(path).rev)
+        link = self._links.get(key)
+        if link is None:
+            link = self._fs.fs.dbx.files_get_temporary_link(path).link
+            self._links[key] = link
+        response = requests.get(
+            link, headers={'Range': f'bytes={start}-{end - 1}'})
+        if response.status_code in [404, 410]:
+            # expired link
+            del self._links[key]
+            return self._read_chunk(path, start, end)
+        response.raise_for_status()
+        assert len(response.content) == end - \
+            start, f'ranged read of {path} returns {len(response.content)} bytes rather than {end - start}'
+        return response.content
+
+    def _exists(self, path: str, refresh: bool = True) -> bool:
+        path = self._fs._join(path)
+        if self.metadata.get(path) is None and refresh:
+            # may be created by others since the last listing
+            self.metadata.refresh()
+        return self.metadata.get(path) is not None
+
     def check_exists(self, remote_path: str) -> bool:
         assert '.' in remote_path, f'requires file ext .xxx provided in `remote_path` but it is {remote_path}'
         file_name = remote_path.split('.')[0]
-        return self._fs.exists(file_name)
+        return self._exists(file_name)
+
+    def exists_many(self, remote_paths: List[str]) -> List[bool]:
+        for remote_path in remote_paths:
+            assert '.' in remote_path, f'requires file ext .xxx provided in `remote_path` but it is {remote_path}'
+        # one refresh for the whole batch
+        self.metadata.refresh()
+        return [self._exists(remote_path.split('.')[0], refresh=False)
+                for remote_path in remote_paths]
+
+    def check_file(self, remote_path: str) -> bool:
+        return self._exists(remote_path)
 
     def drop_file(self, remote_path: str):
         assert '.' in remote_path, f'requires file ext .xxx provided in `remote_path` but it is {remote_path}'
         file_name = remote_path.split('.')[0]
+        self._staging.release(self, remote_path)
         try:
             return self._fs.rm(file_name)
         except FileNotFoundError:
             pass
+        finally:
+            self.metadata.invalidate()
 
     def copy_file(self, src_file: str, dest_file):
         assert '.' in src_file, f'requires file ext .xxx provided in `src_file` but it is {src_file}'
@@ -293,3 +1216,319 @@ class DropboxBackend(FileSystem):
         src_file = src_file.split('.')[0]
         dest_file = dest_file.split('.')[0]
         self._fs.cp(src_file, dest_file, recursive=True)
+        self.metadata.invalidate()
+
+    def copy_files(self, file_pairs: List[Tuple[str, str]]):
+        """Copy multiple files by one server-side batch copy
+
+        Args:
+            file_pairs (List[Tuple[str, str]]): pairs of source and destination file
+        """
+        for src_file, dest_file in file_pairs:
+            assert '.' in src_file, f'requires file ext .xxx provided in `src_file` but it is {src_file}'
+            assert '.' in dest_file, f'requires file ext .xxx provided in `dest_file` but it is {dest_file}'
+        if len(file_pairs) == 0:
+            return
+        folder_pairs = [(self._fs._join(src_file.split('.')[0]), self._fs._join(
+            dest_file.split('.')[0])) for src_file, dest_file in file_pairs]
+        dbx = self._fs.fs.dbx
+        try:
+            drops = [dropbox.files.DeleteArg(dest)
+                     for _, dest in folder_pairs if self.metadata.get(dest) is not None]
+            if len(drops):
+                launch = dbx.files_delete_batch(drops)
+                if launch.is_async_job_id():
+                    DropboxBackend.__wait_batch(
+                        dbx.files_delete_batch_check, launch.get_async_job_id())
+            launch = dbx.files_copy_batch_v2([
+                dropbox.files.RelocationPath(from_path=src, to_path=dest)
+                for src, dest in folder_pairs
+            ], autorename=False)
+            if launch.is_async_job_id():
+                result = DropboxBackend.__wait_batch(
+                    dbx.files_copy_batch_check_v2, launch.get_async_job_id())
+            else:
+                result = launch.get_complete()
+            for (src, dest), entry in zip(folder_pairs, result.entries):
+                assert entry.is_success(
+                ), f'copy from {src} to {dest} failed: {entry}'
+        except BaseException as e:
+            raise ValueError(f'batch copy of {file_pairs} failed') from e
+        finally:
+            self.metadata.invalidate()
+
+    def fingerprint(self, remote_path: str) -> Optional[str]:
+        """Fingerprint a chunk folder by the content hashes of its chunks
+        (after refreshing the listing, as the file may be rewritten by others)"""
+        assert '.' in remote_path, f'requires file ext .xxx provided in `remote_path` but it is {remote_path}'
+        self.metadata.refresh()
+        if not self._exists(remote_path.split('.')[0], refresh=False):
+            return None
+        hashes = sorted([(entry.name, entry.content_hash) for entry in self.metadata.list_files(
+            self._fs._join(remote_path.split('.')[0]))])
+        return hashlib.md5(json.dumps(hashes).encode()).hexdigest()
+
+    def atomic_write(self, data: bytes, remote_path: str):
+        """Upload a small file as a single dropbox file.
+        Dropbox commits an upload session at once, so
+        readers never see a partial file.
+        """
+        try:
+            with self._fs.open(remote_path, 'wb') as f:
+                f.write(data)
+        except BaseException as e:
+            raise ValueError(f'{remote_path} write failed') from e
+        finally:
+            self.metadata.invalidate()
+
+    @staticmethod
+    def __wait_batch(check, async_job_id: str, interval: float = 0.5):
+        while True:
+            status = check(async_job_id)
+            if status.is_complete():
+                return status.get_complete()
+            elif status.is_failed():
+                raise ValueError(
+                    f'batch job {async_job_id} failed: {status.get_failed()}')
+            time.sleep(interval)
+
+
+class VersionedBackend(FileSystem):
+    """
+    FileSystem publishing objects through a manifest.
+
+    Each upload is written under a new versioned key
+    (e.g., `a.parquet` -> `a__v3.parquet`) of the wrapped
+    backend and becomes visible only when the manifest is
+    atomically replaced. A crash during upload leaves the
+    previously published version readable, readers always
+    see complete objects and the last `keep` versions
+    of an object can be rolled back to.
+
+    Copies only add manifest entries pointing to the same versioned key.
+    Uploads run concurrently; manifest commits are guarded by a
+    lock within the process, so writers of a directory should
+    live in one process.
+    """
+    MANIFEST = '_manifest.json'
+
+    def __init__(self, backend: FileSystem, keep: int = 2):
+        """
+        Args:
+            backend (FileSystem): The filesystem storing the versioned objects.
+            keep (int): Number of versions kept per object for rollback.
+        """
+        assert isinstance(backend, FileSystem), 'backend should be FileSystem'
+        assert keep >= 1, 'keep should be at least 1'
+        self._backend = backend
+        self._keep = keep
+        self._lock = threading.RLock()
+        self._reserved = set()
+        super().__init__(backend._fs, temporary=backend.temporary)
+
+    @property
+    def backend(self) -> FileSystem:
+        return self._backend
+
+    def load_manifest(self) -> Dict[str, List[str]]:
+        """Load the manifest
+
+        Returns:
+            Dict[str, List[str]]: versioned keys of each object (latest last)
+        """
+        if not self._backend.check_file(self.MANIFEST):
+            return dict()
+        return json.loads(self._backend.read_bytes(self.MANIFEST).decode())
+
+    def _commit(self, manifest: Dict[str, List[str]]):
+        self._backend.atomic_write(
+            json.dumps(manifest, sort_keys=True).encode(), self.MANIFEST)
+
+    def resolve(self, remote_path: str) -> str:
+        """Get the versioned key currently published for a path
+
+        Args:
+            remote_path (str): path of the object
+        Returns:
+            str: versioned key in the wrapped backend
+        """
+        manifest = self.load_manifest()
+        assert remote_path in manifest, f'{remote_path} is not published in {self._backend}'
+        return manifest[remote_path][-1]
+
+    @property
+    def chunksize(self) -> int:
+        return self._backend.chunksize
+
+    def chunksize_for(self, size: Optional[int]) -> int:
+        return self._backend.chunksize_for(size)
+
+    def upload_core(self, file_obj: io.BytesIO, remote_path: str):
+        self._publish(remote_path, lambda key: self._backend.upload_core(
+            file_obj, key))
+
+    def upload_stream(self, chunks: Iterable[bytes], remote_path: str):
+        self._publish(remote_path, lambda key: self._backend.upload_stream(
+            chunks, key))
+
+    def _publish(self, remote_path: str, upload):
+        """Upload to a new versioned key and publish it in the manifest"""
+        assert '.' in remote_path, f'requires file ext .xxx provided in `remote_path` but it is {remote_path}'
+        with self._lock:
+            key = self._next_key(self.load_manifest(), remote_path, self._reserved)
+            self._reserved.add(key)
+        try:
+            upload(key)
+            with self._lock:
+                manifest = self.load_manifest()
+                history = manifest.get(remote_path, []) + [key]
+                manifest[remote_path] = history[-self._keep:]
+                self._commit(manifest)
+                self._collect(manifest, history[:-self._keep])
+        finally:
+            with self._lock:
+                self._reserved.discard(key)
+
+    def download_core(self, remote_path: str) -> io.BytesIO:
+        return self._backend.download_core(self.resolve(remote_path))
+
+    def size(self, remote_path: str) -> int:
+        return self._backend.size(self.resolve(remote_path))
+
+    def read_range(self, remote_path: str, start: int, end: int) -> bytes:
+        return self._backend.read_range(self.resolve(remote_path), start, end)
+
+    def fingerprint(self, remote_path: str) -> Optional[str]:
+        manifest = self.load_manifest()
+        if remote_path not in manifest:
+            return None
+        return self._backend.fingerprint(manifest[remote_path][-1])
+
+    def check_exists(self, remote_path: str) -> bool:
+        return remote_path in self.load_manifest()
+
+    def exists_many(self, remote_paths: List[str]) -> List[bool]:
+        manifest = self.load_manifest()
+        return [remote_path in manifest for remote_path in remote_paths]
+
+    def drop_file(self, remote_path: str):
+        with self._lock:
+            manifest = self.load_manifest()
+            if remote_path not in manifest:
+                return
+            history = manifest.pop(remote_path)
+            self._commit(manifest)
+            self._collect(manifest, history)
+
+    def copy_file(self, src_file: str, dest_file):
+        self.copy_files([(src_file, dest_file)])
+
+    def copy_files(self, file_pairs: List[Tuple[str, str]]):
+        """Copy files by pointing the destinations to the
+        current versions of the sources in one manifest commit.
+        """
+        with self._lock:
+            manifest = self.load_manifest()
+            replaced = []
+            for src_file, dest_file in file_pairs:
+                assert src_file in manifest, f'{src_file} is not published in {self._backend}'
+                replaced.extend(manifest.get(dest_file, []))
+                manifest[dest_file] = [manifest[src_file][-1]]
+            self._commit(manifest)
+            self._collect(manifest, replaced)
+
+    def rollback(self, remote_path: str, steps: int = 1):
+        """Publish an earlier version of an object
+
+        Args:
+            remote_path (str): path of the object
+            steps (int): number of versions to go back
+        """
+        with self._lock:
+            manifest = self.load_manifest()
+            history = manifest.get(remote_path, [])
+            assert len(history) > steps, f'{remote_path} has only {len(history)} versions'
+            manifest[remote_path] = history[:-steps]
+            self._commit(manifest)
+            self._collect(manifest, history[-steps:])
+
+    @staticmethod
+    def _next_key(manifest: Dict[str, List[str]], remote_path: str,
+                  reserved: Set[str]) -> str:
+        stem, ext = remote_path.split('.', 1)
+        prefix = stem + '__v'
+        keys = [key for keys in manifest.values() for key in keys] + list(reserved)
+        versions = [int(key.split('.')[0][len(prefix):])
+                    for key in keys
+                    if key.split('.')[0].startswith(prefix)
+                    and key.split('.')[0][len(prefix):].isdigit()]
+        return f'{prefix}{max(versions, default=0) + 1}.{ext}'
+
+    def _collect(self, manifest: Dict[str, List[str]], keys: List[str]):
+        """Drop versioned keys no longer referenced by the manifest"""
+        referenced = set([key for keys in manifest.values() for key in keys])
+        for key in set(keys) - referenced:
+            self._backend.drop_file(key)
+
+
+class BackendFile(AbstractBufferedFile):
+    """Read-only file of a FileSystem fetched by ranged reads"""
+
+    def __init__(self, fs: 'BackendFileSystem', path: str, size: int, block_size: int):
+        super().__init__(fs, path, mode='rb', block_size=block_size,
+                         cache_type='readahead', size=size)
+
+    def _fetch_range(self, start: int, end: int) -> bytes:
+        return self.fs.backend.read_range(self.path, start, end)
+
+
+class BackendFileSystem(AbstractFileSystem):
+    """
+    Read-only fsspec adapter of a FileSystem,
+    e.g., for registering the FileSystem on DuckDB.
+
+    Files are addressed as `{protocol}://{remote_path}`, so table
+    functions (`read_parquet`) fetch only the byte ranges they need,
+    also across the chunk folders of DropboxBackend.
+    """
+    cachable = False
+
+    def __init__(self, backend: FileSystem, protocol: str):
+        """
+        Args:
+            backend (FileSystem): The FileSystem to read from.
+            protocol (str): The prefix of the paths.
+        """
+        super().__init__()
+        self.backend = backend
+        self.protocol = protocol
+
+    def _strip_protocol(self, path: str) -> str:
+        return path.split('://', 1)[-1].lstrip('/')
+
+    def unstrip_protocol(self, name: str) -> str:
+        return f'{self.protocol}://{self._strip_protocol(name)}'
+
+    def exists(self, path: str, **kwargs) -> bool:
+        return self.backend.check_exists(self._strip_protocol(path))
+
+    def info(self, path: str, **kwargs) -> Dict:
+        remote_path = self._strip_protocol(path)
+        if not self.backend.check_exists(remote_path):
+            raise FileNotFoundError(path)
+        return {'name': remote_path, 'size': self.backend.size(remote_path), 'type': 'file'}
+
+    def ls(self, path: str, detail: bool = True, **kwargs) -> List:
+        info = self.info(path)
+        return [info] if detail else [info['name']]
+
+    def glob(self, path: str, **kwargs) -> List[str]:
+        assert '*' not in path and '?' not in path, f'glob pattern is not supported: {path}'
+        remote_path = self._strip_protocol(path)
+        return [remote_path] if self.backend.check_exists(remote_path) else []
+
+    def _open(self, path: str, mode: str = 'rb', block_size=None, **kwargs) -> BackendFile:
+        assert mode == 'rb', f'{type(self).__name__} is read-only'
+        remote_path = self._strip_protocol(path)
+        return BackendFile(self, remote_path, self.backend.size(remote_path),
+                           block_size or self.backend.chunksize)
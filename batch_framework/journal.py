@@ -0,0 +1,64 @@
+"""
+Run journal for resuming a failed ETLGroup run
+"""
+import threading
+from typing import Dict, Optional
+from .storage import JsonStorage
+from .filesystem import FileSystem
+
+__all__ = ['RunJournal']
+
+
+class RunJournal:
+    """
+    Record of the ETL units completed in a run.
+
+    Each entry holds the fingerprints of the inputs and
+    outputs of a unit when it finished, so a resumed run
+    can tell whether the results of the unit are still valid.
+    """
+
+    def __init__(self, fs: FileSystem, journal_id: str):
+        """
+        Args:
+            fs (FileSystem): The filesystem keeping the journal.
+            journal_id (str): The object id of the journal.
+        """
+        self._storage = JsonStorage(fs)
+        self._journal_id = journal_id
+        self._lock = threading.Lock()
+        if self._storage.check_exists(journal_id):
+            self._entries = self._storage.download(journal_id)
+        else:
+            self._entries = dict()
+
+    def get(self, key: str) -> Optional[Dict[str, Dict[str, Optional[str]]]]:
+        """Get the entry of a completed unit
+
+        Args:
+            key (str): The journal key of the unit.
+        Returns:
+            Optional[Dict]: fingerprints of `inputs` and `outputs`
+                (None if the unit is not completed).
+        """
+        return self._entries.get(key)
+
+    def record(self, key: str, inputs: Dict[str, Optional[str]],
+               outputs: Dict[str, Optional[str]]):
+        """Record a completed unit and persist the journal
+
+        Args:
+            key (str): The journal key of the unit.
+            inputs (Dict[str, Optional[str]]): fingerprint of each input id.
+            outputs (Dict[str, Optional[str]]): fingerprint of each output id.
+        """
+        with self._lock:
+            self._entries[key] = {'inputs': inputs, 'outputs': outputs}
+            self._storage.upload(self._entries, self._journal_id)
+
+    def clear(self):
+        """Remove the journal once the run has completed"""
+        with self._lock:
+            self._entries = dict()
+            if self._storage.check_exists(self._journal_id):
+                self._storage.drop(self._journal_id)
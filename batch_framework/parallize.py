@@ -7,7 +7,7 @@ import pandas as pd
 import pyarrow as pa
 from dill.source import getsource
 from batch_framework.etl import ObjProcessor, ETLGroup, SQLExecutor
-from batch_framework.storage import Storage, VaexStorage, PandasStorage, PyArrowStorage
+from batch_framework.storage import Storage, DataFrameStorage, VaexStorage, PandasStorage, PyArrowStorage, ArrowIPCStorage
 from batch_framework.filesystem import FileSystem
 from batch_framework.rdb import DuckDBBackend
 
@@ -33,9 +33,10 @@ class MapReduce(ETLGroup):
         output_type = self._map.get_output_type()
 
         class MapClass(ObjProcessor):
-            def __init__(self, input_storage: Storage, partition_id: int):
+            def __init__(self, input_storage: Storage,
+                         output_storage: Storage, partition_id: int):
                 self._partition_id = partition_id
-                super().__init__(input_storage)
+                super().__init__(input_storage, output_storage)
 
             @property
             def input_ids(self):
@@ -61,8 +62,10 @@ class MapReduce(ETLGroup):
             def start(self, **kwargs):
                 return map.start(**kwargs)
 
-        mappers = [MapClass(type(self._map._input_storage)(tmp_fs), i)
-                   for i in range(parallel_count)]
+        mappers = [MapClass(
+            MapReduce._tmp_storage(self._map._input_storage, tmp_fs),
+            MapReduce._tmp_storage(self._map._output_storage, tmp_fs),
+            i) for i in range(parallel_count)]
         self._mappers = mappers
         self._partition_preprocessor = AddPartitionKey(
             map_name,
@@ -85,6 +88,17 @@ class MapReduce(ETLGroup):
         ]
         super().__init__(*units)
 
+    @staticmethod
+    def _tmp_storage(storage: Storage, tmp_fs: FileSystem) -> Storage:
+        """Build a storage of the same type (and schema / write policy) on tmp_fs"""
+        if isinstance(storage, ArrowIPCStorage):
+            return ArrowIPCStorage(tmp_fs, schema=storage._schema,
+                                   compression=storage._compression)
+        if isinstance(storage, DataFrameStorage):
+            return type(storage)(tmp_fs, schema=storage._schema,
+                                 policy=storage._policy)
+        return type(storage)(tmp_fs)
+
     @property
     def external_input_ids(self) -> List[str]:
         if self._has_external_input:
@@ -116,6 +130,12 @@ class AddPartitionKey(SQLExecutor):
         self._divide_count = divide_count
         super().__init__(rdb=DuckDBBackend(), input_fs=input_fs, output_fs=output_fs)
 
+    def storage_of(self, fs: FileSystem, is_output: bool) -> Storage:
+        if is_output:
+            # read as parquet by EfficientDivide
+            return PyArrowStorage(fs)
+        return super().storage_of(fs, is_output)
+
     @property
     def input_ids(self):
         return self._obj_ids
@@ -2,12 +2,18 @@
 RDB classes:
 Can register table, execute sql, and extract table object.
 """
-from typing import Optional
+from typing import Dict, List, Optional
 import abc
 import duckdb
 import os
+import io
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
 from .backend import Backend
-from .filesystem import FileSystem, LocalBackend
+from .filesystem import FileSystem, LocalBackend, BackendFileSystem
 
 
 class RDB(Backend):
@@ -47,21 +53,72 @@ class RDB(Backend):
         """
         raise NotImplementedError
 
+    def check_sql(self, sql: str):
+        """
+        Check the syntax of a select sql before it is executed
+        (no check by default).
+
+        Args:
+            - sql: The sql to be checked.
+        """
+        pass
+
+    def create_table(self, table_name: str, table: object):
+        """
+        Store a table object as a table of the database
+        Args:
+            - table_name: The table name.
+            - table: The table object.
+        """
+        raise NotImplementedError
+
+    def check_exists(self, table_name: str) -> bool:
+        """
+        Check whether a table (or view) exists
+        """
+        raise NotImplementedError
+
+    def drop(self, table_name: str):
+        """
+        Drop a table (or view)
+        """
+        raise NotImplementedError
+
+    def copy(self, src_table_name: str, dest_table_name: str):
+        """
+        Copy a table
+        """
+        raise NotImplementedError
+
 
 class DuckDBBackend(RDB):
+    """
+    DuckDB database, in memory or persisted as a database file.
+
+    With a LocalBackend `persist_fs`, the database file is kept in its
+    directory. With a remote `persist_fs`, the database is kept under
+    `./{db_name}` and synchronized by `commit`, which exports the
+    catalog as Parquet files (EXPORT DATABASE) and uploads only those
+    that changed since the last commit.
+    """
+
+    _parser = None
+    _parser_lock = threading.Lock()
+
     def __init__(
             self, persist_fs: Optional[FileSystem] = None, db_name: Optional[str] = None):
-        if persist_fs:
-            if not isinstance(persist_fs, LocalBackend):
-                if persist_fs.check_exists(db_name):
-                    # download data to local from remote file system
-                    buff = persist_fs.download_core(db_name)
-                    lb = LocalBackend()
-                    lb.upload_core(buff, self._db_name)
-                    assert os.path.exists(
-                        './' + db_name), f'db_name: {db_name} does not exist'
         self._persist_fs = persist_fs
+        self._protocols = dict()
+        self._lock = threading.Lock()
         super().__init__(db_name)
+        if persist_fs is None:
+            self._db_path = ':memory:'
+        elif isinstance(persist_fs, LocalBackend):
+            self._db_path = persist_fs.local_path(db_name)
+        else:
+            self._db_path = './' + db_name
+            if not os.path.exists(self._db_path):
+                self._restore()
 
     @property
     def conn(self):
@@ -69,17 +126,49 @@ class DuckDBBackend(RDB):
         Get thread local used connection.
         """
         if self._conn is None:
-            if self._persist_fs is None:
-                conn = duckdb.connect(database=':memory:')
-            else:
-                conn = duckdb.connect(
-                    database=self._persist_fs._directory + self._db_name)
-            self._conn = conn
+            self._conn = duckdb.connect(database=self._db_path)
         return self._conn
 
+    def close(self):
+        """Close the database (changes are flushed to the database file)"""
+        if self._conn is not None:
+            self._conn.close()
+
     def get_conn(self):
         return self.conn.cursor()
 
+    def register_filesystem(self, fs: FileSystem) -> str:
+        """
+        Make the files of a FileSystem readable by
+        DuckDB table functions (e.g., `read_parquet`).
+
+        Args:
+            fs (FileSystem): The filesystem.
+        Returns:
+            str: The protocol of the file paths on DuckDB.
+        """
+        with self._lock:
+            if id(fs) not in self._protocols:
+                protocol = f'{type(fs).__name__.lower()}{len(self._protocols)}'
+                self.conn.register_filesystem(BackendFileSystem(fs, protocol))
+                self._protocols[id(fs)] = (fs, protocol)
+            return self._protocols[id(fs)][1]
+
+    def path_of(self, fs: FileSystem, remote_path: str) -> str:
+        """
+        Path of a file for DuckDB table functions.
+        Files of LocalBackend are read from the disk directly.
+
+        Args:
+            fs (FileSystem): The filesystem of the file.
+            remote_path (str): The path of the file on the filesystem.
+        Returns:
+            str: The path on DuckDB.
+        """
+        if isinstance(fs, LocalBackend):
+            return fs.local_path(remote_path)
+        return f'{self.register_filesystem(fs)}://{remote_path}'
+
     def register(self, table_name: str, table: object):
         conn = self.conn
         try:
@@ -87,6 +176,60 @@ class DuckDBBackend(RDB):
         except BaseException as e:
             raise ValueError(f'table_name: {table_name}') from e
 
+    def check_sql(self, sql: str):
+        """
+        Parse the sql (without binding it to any table, so it can be
+        checked before its input tables exist).
+
+        Raises:
+            ValueError: when the sql has a syntax error.
+        """
+        with DuckDBBackend._parser_lock:
+            if DuckDBBackend._parser is None:
+                DuckDBBackend._parser = duckdb.connect()
+            result = json.loads(DuckDBBackend._parser.execute(
+                'SELECT json_serialize_sql($1::VARCHAR)', [sql]).fetchone()[0])
+        if result['error'] and result.get('error_type') == 'parser':
+            raise ValueError(f'{result["error_message"]}\nsql: {sql}')
+
+    def create_table(self, table_name: str, table: object):
+        cursor = self.get_conn()
+        try:
+            cursor.register('_create_table_source', table)
+            cursor.execute(
+                f'CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM _create_table_source')
+            cursor.unregister('_create_table_source')
+        except BaseException as e:
+            raise ValueError(f'table_name: {table_name}') from e
+        finally:
+            cursor.close()
+
+    def check_exists(self, table_name: str) -> bool:
+        return table_name in self.table_types()
+
+    def table_types(self) -> Dict[str, str]:
+        """
+        Returns:
+            Dict[str, str]: type ('BASE TABLE' / 'VIEW' / 'LOCAL TEMPORARY') of each table
+        """
+        cursor = self.get_conn()
+        try:
+            return dict(cursor.execute(
+                'SELECT table_name, table_type FROM information_schema.tables').fetchall())
+        finally:
+            cursor.close()
+
+    def drop(self, table_name: str):
+        table_type = self.table_types().get(table_name)
+        if table_type is None:
+            return
+        kind = 'VIEW' if table_type == 'VIEW' else 'TABLE'
+        self.execute(f'DROP {kind} IF EXISTS {table_name}')
+
+    def copy(self, src_table_name: str, dest_table_name: str):
+        self.execute(
+            f'CREATE OR REPLACE TABLE {dest_table_name} AS SELECT * FROM {src_table_name}')
+
     def execute(self, sql: str) -> object:
         conn = self.conn
         try:
@@ -94,12 +237,67 @@ class DuckDBBackend(RDB):
         except BaseException as e:
             raise ValueError(sql) from e
 
+    @property
+    def _export_prefix(self) -> str:
+        return self._db_name.split('.')[0] + '_export'
+
+    def _load_export_manifest(self) -> Dict[str, str]:
+        manifest_path = f'{self._export_prefix}/_manifest.json'
+        if self._persist_fs.check_file(manifest_path):
+            return json.loads(self._persist_fs.read_bytes(manifest_path))
+        return dict()
+
     def commit(self):
         """
-        Upload current status of duckdb to remote file system
+        Upload current status of duckdb to remote file system.
+
+        The database is exported as Parquet files, and only the files whose
+        content hash differs from the last commit are uploaded.
         """
-        assert not isinstance(
+        assert self._persist_fs is not None and not isinstance(
             self._persist_fs, LocalBackend), 'No need to commit for local duckdb dump storage.'
-        lb = LocalBackend()
-        buff = lb.download_core(self._db_name)
-        self._persist_fs.upload_core(buff, self._db_name)
+        export_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(export_dir, 'export')
+            self.execute(f"EXPORT DATABASE '{path}' (FORMAT PARQUET)")
+            previous = self._load_export_manifest()
+            manifest = dict()
+            for file_name in sorted(os.listdir(path)):
+                with open(os.path.join(path, file_name), 'rb') as f:
+                    data = f.read()
+                manifest[file_name] = hashlib.md5(data).hexdigest()
+                if previous.get(file_name) != manifest[file_name]:
+                    print(f'@{self} Start Uploading Export: {file_name}')
+                    self._persist_fs.upload_core(
+                        io.BytesIO(data), f'{self._export_prefix}/{file_name}')
+            self._persist_fs.atomic_write(json.dumps(manifest).encode(),
+                                          f'{self._export_prefix}/_manifest.json')
+            for file_name in previous:
+                if file_name not in manifest:
+                    self._persist_fs.drop_file(
+                        f'{self._export_prefix}/{file_name}')
+        finally:
+            shutil.rmtree(export_dir)
+
+    def _restore(self):
+        """Import the database committed on the remote file system
+        (or download a database file uploaded as a whole)"""
+        manifest = self._load_export_manifest()
+        if len(manifest):
+            export_dir = tempfile.mkdtemp()
+            try:
+                for file_name in manifest:
+                    buff = self._persist_fs.download_core(
+                        f'{self._export_prefix}/{file_name}')
+                    with open(os.path.join(export_dir, file_name), 'wb') as f:
+                        f.write(buff.getvalue())
+                self.execute(f"IMPORT DATABASE '{export_dir}'")
+            finally:
+                shutil.rmtree(export_dir)
+        elif self._persist_fs.check_exists(self._db_name):
+            # download data to local from remote file system
+            buff = self._persist_fs.download_core(self._db_name)
+            lb = LocalBackend()
+            lb.upload_core(buff, self._db_name)
+            assert os.path.exists(
+                self._db_path), f'db_name: {self._db_name} does not exist'
@@ -0,0 +1,162 @@
+"""
+Batched ID remapping.
+
+Rewrite the id columns of tables through a mapping table
+(e.g., messy id -> resolved id), keeping unmapped ids as they are.
+All the id columns of a table are rewritten in a single pass.
+
+- In DuckDB, a scalar macro looks ids up in the mapping
+  (the lookup is planned as a hash join).
+- `dictionary_sql` extends a dictionary of dense integer ids with
+  the new keys of some tables, so the tables can be encoded by
+  remapping through it.
+- On Arrow tables, `IdRemapper` indexes the mapping once
+  (a sorted array searched by bisection for integer ids, a hash
+  set lookup otherwise) and remaps any number of columns with it.
+"""
+from typing import List
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+__all__ = [
+    'remap_macro_sql',
+    'remap_sql',
+    'dictionary_sql',
+    'IdRemapper'
+]
+
+
+def remap_macro_sql(mapping: str, macro: str = 'remap_id',
+                    key: str = 'messy_id', value: str = 'new_id',
+                    keep_unmapped: bool = True) -> str:
+    """Build the SQL creating a DuckDB macro remapping an id
+
+    Args:
+        mapping (str): name of the mapping table
+        macro (str): name of the macro
+        key (str): column of the mapping with the ids to be replaced
+        value (str): column of the mapping with the new ids
+        keep_unmapped (bool): keep the ids not in the mapping
+            (otherwise they become null)
+    Returns:
+        str: sql creating the (temporary) macro
+    """
+    lookup = f'(SELECT {value} FROM {mapping} WHERE {key} = _remap_arg)'
+    if keep_unmapped:
+        lookup = f'COALESCE({lookup}, _remap_arg)'
+    return f"""
+        CREATE OR REPLACE TEMP MACRO {macro}(_remap_arg) AS {lookup}
+    """
+
+
+def remap_sql(table: str, columns: List[str], macro: str = 'remap_id') -> str:
+    """Build the SQL remapping the id columns of a table
+
+    Args:
+        table (str): name of the table
+        columns (List[str]): id columns to be remapped
+        macro (str): name of the macro created by `remap_macro_sql`
+    Returns:
+        str: the select sql
+    """
+    remapped = ',\n'.join(
+        [f'{macro}({column}) AS {column}' for column in columns])
+    return f"""
+        SELECT
+            {remapped},
+            * EXCLUDE ({', '.join(columns)})
+        FROM {table}
+    """
+
+
+def dictionary_sql(keys: str, previous: str,
+                   id_type: str = 'BIGINT') -> str:
+    """Build the SQL extending a dictionary of dense integer ids
+
+    Keys already in the previous dictionary keep their ids, and the new
+    keys get the following ids (in the order of the keys), so the ids
+    stay stable across runs.
+
+    Args:
+        keys (str): select sql of the keys (as a `key` column)
+        previous (str): name of the previous dictionary (`key`, `id`)
+        id_type (str): type of the ids (e.g., BIGINT or INTEGER)
+    Returns:
+        str: the select sql of the extended dictionary
+    """
+    return f"""
+        SELECT key, CAST(id AS {id_type}) AS id FROM {previous}
+        UNION ALL
+        SELECT
+            key,
+            CAST((SELECT COALESCE(MAX(id) + 1, 0) FROM {previous})
+                + ROW_NUMBER() OVER (ORDER BY key) - 1 AS {id_type}) AS id
+        FROM (SELECT DISTINCT key FROM ({keys}) WHERE key IS NOT NULL) AS new_keys
+        WHERE NOT EXISTS (
+            SELECT * FROM {previous} AS previous_keys
+            WHERE previous_keys.key = new_keys.key
+        )
+    """
+
+
+class IdRemapper:
+    """Remap id columns of Arrow tables
+
+    Args:
+        mapping (pa.Table): the mapping table
+        key (str): column of the mapping with the ids to be replaced
+        value (str): column of the mapping with the new ids
+    """
+
+    def __init__(self, mapping: pa.Table,
+                 key: str = 'messy_id', value: str = 'new_id'):
+        keys = mapping.column(key).combine_chunks()
+        values = mapping.column(value).combine_chunks()
+        assert keys.null_count == 0, f'{key} of mapping should not be null'
+        self._sorted = pa.types.is_integer(keys.type)
+        if self._sorted:
+            # unsigned ids (e.g., DuckDB HASH values) do not fit in int64
+            self._key_type = pa.uint64() if pa.types.is_unsigned_integer(
+                keys.type) else pa.int64()
+            keys = keys.cast(self._key_type).to_numpy()
+            order = np.argsort(keys, kind='stable')
+            self._keys = keys[order]
+            self._values = values.take(pa.array(order))
+        else:
+            self._keys = keys
+            self._values = values
+
+    def positions(self, ids: pa.Array) -> pa.Array:
+        """Position of each id in the mapping (null when not mapped)"""
+        if not self._sorted:
+            return pc.index_in(ids, value_set=self._keys)
+        values = ids.cast(self._key_type).fill_null(0).to_numpy()
+        positions = np.searchsorted(self._keys, values)
+        positions[positions == len(self._keys)] = 0
+        found = np.zeros(len(values), dtype=bool)
+        if len(self._keys):
+            found = self._keys[positions] == values
+        found &= ids.is_valid().to_numpy(zero_copy_only=False)
+        return pa.array(positions, mask=~found)
+
+    def remap_array(self, ids: pa.Array) -> pa.Array:
+        """Remap an array of ids (unmapped ids are kept)"""
+        new_ids = self._values.take(self.positions(ids))
+        return pc.coalesce(new_ids, ids.cast(self._values.type))
+
+    def remap(self, table: pa.Table, columns: List[str]) -> pa.Table:
+        """Remap the id columns of a table
+
+        Args:
+            table (pa.Table): the table
+            columns (List[str]): id columns to be remapped
+        Returns:
+            pa.Table: the table with remapped columns
+        """
+        for column in columns:
+            index = table.schema.get_field_index(column)
+            ids = table.column(index).combine_chunks()
+            table = table.set_column(
+                index, column, self.remap_array(ids))
+        return table
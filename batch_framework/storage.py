@@ -1,15 +1,379 @@
 import abc
 import pandas as pd
 import vaex as vx
+import polars as pl
 import pyarrow as pa
 import pyarrow.parquet as pq
 import io
-from typing import Dict, List, Union
+import os
+import time
+import queue
+import threading
+import weakref
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 import json
 from .backend import Backend
 from .filesystem import FileSystem
-from .filesystem import LocalBackend, DropboxBackend
-from .rdb import RDB
+from .filesystem import LocalBackend, DropboxBackend, VersionedBackend
+from .rdb import RDB, DuckDBBackend
+
+
+def conform_to_schema(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """Align a table to a fixed schema.
+
+    Fields missing from `table` are filled with nulls, fields not
+    in `schema` are dropped and the remaining ones are cast, recursively
+    through nested struct columns. String columns holding JSON
+    (the legacy `json.dumps` layout) are decoded into nested target types.
+
+    Args:
+        table (pa.Table): The table to be aligned.
+        schema (pa.Schema): The target schema.
+    Returns:
+        pa.Table: The table following `schema`.
+    """
+    columns = []
+    for field in schema:
+        if field.name in table.column_names:
+            columns.append(
+                _conform_array(table.column(field.name), field.type))
+        else:
+            columns.append(pa.nulls(len(table), type=field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _conform_array(array: Union[pa.Array, pa.ChunkedArray],
+                   target: pa.DataType) -> Union[pa.Array, pa.ChunkedArray]:
+    if isinstance(array, pa.ChunkedArray):
+        return pa.chunked_array(
+            [_conform_array(chunk, target) for chunk in array.chunks], type=target)
+    if array.type == target:
+        return array
+    if pa.types.is_nested(target) and (pa.types.is_string(
+            array.type) or pa.types.is_large_string(array.type)):
+        return pa.array([json.loads(value) if value is not None else None
+                         for value in array.to_pylist()], type=target)
+    if pa.types.is_struct(target) and pa.types.is_struct(array.type):
+        names = [array.type.field(i).name for i in range(array.type.num_fields)]
+        children = dict(zip(names, array.flatten()))
+        arrays = []
+        for field in target:
+            if field.name in children:
+                arrays.append(_conform_array(children[field.name], field.type))
+            else:
+                arrays.append(pa.nulls(len(array), type=field.type))
+        return pa.StructArray.from_arrays(
+            arrays, fields=list(target), mask=array.is_null())
+    return array.cast(target)
+
+
+class _EncodingStopped(Exception):
+    """Raised in the encoder when the consumer of the chunks is gone"""
+
+
+class _ChunkSink(io.RawIOBase):
+    """Writable file cutting the written bytes into chunks"""
+
+    def __init__(self, chunk_size: int, put, stop: Optional[threading.Event] = None):
+        self._chunk_size = chunk_size
+        self._put = put
+        self._stop = stop
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data) -> int:
+        if self._stop is not None and self._stop.is_set():
+            raise _EncodingStopped()
+        self._buffer.extend(data)
+        self._position += len(data)
+        while len(self._buffer) >= self._chunk_size:
+            self._put(bytes(self._buffer[:self._chunk_size]))
+            del self._buffer[:self._chunk_size]
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush_chunks(self):
+        if len(self._buffer):
+            self._put(bytes(self._buffer))
+            self._buffer = bytearray()
+
+
+def _encoded_chunks(encode, chunk_size: int, name: str) -> Iterator[bytes]:
+    """Run `encode(sink)` in a background thread and yield
+    the bytes written to the sink in chunks of `chunk_size`.
+
+    At most two chunks wait for the consumer, so the encoder does not
+    run ahead of the upload. When the generator is closed before the
+    end (e.g., a failed upload), the encoder stops at its next write."""
+    chunks = queue.Queue(maxsize=2)
+    stop = threading.Event()
+    end = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise _EncodingStopped()
+
+    def run():
+        try:
+            sink = _ChunkSink(chunk_size, put, stop)
+            encode(sink)
+            sink.flush_chunks()
+            put(end)
+        except BaseException as e:
+            if not stop.is_set():
+                try:
+                    put(e)
+                except _EncodingStopped:
+                    pass
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is end:
+                break
+            elif isinstance(chunk, BaseException):
+                raise ValueError(f'{name} encoding failed') from chunk
+            yield chunk
+    finally:
+        stop.set()
+        thread.join()
+
+
+def parquet_chunks(table: pa.Table, chunk_size: int,
+                   row_group_size: Optional[int] = None, **write_options) -> Iterator[bytes]:
+    """Encode a table as parquet in a background thread.
+
+    Row groups are written one after another and the encoded
+    bytes are yielded in chunks as soon as they are produced,
+    so a consumer can upload while the rest is being encoded.
+
+    Args:
+        table (pa.Table): The table to be encoded.
+        chunk_size (int): Size of the yielded chunks.
+        row_group_size (Optional[int]): Maximum rows of a row group.
+        **write_options: options of `pq.ParquetWriter`
+            (e.g., compression, use_dictionary, write_statistics).
+    Returns:
+        Iterator[bytes]: consecutive parts of the parquet file.
+    """
+    def encode(sink):
+        with pq.ParquetWriter(sink, table.schema, **write_options) as writer:
+            writer.write_table(table, row_group_size=row_group_size)
+    return _encoded_chunks(encode, chunk_size, 'parquet')
+
+
+def ipc_chunks(table: pa.Table, chunk_size: int,
+               compression: Optional[str] = None) -> Iterator[bytes]:
+    """Encode a table as Arrow IPC file in a background thread.
+
+    Args:
+        table (pa.Table): The table to be encoded.
+        chunk_size (int): Size of the yielded chunks.
+        compression (Optional[str]): None, 'lz4' or 'zstd'.
+    Returns:
+        Iterator[bytes]: consecutive parts of the IPC file.
+    """
+    def encode(sink):
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+    return _encoded_chunks(encode, chunk_size, 'arrow ipc')
+
+
+class WritePolicy:
+    """
+    Parquet write settings of a stored dataframe.
+    """
+
+    def __init__(self, compression: str = 'snappy',
+                 compression_level: Optional[int] = None,
+                 use_dictionary: Union[bool, List[str]] = True,
+                 write_statistics: Union[bool, List[str]] = True,
+                 row_group_size: Optional[int] = None,
+                 data_page_size: Optional[int] = None,
+                 sorting_columns: Optional[List[str]] = None,
+                 bloom_filter_columns: Optional[Union[List[str], Dict[str, Dict]]] = None):
+        """
+        Args:
+            compression (str): Codec (e.g., 'snappy', 'zstd', 'lz4', 'none').
+            compression_level (Optional[int]): Level of the codec (e.g., zstd 1-22).
+            use_dictionary (Union[bool, List[str]]): Dictionary encoding (or the columns to encode so).
+            write_statistics (Union[bool, List[str]]): Column statistics (or the columns to write them).
+            row_group_size (Optional[int]): Maximum rows of a row group.
+            data_page_size (Optional[int]): Target size of a data page in bytes.
+            sorting_columns (Optional[List[str]]): Columns to sort the rows by.
+                Sorted columns compress better and allow row group pruning.
+            bloom_filter_columns (Optional[Union[List[str], Dict[str, Dict]]]): Columns
+                with bloom filters (optionally with their `ndv` / `fpp` options).
+        """
+        self.compression = compression
+        self.compression_level = compression_level
+        self.use_dictionary = use_dictionary
+        self.write_statistics = write_statistics
+        self.row_group_size = row_group_size
+        self.data_page_size = data_page_size
+        self.sorting_columns = sorting_columns
+        self.bloom_filter_columns = bloom_filter_columns
+
+    def __repr__(self):
+        return f'WritePolicy({self.compression}, level={self.compression_level})'
+
+    def prepare(self, table: pa.Table) -> pa.Table:
+        """Sort the table by the sorting columns"""
+        if self.sorting_columns:
+            return table.sort_by([(column, 'ascending')
+                                 for column in self.sorting_columns])
+        return table
+
+    def write_options(self, schema: pa.Schema) -> Dict:
+        """
+        Args:
+            schema (pa.Schema): Schema of the table to be written.
+        Returns:
+            Dict: keyword arguments of `parquet_chunks`.
+        """
+        options = {
+            'row_group_size': self.row_group_size,
+            'compression': self.compression,
+            'use_dictionary': self.use_dictionary,
+            'write_statistics': self.write_statistics
+        }
+        if self.compression_level is not None:
+            options['compression_level'] = self.compression_level
+        if self.data_page_size is not None:
+            options['data_page_size'] = self.data_page_size
+        if self.sorting_columns:
+            options['sorting_columns'] = pq.SortingColumn.from_ordering(
+                schema, [(column, 'ascending') for column in self.sorting_columns])
+        if self.bloom_filter_columns:
+            if isinstance(self.bloom_filter_columns, dict):
+                options['bloom_filter_options'] = self.bloom_filter_columns
+            else:
+                options['bloom_filter_options'] = dict(
+                    [(column, True) for column in self.bloom_filter_columns])
+        return options
+
+
+TUNE_CANDIDATES = [
+    WritePolicy('none'),
+    WritePolicy('snappy'),
+    WritePolicy('lz4'),
+    WritePolicy('zstd', compression_level=1),
+    WritePolicy('zstd', compression_level=3),
+    WritePolicy('zstd', compression_level=9)
+]
+
+
+def auto_tune(table: pa.Table, candidates: List[WritePolicy] = TUNE_CANDIDATES,
+              sample_rows: int = 100000, bandwidth: float = 10 * 1024 * 1024) -> WritePolicy:
+    """Choose the write policy with the lowest estimated cost
+    of transferring and decoding a sample of the table.
+
+    Args:
+        table (pa.Table): The table (or a representative part) to be stored.
+        candidates (List[WritePolicy]): The policies to be compared.
+        sample_rows (int): Number of rows encoded per candidate.
+        bandwidth (float): Transfer speed of the backend in bytes per second.
+    Returns:
+        WritePolicy: The policy minimizing `encoded size / bandwidth + decode time`.
+    """
+    sample = table.slice(0, sample_rows)
+    costs = []
+    for policy in candidates:
+        prepared = policy.prepare(sample)
+        encoded = b''.join(parquet_chunks(
+            prepared, 1024 * 1024, **policy.write_options(prepared.schema)))
+        start = time.perf_counter()
+        pq.read_table(io.BytesIO(encoded))
+        decode_time = time.perf_counter() - start
+        costs.append(len(encoded) / bandwidth + decode_time)
+        print(f'@auto_tune {policy}: {len(encoded)} bytes; decode {decode_time:.4f}s')
+    return candidates[costs.index(min(costs))]
+
+
+def _pandas_to_arrow(dataframe: pd.DataFrame) -> pa.Table:
+    return pa.Table.from_pandas(dataframe, preserve_index=False)
+
+
+def _arrow_to_pandas(table: pa.Table) -> pd.DataFrame:
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def _polars_to_arrow(dataframe: pl.LazyFrame) -> pa.Table:
+    return dataframe.collect().to_arrow()
+
+
+def _arrow_to_polars(table: pa.Table) -> pl.LazyFrame:
+    return pl.from_arrow(table).lazy()
+
+
+def _unpin_when_collected(obj: object, backend: DropboxBackend, path: str) -> object:
+    """Keep a staged file pinned while the object reading it is alive
+    (e.g., a lazy scan, opened only when collected)"""
+    weakref.finalize(obj, backend.unpin, path)
+    return obj
+
+
+_TO_ARROW = {
+    pd.DataFrame: _pandas_to_arrow,
+    vx.DataFrame: lambda dataframe: dataframe.to_arrow_table(),
+    pl.LazyFrame: _polars_to_arrow
+}
+
+_FROM_ARROW = {
+    pd.DataFrame: _arrow_to_pandas,
+    vx.DataFrame: vx.from_arrow_table,
+    pl.LazyFrame: _arrow_to_polars
+}
+
+_CONVERTERS = dict(
+    [((source_type, pa.Table), to_arrow) for source_type, to_arrow in _TO_ARROW.items()] +
+    [((pa.Table, target_type), from_arrow) for target_type, from_arrow in _FROM_ARROW.items()] +
+    [((source_type, target_type), lambda dataframe, to_arrow=to_arrow, from_arrow=from_arrow: from_arrow(to_arrow(dataframe)))
+     for source_type, to_arrow in _TO_ARROW.items()
+     for target_type, from_arrow in _FROM_ARROW.items() if source_type != target_type]
+)
+
+
+def is_convertible(source_type: type, target_type: type) -> bool:
+    """Check whether objects of a type can be passed as another type
+    by `convert`.
+    """
+    return source_type == target_type or (
+        source_type, target_type) in _CONVERTERS
+
+
+def convert(obj: object, target_type: type) -> object:
+    """Convert a dataframe between pd.DataFrame, pa.Table, vx.DataFrame and pl.LazyFrame.
+
+    The conversions go through Arrow buffers: pandas objects
+    are built with Arrow-backed dtypes (`pd.ArrowDtype`) and vaex
+    dataframes wrap Arrow arrays, so columns are shared rather than
+    copied wherever the memory layout allows.
+
+    Args:
+        obj (object): The object to be converted.
+        target_type (type): pd.DataFrame, pa.Table, vx.DataFrame or pl.LazyFrame.
+    Returns:
+        object: The converted object (`obj` itself if it is already `target_type`).
+    """
+    if isinstance(obj, target_type):
+        return obj
+    for (source_type, _target_type), converter in _CONVERTERS.items():
+        if _target_type == target_type and isinstance(obj, source_type):
+            return converter(obj)
+    raise TypeError(f'cannot convert {type(obj)} to {target_type}')
 
 
 class Storage:
@@ -73,6 +437,58 @@ class Storage:
         """
         raise NotImplementedError
 
+    def exists_many(self, obj_ids: List[str]) -> List[bool]:
+        """
+        Check whether multiple objects exist
+
+        Args:
+            obj_ids (List[str]): the object ids
+        Returns:
+            List[bool]: whether each object exists
+        """
+        return [self.check_exists(obj_id) for obj_id in obj_ids]
+
+    def copy_many(self, obj_id_pairs: List[Tuple[str, str]]):
+        """
+        Copy multiple objects
+
+        Args:
+            obj_id_pairs (List[Tuple[str, str]]): pairs of source and destination object id
+        """
+        for src_obj_id, dest_obj_id in obj_id_pairs:
+            self.copy(src_obj_id, dest_obj_id)
+
+    def copy_to(self, obj_id: str, storage: 'Storage', dest_obj_id: str) -> bool:
+        """
+        Copy an object to another storage as it is stored
+        (without decoding and encoding it again)
+
+        Returns:
+            bool: whether the object is copied (False if the
+                storages do not store the object the same way)
+        """
+        return False
+
+    def scan(self, obj_id: str, rdb: RDB) -> Optional[str]:
+        """
+        Table expression reading an object in place on a RDB
+
+        Returns:
+            Optional[str]: the expression (None if the object
+                has to be downloaded and registered instead)
+        """
+        return None
+
+    def fingerprint(self, obj_id: str) -> Optional[str]:
+        """
+        Identify the current version of an object
+
+        Returns:
+            Optional[str]: the fingerprint (None if the object does not
+                exist or the backend cannot fingerprint it)
+        """
+        return None
+
 
 class JsonStorage(Storage):
     """
@@ -102,6 +518,10 @@ class JsonStorage(Storage):
     def check_exists(self, obj_id: str) -> bool:
         return self._backend.check_exists(obj_id + '.json')
 
+    def exists_many(self, obj_ids: List[str]) -> List[bool]:
+        return self._backend.exists_many(
+            [obj_id + '.json' for obj_id in obj_ids])
+
     def drop(self, obj_id: str):
         return self._backend.drop_file(obj_id + '.json')
 
@@ -111,15 +531,72 @@ class JsonStorage(Storage):
             dest_obj_id + '.json'
         )
 
+    def copy_many(self, obj_id_pairs: List[Tuple[str, str]]):
+        self._backend.copy_files([
+            (src_obj_id + '.json', dest_obj_id + '.json')
+            for src_obj_id, dest_obj_id in obj_id_pairs
+        ])
+
+    def fingerprint(self, obj_id: str) -> Optional[str]:
+        return self._backend.fingerprint(obj_id + '.json')
+
 
 class DataFrameStorage(Storage):
     """
     Storage of DataFrame
     """
+    ext = '.parquet'
 
-    def __init__(self, backend: Backend):
+    def __init__(self, backend: Backend, schema: Optional[pa.Schema] = None,
+                 policy: Optional[WritePolicy] = None,
+                 object_policies: Optional[Dict[str, WritePolicy]] = None):
+        """
+        Args:
+            backend (Backend): The backend to store the dataframe.
+            schema (Optional[pa.Schema]): A fixed schema for the stored objects.
+                When provided, dataframes are aligned to it (see `conform_to_schema`)
+                so nested columns are kept as typed struct columns.
+            policy (Optional[WritePolicy]): Parquet write settings of the objects.
+            object_policies (Optional[Dict[str, WritePolicy]]): Write settings
+                of specific object ids overriding `policy`.
+        """
+        self._schema = schema
+        self._policy = policy if policy is not None else WritePolicy()
+        self._object_policies = dict(object_policies or dict())
         super().__init__(backend=backend)
 
+    def get_policy(self, obj_id: str) -> WritePolicy:
+        """Get the write policy of an object"""
+        return self._object_policies.get(obj_id, self._policy)
+
+    def set_policy(self, obj_id: str, policy: WritePolicy):
+        """Set the write policy of an object"""
+        self._object_policies[obj_id] = policy
+
+    def tune_policy(self, obj_id: str, table: pa.Table, **kwargs) -> WritePolicy:
+        """Set the write policy of an object by `auto_tune` on a table
+
+        Args:
+            obj_id (str): The object id.
+            table (pa.Table): A representative table of the object.
+            **kwargs: options of `auto_tune`.
+        Returns:
+            WritePolicy: The chosen policy.
+        """
+        policy = auto_tune(table, **kwargs)
+        self.set_policy(obj_id, policy)
+        return policy
+
+    def _upload_table(self, table: pa.Table, obj_id: str):
+        """Encode a table as parquet while uploading it to the FileSystem"""
+        policy = self.get_policy(obj_id)
+        table = policy.prepare(table)
+        self._backend.upload_stream(
+            parquet_chunks(table, self._backend.chunksize_for(table.nbytes),
+                           **policy.write_options(table.schema)),
+            obj_id + '.parquet'
+        )
+
     @abc.abstractmethod
     def upload(self, dataframe: Union[pd.DataFrame,
                vx.DataFrame, pa.Table], obj_id: str):
@@ -131,17 +608,72 @@ class DataFrameStorage(Storage):
         raise NotImplementedError
 
     def check_exists(self, obj_id: str) -> bool:
-        return self._backend.check_exists(obj_id + '.parquet')
+        if isinstance(self._backend, RDB):
+            return self._backend.check_exists(obj_id)
+        return self._backend.check_exists(obj_id + self.ext)
+
+    def exists_many(self, obj_ids: List[str]) -> List[bool]:
+        if isinstance(self._backend, FileSystem):
+            return self._backend.exists_many(
+                [obj_id + self.ext for obj_id in obj_ids])
+        return super().exists_many(obj_ids)
 
     def drop(self, obj_id: str):
-        return self._backend.drop_file(obj_id + '.parquet')
+        if isinstance(self._backend, RDB):
+            return self._backend.drop(obj_id)
+        return self._backend.drop_file(obj_id + self.ext)
 
     def copy(self, src_obj_id: str, dest_obj_id: str):
+        if isinstance(self._backend, RDB):
+            return self._backend.copy(src_obj_id, dest_obj_id)
         self._backend.copy_file(
-            src_obj_id + '.parquet',
-            dest_obj_id + '.parquet'
+            src_obj_id + self.ext,
+            dest_obj_id + self.ext
         )
 
+    def copy_many(self, obj_id_pairs: List[Tuple[str, str]]):
+        if isinstance(self._backend, RDB):
+            return super().copy_many(obj_id_pairs)
+        self._backend.copy_files([
+            (src_obj_id + self.ext, dest_obj_id + self.ext)
+            for src_obj_id, dest_obj_id in obj_id_pairs
+        ])
+
+    def copy_to(self, obj_id: str, storage: Storage, dest_obj_id: str) -> bool:
+        if type(storage) is not type(self) or self._schema is not None or storage._schema is not None:
+            return False
+        if vars(self.get_policy(obj_id)) != vars(storage.get_policy(dest_obj_id)) or \
+                getattr(self, '_compression', None) != getattr(storage, '_compression', None):
+            return False
+        if self._backend is storage._backend:
+            self.copy(obj_id, dest_obj_id)
+            return True
+        if isinstance(self._backend, FileSystem) and isinstance(storage._backend, FileSystem):
+            storage._backend.upload_core(
+                self._backend.download_core(obj_id + self.ext), dest_obj_id + self.ext)
+            return True
+        return False
+
+    def fingerprint(self, obj_id: str) -> Optional[str]:
+        if isinstance(self._backend, FileSystem):
+            return self._backend.fingerprint(obj_id + self.ext)
+        return None
+
+    def scan(self, obj_id: str, rdb: RDB) -> Optional[str]:
+        """Scan the parquet file by `read_parquet` of DuckDB, so only the
+        row groups and columns a query needs are read (the schema is
+        conformed on download only). Tables of the RDB itself are read
+        as they are.
+        """
+        if self._backend is rdb:
+            return obj_id
+        if self.ext != '.parquet' or self._schema is not None:
+            return None
+        if not isinstance(self._backend, FileSystem) or not isinstance(rdb, DuckDBBackend):
+            return None
+        path = rdb.path_of(self._backend, obj_id + self.ext).replace("'", "''")
+        return f"read_parquet('{path}')"
+
 
 class PandasStorage(DataFrameStorage):
     """
@@ -150,15 +682,16 @@ class PandasStorage(DataFrameStorage):
 
     def upload(self, dataframe: pd.DataFrame, obj_id: str):
         if isinstance(self._backend, FileSystem):
-            buff = io.BytesIO()
-            dataframe.to_parquet(buff)
-            self._backend.upload_core(buff, obj_id + '.parquet')
+            if self._schema is None:
+                table = pa.Table.from_pandas(dataframe)
+            else:
+                present = pa.schema(
+                    [field for field in self._schema if field.name in dataframe.columns])
+                table = conform_to_schema(pa.Table.from_pandas(
+                    dataframe, schema=present, preserve_index=False), self._schema)
+            self._upload_table(table, obj_id)
         elif isinstance(self._backend, RDB):
-            cursor = self._backend.get_conn()
-            try:
-                cursor.register(obj_id, dataframe)
-            finally:
-                cursor.close()
+            self._backend.create_table(obj_id, dataframe)
         else:
             raise TypeError(
                 f'backend should be FileSystem/RDB, but it is {self._backend}')
@@ -166,7 +699,11 @@ class PandasStorage(DataFrameStorage):
     def download(self, obj_id: str) -> pd.DataFrame:
         if isinstance(self._backend, FileSystem):
             buff = self._backend.download_core(obj_id + '.parquet')
-            result = pd.read_parquet(buff, engine='pyarrow')
+            if self._schema is None:
+                result = pd.read_parquet(buff, engine='pyarrow')
+            else:
+                result = conform_to_schema(
+                    pq.read_table(buff), self._schema).to_pandas()
             return result
         elif isinstance(self._backend, RDB):
             cursor = self._backend.get_conn()
@@ -185,15 +722,11 @@ class PyArrowStorage(DataFrameStorage):
 
     def upload(self, dataframe: pa.Table, obj_id: str):
         if isinstance(self._backend, FileSystem):
-            buff = io.BytesIO()
-            pq.write_table(dataframe, buff)
-            self._backend.upload_core(buff, obj_id + '.parquet')
+            if self._schema is not None:
+                dataframe = conform_to_schema(dataframe, self._schema)
+            self._upload_table(dataframe, obj_id)
         elif isinstance(self._backend, RDB):
-            cursor = self._backend.get_conn()
-            try:
-                cursor.register(obj_id, dataframe)
-            finally:
-                cursor.close()
+            self._backend.create_table(obj_id, dataframe)
         else:
             raise TypeError(
                 f'backend should be FileSystem, but it is {self._backend}')
@@ -201,6 +734,8 @@ class PyArrowStorage(DataFrameStorage):
     def download(self, obj_id: str) -> pa.Table:
         if isinstance(self._backend, FileSystem):
             buff = self._backend.download_core(obj_id + '.parquet')
+            if self._schema is not None:
+                return conform_to_schema(pq.read_table(buff), self._schema)
             return pq.read_table(buff)
         elif isinstance(self._backend, RDB):
             cursor = self._backend.get_conn()
@@ -221,32 +756,189 @@ class VaexStorage(DataFrameStorage):
         if isinstance(self._backend, FileSystem):
             # Try using multithread + io.pipe to stream vaex
             # to target directory
-            buff = io.BytesIO()
-            dataframe.export_parquet(buff)
-            self._backend.upload_core(buff, obj_id + '.parquet')
+            if self._schema is None:
+                policy = self.get_policy(obj_id)
+                if policy.sorting_columns:
+                    dataframe = dataframe.sort(policy.sorting_columns)
+                options = policy.write_options(dataframe.schema_arrow())
+                row_group_size = options.pop('row_group_size')
+                if row_group_size is not None:
+                    options['chunk_size'] = row_group_size
+                buff = io.BytesIO()
+                dataframe.export_parquet(buff, **options)
+                self._backend.upload_core(buff, obj_id + '.parquet')
+            else:
+                self._upload_table(conform_to_schema(
+                    dataframe.to_arrow_table(), self._schema), obj_id)
         else:
             raise TypeError('backend should be FileSystem')
 
     def download(self, obj_id: str) -> vx.DataFrame:
-        if isinstance(self._backend, LocalBackend):
-            path = self._backend._fs.path
+        backend = self._backend
+        remote_path = obj_id + '.parquet'
+        if isinstance(backend, VersionedBackend):
+            remote_path = backend.resolve(remote_path)
+            backend = backend.backend
+        if isinstance(backend, LocalBackend):
+            path = backend._fs.path
             # if path.startswith('/'):
             #     path = path[1:]
-            result = vx.open(
-                f'{path}/{obj_id}' +
-                '.parquet')
-            return result
-        elif isinstance(self._backend, DropboxBackend):
-            buff = self._backend.download_core(obj_id + '.parquet')
-            buff.seek(0)
-            path = self._backend._fs.path
-            if path.startswith('/'):
-                path = path[1:]
-            lfs = LocalBackend(path)
-            lfs.upload_core(buff, remote_path=obj_id + '.parquet')
-            result = vx.open(
-                f'{path}/{obj_id}' +
-                '.parquet')
+            result = self._open(f'{path}/{remote_path}')
             return result
+        elif isinstance(backend, DropboxBackend):
+            file_path = backend.stage(remote_path)
+            return _unpin_when_collected(self._open(file_path), backend, file_path)
+        else:
+            raise TypeError('backend should be FileSystem')
+
+    def _open(self, file_path: str) -> vx.DataFrame:
+        """Memory-map a local parquet file. Files written under
+        an older schema are aligned to `self._schema` in memory.
+        """
+        if self._schema is not None and not pq.read_schema(
+                file_path).equals(self._schema):
+            return vx.from_arrow_table(
+                conform_to_schema(pq.read_table(file_path), self._schema))
+        return vx.open(file_path)
+
+
+class ArrowIPCStorage(DataFrameStorage):
+    """Storage of pyarrow Table as Arrow IPC (Feather v2) file
+
+    Suitable for short-lived intermediate objects: writing skips the
+    parquet encoding and reading from a LocalBackend memory-maps the
+    file, so uncompressed tables are loaded without copy.
+    """
+    ext = '.arrow'
+
+    def __init__(self, backend: Backend, schema: Optional[pa.Schema] = None,
+                 compression: Optional[str] = None):
+        """
+        Args:
+            backend (Backend): The backend to store the table.
+            schema (Optional[pa.Schema]): A fixed schema for the stored objects.
+            compression (Optional[str]): None (zero-copy read), 'lz4' or 'zstd'.
+        """
+        self._compression = compression
+        super().__init__(backend, schema=schema)
+
+    def upload(self, dataframe: pa.Table, obj_id: str):
+        if isinstance(self._backend, FileSystem):
+            if self._schema is not None:
+                dataframe = conform_to_schema(dataframe, self._schema)
+            self._backend.upload_stream(
+                ipc_chunks(dataframe, self._backend.chunksize_for(dataframe.nbytes),
+                           compression=self._compression),
+                obj_id + self.ext
+            )
+        elif isinstance(self._backend, RDB):
+            self._backend.create_table(obj_id, dataframe)
+        else:
+            raise TypeError(
+                f'backend should be FileSystem, but it is {self._backend}')
+
+    def download(self, obj_id: str) -> pa.Table:
+        if isinstance(self._backend, FileSystem):
+            backend = self._backend
+            remote_path = obj_id + self.ext
+            if isinstance(backend, VersionedBackend):
+                remote_path = backend.resolve(remote_path)
+                backend = backend.backend
+            if isinstance(backend, LocalBackend):
+                source = pa.memory_map(backend.local_path(remote_path), 'r')
+            else:
+                source = pa.BufferReader(
+                    backend.download_core(remote_path).getbuffer())
+            table = pa.ipc.open_file(source).read_all()
+            if self._schema is not None:
+                return conform_to_schema(table, self._schema)
+            return table
+        elif isinstance(self._backend, RDB):
+            cursor = self._backend.get_conn()
+            try:
+                return cursor.execute(f'SELECT * FROM {obj_id};').arrow()
+            finally:
+                cursor.close()
+        else:
+            raise TypeError(
+                f'backend should be FileSystem, but it is {self._backend}')
+
+
+class PolarsStorage(DataFrameStorage):
+    """Storage of Polars LazyFrame
+
+    Download scans the parquet file lazily, so the transform builds a
+    query plan executed by the multi-threaded polars engine. Files on
+    Dropbox are read from the local staging area (see `StagingArea`).
+    Upload to a LocalBackend sinks the plan into the file with the
+    streaming engine without collecting it in memory (unless the write
+    policy sets dictionary, statistics or bloom filter options of
+    columns, which only the pyarrow writer supports).
+    """
+
+    @staticmethod
+    def _can_sink(policy: WritePolicy) -> bool:
+        return policy.use_dictionary is True and not policy.bloom_filter_columns and \
+            isinstance(policy.write_statistics, bool)
+
+    def upload(self, dataframe: pl.LazyFrame, obj_id: str):
+        policy = self.get_policy(obj_id)
+        if isinstance(self._backend, LocalBackend) and self._schema is None \
+                and PolarsStorage._can_sink(policy):
+            if policy.sorting_columns:
+                dataframe = dataframe.sort(policy.sorting_columns)
+            remote_path = obj_id + self.ext
+            tmp_path = self._backend.local_path(remote_path + '.uploading')
+            dataframe.sink_parquet(
+                tmp_path,
+                compression=policy.compression if policy.compression != 'none' else 'uncompressed',
+                compression_level=policy.compression_level,
+                statistics=bool(policy.write_statistics),
+                row_group_size=policy.row_group_size,
+                data_page_size=policy.data_page_size
+            )
+            os.replace(tmp_path, self._backend.local_path(remote_path))
+        elif isinstance(self._backend, FileSystem):
+            table = dataframe.collect().to_arrow()
+            if self._schema is not None:
+                table = conform_to_schema(table, self._schema)
+            self._upload_table(table, obj_id)
         else:
             raise TypeError('backend should be FileSystem')
+
+    def download(self, obj_id: str) -> pl.LazyFrame:
+        backend = self._backend
+        remote_path = obj_id + self.ext
+        if isinstance(backend, VersionedBackend):
+            remote_path = backend.resolve(remote_path)
+            backend = backend.backend
+        if isinstance(backend, LocalBackend):
+            return self._open(backend.local_path(remote_path))
+        elif isinstance(backend, DropboxBackend):
+            file_path = backend.stage(remote_path)
+            return _unpin_when_collected(self._open(file_path), backend, file_path)
+        else:
+            raise TypeError('backend should be FileSystem')
+
+    def _open(self, file_path: str) -> pl.LazyFrame:
+        if self._schema is not None and not pq.read_schema(
+                file_path).equals(self._schema):
+            return _arrow_to_polars(conform_to_schema(
+                pq.read_table(file_path), self._schema))
+        return pl.scan_parquet(file_path)
+
+
+def table_storage(backend: Backend,
+                  schema: Optional[pa.Schema] = None) -> DataFrameStorage:
+    """Select the storage of pyarrow Table for a backend:
+    Arrow IPC on temporary filesystems and Parquet otherwise.
+
+    Args:
+        backend (Backend): The backend to store the tables.
+        schema (Optional[pa.Schema]): A fixed schema for the stored objects.
+    Returns:
+        DataFrameStorage: ArrowIPCStorage or PyArrowStorage.
+    """
+    if isinstance(backend, FileSystem) and backend.temporary:
+        return ArrowIPCStorage(backend, schema=schema)
+    return PyArrowStorage(backend, schema=schema)
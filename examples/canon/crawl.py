@@ -12,20 +12,47 @@ TODO:
     - [X] Update package records -> Decorate with MapReduce
     - [X] Combine package records
 - [X] Reduce RAM usage by using vaex
+- [X] Store latest json as typed struct column instead of json string
 """
 from typing import List, Dict, Tuple, Optional
 import requests
 import pandas as pd
 import vaex as vx
+import pyarrow as pa
+import polars as pl
 import tqdm
 import time
-import json
 from concurrent.futures import ThreadPoolExecutor
 from batch_framework.etl import ObjProcessor
-from batch_framework.filesystem import limit_pool
+from batch_framework.storage import conform_to_schema, convert
 
 RETRIES_COUNT = 3
 
+INFO_TYPE = pa.struct([
+    ('name', pa.string()),
+    ('package_url', pa.string()),
+    ('project_url', pa.string()),
+    ('requires_python', pa.string()),
+    ('version', pa.string()),
+    ('keywords', pa.string()),
+    ('num_releases', pa.int64()),
+    ('author', pa.string()),
+    ('author_email', pa.string()),
+    ('maintainer', pa.string()),
+    ('maintainer_email', pa.string()),
+    ('license', pa.string()),
+    ('docs_url', pa.string()),
+    ('home_page', pa.string()),
+    ('requires_dist', pa.list_(pa.string())),
+    ('project_urls', pa.map_(pa.string(), pa.string()))
+])
+
+LATEST_SCHEMA = pa.schema([
+    ('name', pa.string()),
+    ('latest', pa.struct([('info', INFO_TYPE)])),
+    ('etag', pa.string())
+])
+
 
 def process_latest(data: Dict) -> Dict:
     results = dict()
@@ -51,7 +78,6 @@ class LatestDownloader(ObjProcessor):
         assert 'latest' in new_df.columns
         assert 'etag' in new_df.columns
         assert len(new_df.columns) == 3
-        new_df['latest'] = new_df['latest'].map(lambda x: json.dumps(x))
         return [new_df]
 
     def _get_new_package_records(self, names: List[str]) -> pd.DataFrame:
@@ -134,17 +160,21 @@ class LatestUpdator(ObjProcessor):
                 updated_latest = pd.concat(updated_latest_chunks)
                 print('Total Updated Count:', len(updated_latest))
                 # 3. Append updated_latest (pd), latest_new (vx), latest_cache
-                # (vx)
-                latest = vx.concat([
-                    vx.from_pandas(updated_latest),
-                    inputs[0],
+                # (vx) as arrow tables of LATEST_SCHEMA
+                latest = pa.concat_tables([
+                    pa.Table.from_pandas(
+                        updated_latest, schema=LATEST_SCHEMA, preserve_index=False),
+                    conform_to_schema(
+                        convert(inputs[0], pa.Table), LATEST_SCHEMA),
                     # select those not in updated_latest
-                    self.load_cache(self.output_ids[0])
-                ]).to_pandas_df()
-                # 4. Do dedupe operation on combined vaex dataframe
-                latest.drop_duplicates(
-                    subset=['name'], keep='first', inplace=True)
-                return [vx.from_pandas(latest)]
+                    conform_to_schema(
+                        convert(self.load_cache(self.output_ids[0]), pa.Table), LATEST_SCHEMA)
+                ])
+                # 4. Do dedupe operation on the name column only
+                keep = pl.from_arrow(
+                    latest.column('name')).is_first_distinct().to_arrow()
+                latest = latest.filter(keep)
+                return [convert(latest, vx.DataFrame)]
             else:
                 latest = vx.concat([
                     inputs[0],
@@ -188,7 +218,6 @@ class LatestUpdator(ObjProcessor):
             update_pipe)
         new_df = pd.DataFrame.from_records(
             update_pipe, columns=['name', 'latest', 'etag'])
-        new_df['latest'] = new_df['latest'].map(lambda x: json.dumps(x))
         print(f'# of update in chunk ({partition}): {len(new_df)}')
         return new_df
 
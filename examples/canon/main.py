@@ -1,7 +1,7 @@
 """
 TODO:
 - [X] Add name, etag selection temp for less memory usage on latest update
-- [ ] Build Polars Storage and Polars support on ObjProcessor for zero copy combine
+- [X] Build Polars Storage and Polars support on ObjProcessor for zero copy combine
     - [ ] Refactor:
         - [ ] `NewPackageExtractor` (output cache) -> `GetNew` (no cache) -> `Update` (output cache)
             - [X] `NewPackageExtractor` get a list of package names
@@ -16,60 +16,44 @@ TODO:
                 - [ ] Step 2: append new json data to the updated cache.
                 - [ ] Step 3: Save output.
 """
-from typing import Optional, List
-import vaex as vx
-import pandas as pd
-from batch_framework.filesystem import LocalBackend
-from batch_framework.storage import PandasStorage, VaexStorage
-from batch_framework.etl import ETLGroup, ObjProcessor
+from typing import Optional
+from batch_framework.filesystem import FileSystem, LocalBackend
+from batch_framework.storage import PandasStorage, VaexStorage, WritePolicy, table_storage
+from batch_framework.etl import ETLGroup, DiffProcessor
 from batch_framework.parallize import MapReduce
+from batch_framework.rdb import RDB, DuckDBBackend
 from .trigger import PyPiNameTrigger
 from .crawl import (
     LatestDownloader,
-    LatestUpdator
+    LatestUpdator,
+    LATEST_SCHEMA
 )
 from .tabularize import LatestTabularize
 
 
-class NewPackageExtractor(ObjProcessor):
-    def __init__(self, *args, **kwargs):
-        kwargs['make_cache'] = True
-        super().__init__(*args, **kwargs)
+class NewPackageExtractor(DiffProcessor):
+    """
+    Select names in `name_trigger` that are not in the
+    `name_trigger` of the previous run.
+    """
 
-    @property
-    def input_ids(self):
-        return ['name_trigger']
+    def __init__(self, rdb: RDB, workspace_fs: FileSystem):
+        super().__init__('name_trigger', ['name'], rdb,
+                         input_fs=workspace_fs, output_fs=workspace_fs, kinds=['added'])
 
-    @property
-    def output_ids(self):
-        return ['name_trigger_new']
+    def diff_id(self, kind: str) -> str:
+        assert kind == 'added'
+        return 'name_trigger_new'
 
-    def transform(self, inputs: List[vx.DataFrame],
-                  **kwargs) -> List[vx.DataFrame]:
-        pkg_name_df = inputs[0]
-        print('Size of pkg_name:', len(pkg_name_df))
-        if self.exists_cache:
-            pkg_name_cache_df = self.load_cache(self.input_ids[0])
-            print('Size of cached pkg_name:', len(pkg_name_cache_df))
-            new_pkg_names = self._get_new_package_names(
-                pkg_name_df, pkg_name_cache_df)
-            assert len(new_pkg_names) > 0, 'Should have new package'
-            print('number of new packages:', len(new_pkg_names))
-            return [vx.from_pandas(pd.DataFrame(
-                new_pkg_names, columns=['name']))]
-        else:
-            return inputs
 
-    def _get_new_package_names(
-            self, pkg_name_df: vx.DataFrame, cache_pkg_name_df: vx.DataFrame) -> List[str]:
-        pkg_names = pkg_name_df[['name']].to_arrays(array_type='list')[0]
-        cache_pkg_names = cache_pkg_name_df[['name']].to_arrays(array_type='list')[
-            0]
-        new_names = list(set(pkg_names) - set(cache_pkg_names))
-        return new_names
+class SimplePyPiCanonicalize(ETLGroup):
+    """
+    Download the latest package info of PyPi and tabularize it.
 
+    `tmp_fs` keeps the intermediates of a run and `partition_fs` the
+    partitions of MapReduce: both can be `temporary=True` filesystems.
+    """
 
-class SimplePyPiCanonicalize(ETLGroup):
     def __init__(self, raw_df: LocalBackend,
                  tmp_fs: LocalBackend,
                  output_fs: LocalBackend,
@@ -80,17 +64,23 @@ class SimplePyPiCanonicalize(ETLGroup):
                  do_update: bool = True):
         self._tmp_fs = tmp_fs
         units = [
-            PyPiNameTrigger(PandasStorage(tmp_fs), test_count=test_count),
-            NewPackageExtractor(VaexStorage(tmp_fs)),
+            # read by NewPackageExtractor in the format of tmp_fs
+            PyPiNameTrigger(table_storage(tmp_fs), test_count=test_count),
+            NewPackageExtractor(DuckDBBackend(), tmp_fs),
             MapReduce(
-                LatestDownloader(PandasStorage(tmp_fs)),
+                LatestDownloader(
+                    PandasStorage(tmp_fs),
+                    PandasStorage(tmp_fs, schema=LATEST_SCHEMA)
+                ),
                 download_worker_count,
                 partition_fs
             )
         ]
         self.updator = LatestUpdator(
-            VaexStorage(tmp_fs),
-            VaexStorage(raw_df),
+            VaexStorage(tmp_fs, schema=LATEST_SCHEMA),
+            VaexStorage(raw_df, schema=LATEST_SCHEMA,
+                        policy=WritePolicy('zstd', compression_level=3,
+                                           sorting_columns=['name'])),
             do_update=do_update,
             workers=update_worker_count
         )
@@ -99,8 +89,9 @@ class SimplePyPiCanonicalize(ETLGroup):
         ])
         units.append(
             LatestTabularize(
-                input_storage=PandasStorage(raw_df),
-                output_storage=PandasStorage(output_fs)
+                DuckDBBackend(),
+                input_fs=raw_df,
+                output_fs=output_fs
             )
         )
         super().__init__(*units)
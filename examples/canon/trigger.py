@@ -6,13 +6,13 @@ import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 from batch_framework.etl import ObjProcessor
-from batch_framework.storage import PandasStorage
+from batch_framework.storage import Storage
 
 URL = "https://pypi.python.org/simple/"
 
 
 class PyPiNameTrigger(ObjProcessor):
-    def __init__(self, input_storage: PandasStorage,
+    def __init__(self, input_storage: Storage,
                  test_count: Optional[int] = None):
         self._test_count = test_count
         super().__init__(input_storage=input_storage)
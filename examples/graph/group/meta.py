@@ -1,4 +1,4 @@
-from typing import List, Dict, Tuple
+from typing import Callable, List, Dict, Tuple
 
 
 class SqlBuilder:
@@ -71,6 +71,9 @@ class SqlBuilder:
 class GroupingMeta:
     """
     Data Class describing how subgraphs are merged
+
+    The derived properties are computed once and kept until the groupings
+    are altered by `alter_input_node` / `alter_input_link`.
     """
 
     def __init__(self,
@@ -85,40 +88,46 @@ class GroupingMeta:
         self.triplets = triplets
         self.__node_grouping_sqls = node_grouping_sqls
         self.__link_grouping_sqls = link_grouping_sqls
+        self._cache = dict()
+
+    def _cached(self, name: str, build: Callable[[], object]) -> object:
+        if name not in self._cache:
+            self._cache[name] = build()
+        return self._cache[name]
+
+    def _parents(self, grouping: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """Index the groups of each child"""
+        result = dict()
+        for group, children in grouping.items():
+            for child in children:
+                result.setdefault(child, []).append(group)
+        return result
 
     def alter_input_node(self, node_name: str, target_name: str):
-        for key, nodes in self.node_grouping.items():
-            new_nodes = []
-            for node in nodes:
-                if node == node_name:
-                    new_nodes.append(target_name)
-                else:
-                    new_nodes.append(node)
-            self.node_grouping[key] = new_nodes
+        parents = self._cached(
+            'node_parents', lambda: self._parents(self.node_grouping))
+        for key in parents.get(node_name, []):
+            self.node_grouping[key] = [
+                target_name if node == node_name else node for node in self.node_grouping[key]]
+        self._cache.clear()
 
     def alter_input_link(self, link_name: str, target_name: str):
-        for key, links in self.link_grouping.items():
-            new_links = []
-            for link in links:
-                if link == link_name:
-                    new_links.append(target_name)
-                else:
-                    new_links.append(link)
-            self.link_grouping[key] = new_links
+        parents = self._cached(
+            'link_parents', lambda: self._parents(self.link_grouping))
+        for key in parents.get(link_name, []):
+            self.link_grouping[key] = [
+                target_name if link == link_name else link for link in self.link_grouping[key]]
+        self._cache.clear()
 
     @property
     def input_nodes(self) -> List[str]:
-        result = []
-        for _, nodes in self.node_grouping.items():
-            result.extend(nodes)
-        return list(set(result))
+        return list(self._cached(
+            'node_parents', lambda: self._parents(self.node_grouping)))
 
     @property
     def input_links(self) -> List[str]:
-        result = []
-        for _, links in self.link_grouping.items():
-            result.extend(links)
-        return list(set(result))
+        return list(self._cached(
+            'link_parents', lambda: self._parents(self.link_grouping)))
 
     @property
     def output_nodes(self) -> List[str]:
@@ -130,6 +139,13 @@ class GroupingMeta:
 
     @property
     def node_grouping_sqls(self) -> Dict[str, str]:
+        return dict(self._cached('node_grouping_sqls', self.__build_node_grouping_sqls))
+
+    @property
+    def link_grouping_sqls(self) -> Dict[str, str]:
+        return dict(self._cached('link_grouping_sqls', self.__build_link_grouping_sqls))
+
+    def __build_node_grouping_sqls(self) -> Dict[str, str]:
         result = dict()
         for key in self.node_grouping:
             if key in self.__node_grouping_sqls:
@@ -141,8 +157,7 @@ class GroupingMeta:
                 result[f'node_{key}_final'] = f"SELECT DISTINCT ON (node_id) * FROM {self.node_grouping[key][0]}"
         return result
 
-    @property
-    def link_grouping_sqls(self) -> Dict[str, str]:
+    def __build_link_grouping_sqls(self) -> Dict[str, str]:
         result = dict()
         for key in self.link_grouping:
             if key in self.__link_grouping_sqls:
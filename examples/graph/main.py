@@ -18,6 +18,20 @@ class GraphDataPlatform(ETLGroup):
         2. extract subgraphs
         3. do entity resolution
         4. group subgraph
+
+    With `catalog=True`, the subgraph and mapping tables are kept as native
+    tables of `rdb` (e.g., an on-disk DuckDBBackend) instead of files of
+    `subgraph_fs` / `mapping_fs`, and only the grouped tables are exported
+    to `output_fs`. Commit `rdb` to sync the catalog to its `persist_fs`.
+
+    The node ids are encoded as dense integers by a dictionary kept on
+    `dictionary_fs` (subgraph_fs by default), extended on each run.
+    With `catalog=True`, it defaults to `model_fs` instead, since the
+    catalog of `rdb` may not outlive the run and reassigned ids would
+    invalidate the caches keyed by them.
+
+    The intermediates of entity resolution are kept on `tmp_fs`
+    (e.g., a `temporary=True` filesystem; mapping_fs by default).
     """
 
     def __init__(self, metagraph: MetaGraph,
@@ -27,8 +41,18 @@ class GraphDataPlatform(ETLGroup):
                  er_meta_list: List[ERMeta] = [],
                  mapping_fs: Optional[FileSystem] = None,
                  model_fs: Optional[FileSystem] = None,
-                 rdb: RDB = DuckDBBackend()
+                 rdb: RDB = DuckDBBackend(),
+                 catalog: bool = False,
+                 dictionary_fs: Optional[FileSystem] = None,
+                 tmp_fs: Optional[FileSystem] = None
                  ):
+        if catalog:
+            subgraph_fs = rdb
+            mapping_fs = rdb
+            if dictionary_fs is None:
+                dictionary_fs = model_fs
+            assert isinstance(
+                dictionary_fs, FileSystem), 'catalog mode requires a FileSystem `dictionary_fs` (or `model_fs`) to persist the node id dictionary'
         # Connecting MetaGraph with Entity Resolution Meta
         grouping_meta = metagraph.grouping_meta
         for er_meta in er_meta_list:
@@ -39,7 +63,8 @@ class GraphDataPlatform(ETLGroup):
             metagraph=metagraph,
             rdb=rdb,
             input_fs=canon_fs,
-            output_fs=subgraph_fs
+            output_fs=subgraph_fs,
+            dictionary_fs=dictionary_fs
         )
         args = [subgraph_extractor]
         # Insert Entity Resolutions to the DataFlow
@@ -49,7 +74,8 @@ class GraphDataPlatform(ETLGroup):
                 subgraph_fs=subgraph_fs,
                 mapping_fs=mapping_fs,
                 model_fs=model_fs,
-                rdb=rdb
+                rdb=rdb,
+                tmp_fs=tmp_fs
             )
             args.append(mapping)
         # 2. Group Subgraphs into Final Graph
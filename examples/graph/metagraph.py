@@ -35,6 +35,9 @@ class MetaGraph:
                  link_grouping_sqls: Dict[str, str] = dict(),
                  ):
         self._subgraphs = subgraphs
+        self._nodes = list(set(
+            [node for nodes in subgraphs.values() for node in nodes]))
+        self._links = list(set(subgraphs.keys()))
         self._node_grouping = node_grouping
         self.__check_subgraph_nodes()
         self._link_grouping = link_grouping
@@ -46,22 +49,47 @@ class MetaGraph:
         self.__check_link_sqls()
         self.__node_grouping_sqls = node_grouping_sqls
         self.__link_grouping_sqls = link_grouping_sqls
+        self.__build_indices()
+
+    def __build_indices(self):
+        """Complete the groupings and index the group of each subgraph node,
+        so the properties below are not recomputed on every access."""
+        self.__full_node_grouping = MetaGraph.complete_grouping(
+            self._node_grouping, self._nodes)
+        self.__full_link_grouping = MetaGraph.complete_grouping(
+            self._link_grouping, self._links)
+        node_parents = MetaGraph.parent_index(self.__full_node_grouping)
+        self.__triplets = dict()
+        for link, link_children in self.__full_link_grouping.items():
+            # every subgraph node has a group in the completed node grouping
+            src_child_node, dest_child_node = self._subgraphs[link_children[0]]
+            self.__triplets[link] = (
+                node_parents[src_child_node], node_parents[dest_child_node])
 
     @property
     def triplets(self) -> Dict[str, Tuple[str, str]]:
-        results = dict()
-        node_grouping = copy.deepcopy(self.node_grouping)
-        link_grouping = copy.deepcopy(self.link_grouping)
-        for link, link_children in link_grouping.items():
-            link_child = link_children[0]
-            src_child_node = self._subgraphs[link_child][0]
-            dest_child_node = self._subgraphs[link_child][1]
-            src_node = MetaGraph.get_parent_item_by_child(
-                node_grouping, src_child_node)
-            dest_node = MetaGraph.get_parent_item_by_child(
-                node_grouping, dest_child_node)
-            results[link] = (src_node, dest_node)
-        return results
+        return dict(self.__triplets)
+
+    @staticmethod
+    def complete_grouping(
+            grouping: Dict[str, List[str]], items: List[str]) -> Dict[str, List[str]]:
+        """Add a group of itself for each item not in any group"""
+        result = copy.copy(grouping)
+        grouped = set([child for children in grouping.values()
+                      for child in children])
+        for item in items:
+            if item not in grouped:
+                result.update({item: [item]})
+        return result
+
+    @staticmethod
+    def parent_index(grouping: Dict[str, List[str]]) -> Dict[str, str]:
+        """Index the (first) group of each child"""
+        result = dict()
+        for group, children in grouping.items():
+            for child in children:
+                result.setdefault(child, group)
+        return result
 
     @staticmethod
     def get_parent_item_by_child(grouping, target_child: str):
@@ -77,26 +105,26 @@ class MetaGraph:
         return self._subgraphs
 
     def __check_subgraph_nodes(self):
-        subgraph_nodes = self.nodes
+        subgraph_nodes = set(self._nodes)
         for _, nodes in self._node_grouping.items():
             for node in nodes:
                 assert node in subgraph_nodes, f'node `{node}` is not defined in nodes of subgraphs ({subgraph_nodes})'
 
     def __check_subgraph_links(self):
-        subgraph_links = self.links
+        subgraph_links = set(self._links)
         for _, links in self._link_grouping.items():
             for link in links:
                 assert link in subgraph_links, f'link `{link}` is not defined in links of subgraphs ({subgraph_links})'
 
     def __check_node_sqls(self):
-        subgraph_nodes = self.nodes
+        subgraph_nodes = set(self._nodes)
         for node in self.node_sqls:
             assert node in subgraph_nodes, f'node `{node}` of node_sqls is not defined in nodes of subgraphs ({subgraph_nodes})'
         for node in subgraph_nodes:
             assert node in self.node_sqls, f'sql of subgraph node `{node}` is not provided'
 
     def __check_link_sqls(self):
-        subgraph_links = self.links
+        subgraph_links = set(self._links)
         for link in self.link_sqls:
             assert link in subgraph_links, f'link `{link}` of link_sqls is not defined in links of subgraphs ({subgraph_links})'
         for link in subgraph_links:
@@ -104,18 +132,15 @@ class MetaGraph:
 
     @property
     def nodes(self) -> List[str]:
-        results = []
-        for from_node, to_node in self._subgraphs.values():
-            results.append(from_node)
-            results.append(to_node)
-        return list(set(results))
+        return list(self._nodes)
 
     @property
     def links(self) -> List[str]:
-        return list(set([link for link in self._subgraphs.keys()]))
+        return list(self._links)
 
     @property
     def grouping_meta(self) -> GroupingMeta:
+        # the groupings are copied, as GroupingMeta alters its own groups
         return GroupingMeta(
             self.node_grouping,
             self.link_grouping,
@@ -126,22 +151,10 @@ class MetaGraph:
 
     @property
     def node_grouping(self) -> Dict[str, List[str]]:
-        result = copy.copy(self._node_grouping)
-        exist_subgraph_nodes = []
-        for nodes in self._node_grouping.values():
-            exist_subgraph_nodes.extend(nodes)
-        for node in self.nodes:
-            if node not in exist_subgraph_nodes:
-                result.update({node: [node]})
-        return result
+        return dict([(group, list(children))
+                    for group, children in self.__full_node_grouping.items()])
 
     @property
     def link_grouping(self) -> Dict[str, List[str]]:
-        result = copy.copy(self._link_grouping)
-        exist_subgraph_links = []
-        for links in self._link_grouping.values():
-            exist_subgraph_links.extend(links)
-        for link in self.links:
-            if link not in exist_subgraph_links:
-                result.update({link: [link]})
-        return result
+        return dict([(group, list(children))
+                    for group, children in self.__full_link_grouping.items()])
@@ -7,9 +7,11 @@ TODO:
 - [ ] In convertor.py, allow class to takes `node` or `node_of_link`
     as input for ID convertion.
 """
+from typing import List, Optional, Tuple
 from batch_framework.etl import SQLExecutor, ETLGroup
 from batch_framework.filesystem import FileSystem
 from batch_framework.rdb import RDB
+from batch_framework.remap import remap_macro_sql, remap_sql
 
 __all__ = ['IDConvertor']
 
@@ -17,66 +19,80 @@ __all__ = ['IDConvertor']
 class IDConvertor(ETLGroup):
     """
     Converting ID of Messy Node to Cleaned Node ID
+
+    The mapping is loaded once, and all the id columns of
+    each item are converted in a single pass.
+
+    Args:
+        - messy_node: name of the messy node
+        - items: the items with their id columns to be converted
+        - tmp_fs: where the items and the mapping are passed to
+            for the conversion (mapping_fs by default)
     """
 
-    def __init__(self, messy_node: str, source_item: str, target_column: str,
-                 db: RDB, subgraph_fs: FileSystem, mapping_fs: FileSystem):
-        self._source_item = source_item
+    def __init__(self, messy_node: str, items: List[Tuple[str, List[str]]],
+                 db: RDB, subgraph_fs: FileSystem, mapping_fs: FileSystem,
+                 tmp_fs: Optional[FileSystem] = None):
+        self._items = items
         self._messy_node = messy_node
+        if tmp_fs is None:
+            tmp_fs = mapping_fs
+        source_items = [item for item, _ in items]
         units = [
             _TablePassing(
-                source_item,
+                source_items,
                 db,
                 input_fs=subgraph_fs,
-                output_fs=mapping_fs),
+                output_fs=tmp_fs),
+            _TablePassing(
+                [f'mapper_{messy_node}_clean'],
+                db,
+                input_fs=mapping_fs,
+                output_fs=tmp_fs),
             _IDConvertor(
                 messy_node,
-                source_item,
-                target_column,
+                items,
                 db,
-                input_fs=mapping_fs,
+                input_fs=tmp_fs,
                 output_fs=subgraph_fs)
         ]
         super().__init__(*units)
 
     @property
     def input_ids(self):
-        return [
-            self._source_item,
+        return [item for item, _ in self._items] + [
             f'mapper_{self._messy_node}_clean'
         ]
 
     @property
     def output_ids(self):
-        return [self._source_item + 'Q']
+        return [item + 'Q' for item, _ in self._items]
 
 
 class _TablePassing(SQLExecutor):
     """
-    Passing Input Table to mapping_fs
+    Passing Input Tables to the filesystem of the conversion
     """
 
-    def __init__(self, source_item: str, db: RDB,
+    def __init__(self, source_items: List[str], db: RDB,
                  input_fs: FileSystem, output_fs: FileSystem):
-        self._source_item = source_item
+        self._source_items = source_items
         super().__init__(db, input_fs=input_fs, output_fs=output_fs)
 
     @property
     def input_ids(self):
-        return [self._source_item]
+        return self._source_items
 
     @property
     def output_ids(self):
-        return [self._source_item + '_tmp']
+        return [item + '_tmp' for item in self._source_items]
 
     def sqls(self):
-        return {
-            self.output_ids[0]: f"""
+        return dict([(item + '_tmp', f"""
                 SELECT
                     *
-                FROM {self.input_ids[0]}
-            """
-        }
+                FROM {item}
+            """) for item in self._source_items])
 
 
 class _IDConvertor(SQLExecutor):
@@ -84,32 +100,31 @@ class _IDConvertor(SQLExecutor):
     Converting ID of Messy Node to Cleaned Node ID
     """
 
-    def __init__(self, messy_node: str, source_item: str, target_column: str,
+    def __init__(self, messy_node: str, items: List[Tuple[str, List[str]]],
                  db: RDB, input_fs: FileSystem, output_fs: FileSystem):
         self._messy_node = messy_node
-        self._source_item = source_item
-        self._target_column = target_column
+        self._items = items
         super().__init__(db, input_fs=input_fs, output_fs=output_fs)
 
     @property
     def input_ids(self):
-        return [
-            self._source_item + '_tmp',
-            f'mapper_{self._messy_node}_clean'
+        return [item + '_tmp' for item, _ in self._items] + [
+            f'mapper_{self._messy_node}_clean_tmp'
         ]
 
     @property
     def output_ids(self):
-        return [self._source_item + 'Q']
+        return [item + 'Q' for item, _ in self._items]
+
+    def _prepare(self, cursor, **kwargs):
+        """Load the mapping once and create the remapping macro"""
+        super()._prepare(cursor, **kwargs)
+        cursor.execute(f"""
+            CREATE OR REPLACE TEMP TABLE _id_mapping AS
+            SELECT messy_id, new_id FROM mapper_{self._messy_node}_clean_tmp
+        """)
+        cursor.execute(remap_macro_sql('_id_mapping'))
 
     def sqls(self):
-        return {
-            self.output_ids[0]: f"""
-                SELECT
-                    COALESCE(t2.new_id, t1.{self._target_column}) AS {self._target_column},
-                    t1.* EXCLUDE ({self._target_column})
-                FROM {self.input_ids[0]} AS t1
-                LEFT JOIN {self.input_ids[1]} AS t2
-                ON t1.{self._target_column} = t2.messy_id
-            """
-        }
+        return dict([(item + 'Q', remap_sql(item + '_tmp', columns))
+                     for item, columns in self._items])
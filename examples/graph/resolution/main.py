@@ -4,6 +4,7 @@ TODO:
     -> Build Entity Resolution Class
 - [X] Enable no-canon workflow in mapping generator
 """
+from typing import Optional
 from batch_framework.storage import PandasStorage
 from batch_framework.filesystem import FileSystem
 from batch_framework.etl import SQLExecutor, ETLGroup
@@ -15,9 +16,18 @@ from .convertor import IDConvertor
 
 
 class MappingGenerator(ETLGroup):
+    """
+    Entity resolution of a messy node.
+    The intermediates (features, blocks and the tables passed to
+    IDConvertor) are kept on `tmp_fs` (mapping_fs by default).
+    """
+
     def __init__(self, meta: ERMeta, subgraph_fs: FileSystem,
-                 mapping_fs: FileSystem, model_fs: FileSystem, rdb: RDB):
+                 mapping_fs: FileSystem, model_fs: FileSystem, rdb: RDB,
+                 tmp_fs: Optional[FileSystem] = None):
         self._mapping_fs = mapping_fs
+        if tmp_fs is None:
+            tmp_fs = mapping_fs
         etl_layers = []
         if meta.has_canon:
             etl_layers.append(
@@ -25,7 +35,8 @@ class MappingGenerator(ETLGroup):
                              PandasStorage(subgraph_fs),
                              PandasStorage(mapping_fs),
                              model_fs=model_fs,
-                             threshold=0.25
+                             threshold=0.25,
+                             tmp_fs=tmp_fs
                              )
             )
             etl_layers.append(
@@ -46,7 +57,8 @@ class MappingGenerator(ETLGroup):
                     model_fs,
                     rdb,
                     threshold=0.5,
-                    take_filtered=True
+                    take_filtered=True,
+                    tmp_fs=tmp_fs
                 )
             )
             etl_layers.append(
@@ -65,7 +77,8 @@ class MappingGenerator(ETLGroup):
                     model_fs,
                     rdb,
                     threshold=0.5,
-                    take_filtered=False
+                    take_filtered=False,
+                    tmp_fs=tmp_fs
                 )
             )
             etl_layers.append(
@@ -75,15 +88,15 @@ class MappingGenerator(ETLGroup):
                     workspace_fs=mapping_fs
                 )
             )
-        for item, column in meta.id_convertion_messy_items:
+        if len(meta.id_convertion_messy_items):
             etl_layers.append(
                 IDConvertor(
                     meta.messy_node,
-                    item,
-                    column,
+                    meta.id_convertion_messy_items,
                     rdb,
                     subgraph_fs=subgraph_fs,
-                    mapping_fs=mapping_fs
+                    mapping_fs=mapping_fs,
+                    tmp_fs=tmp_fs
                 )
             )
         super().__init__(
@@ -20,10 +20,12 @@ TODO:
         - [ ] Add Merge class to merge the output of these three flow.
 
 """
-from typing import List, Dict, Iterator
+from typing import List, Dict, Iterator, Optional
 import pandas as pd
+import pyarrow as pa
 import dedupe
 from batch_framework.etl import ETLGroup
+from batch_framework.diff import diff_tables
 from batch_framework.storage import PandasStorage
 from batch_framework.filesystem import FileSystem
 from ..base import Messy2Canon
@@ -110,34 +112,28 @@ class Pairer(Messy2Canon, MatcherBase):
     def dict_to_input(input_item):
         node_id = input_item['node_id']
         del input_item['node_id']
-        return str(node_id), input_item
+        return node_id, input_item
 
     def transform(self, inputs: List[pd.DataFrame],
                   **kwargs) -> List[pd.DataFrame]:
         if self.exists_cache:
             # Load Cache
-            feedback_messy_ids = set(self.load_cache(
-                self.input_ids[0])['node_id'].tolist())
-            feedback_canon_ids = set(self.load_cache(
-                self.input_ids[1])['node_id'].tolist())
+            feedback_messy = self.load_cache(self.input_ids[0])[['node_id']]
+            feedback_canon = self.load_cache(self.input_ids[1])[['node_id']]
             feedback_table = self.load_cache(self.output_ids[0])
             print('Cache Loaded')
             messy_df = inputs[0]
             canon_df = inputs[1]
-            messy_ids = set(messy_df.node_id.tolist())
-            canon_ids = set(canon_df.node_id.tolist())
-            new_messy_ids = messy_ids - feedback_messy_ids
-            new_canon_ids = canon_ids - feedback_canon_ids
-            old_messy_ids = messy_ids & feedback_messy_ids
-            old_canon_ids = canon_ids & feedback_canon_ids
-            old_messy_df = messy_df[messy_df.node_id.map(
-                lambda x: x in old_messy_ids)]
-            new_messy_df = messy_df[messy_df.node_id.map(
-                lambda x: x in new_messy_ids)]
-            old_canon_df = canon_df[canon_df.node_id.map(
-                lambda x: x in old_canon_ids)]
-            new_canon_df = canon_df[canon_df.node_id.map(
-                lambda x: x in new_canon_ids)]
+            messy_diff = diff_tables(
+                messy_df[['node_id']], feedback_messy, keys=['node_id'])
+            canon_diff = diff_tables(
+                canon_df[['node_id']], feedback_canon, keys=['node_id'])
+            old_messy_df = Pairer.select_by_ids(
+                messy_df, messy_diff['unchanged'])
+            new_messy_df = Pairer.select_by_ids(messy_df, messy_diff['added'])
+            old_canon_df = Pairer.select_by_ids(
+                canon_df, canon_diff['unchanged'])
+            new_canon_df = Pairer.select_by_ids(canon_df, canon_diff['added'])
             print('old_messy_df:', len(old_messy_df))
             print('new_messy_df:', len(new_messy_df))
             print('old_canon_df:', len(old_canon_df))
@@ -167,11 +163,13 @@ class Pairer(Messy2Canon, MatcherBase):
         else:
             messy_df = inputs[0]
             canon_df = inputs[1]
-            messy_ids = set(messy_df.node_id.tolist())
-            canon_ids = set(canon_df.node_id.tolist())
             results = self.match_tables([messy_df, canon_df])
             return results
 
+    @staticmethod
+    def select_by_ids(df: pd.DataFrame, ids: pa.Table) -> pd.DataFrame:
+        return df[df.node_id.isin(ids.column('node_id').to_pandas())]
+
     def match_tables(
             self, inputs: List[pd.DataFrame], **kwargs) -> List[pd.DataFrame]:
         messy = dict([Pairer.dict_to_input(item)
@@ -205,9 +203,16 @@ class Pairer(Messy2Canon, MatcherBase):
 
 
 class CanonMatcher(ETLGroup, Messy2Canon, MatcherBase):
+    """
+    Match messy nodes to canonical nodes.
+    The features are kept on `tmp_fs` (the input filesystem by default).
+    """
+
     def __init__(self, mapping_meta: ERMeta, input_storage: PandasStorage,
-                 output_storage: PandasStorage, model_fs: FileSystem, threshold: float = 0.25):
-        tmp_storage = PandasStorage(input_storage._backend)
+                 output_storage: PandasStorage, model_fs: FileSystem, threshold: float = 0.25,
+                 tmp_fs: Optional[FileSystem] = None):
+        tmp_storage = PandasStorage(
+            input_storage._backend if tmp_fs is None else tmp_fs)
         mfe = MessyFeatureEngineer(
             mapping_meta, input_storage, tmp_storage, model_fs=model_fs, threshold=threshold
         )
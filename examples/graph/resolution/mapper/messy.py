@@ -1,15 +1,15 @@
-from typing import Iterator, Tuple, List, Dict
+from typing import Iterator, Tuple, List, Dict, Optional
 import pandas as pd
 import dedupe
 import tqdm
 import io
 import csv
 import itertools
-import igraph as ig
+import numpy as np
 from pathos.multiprocessing import Pool
 from batch_framework.filesystem import FileSystem
-from batch_framework.storage import PandasStorage
-from batch_framework.etl import SQLExecutor, ETLGroup
+from batch_framework.storage import Storage, PandasStorage, table_storage
+from batch_framework.etl import SQLExecutor, ETLGroup, IncrementalProcessor, Delta
 from batch_framework.rdb import RDB
 from .base import MatcherBase
 from ..base import MessyOnly
@@ -20,42 +20,51 @@ class MessyMatcher(ETLGroup):
     """
     Input Messy Node Table
     Output a Messy->Cluster Mapping Table
+
+    The features and blocks are kept on `tmp_fs`
+    (e.g., a `temporary=True` filesystem; mapping_fs by default).
     """
 
     def __init__(self, meta: ERMeta, subgraph_fs: FileSystem, mapping_fs: FileSystem,
-                 model_fs: FileSystem, rdb: RDB, threshold=0.5, take_filtered=True):
+                 model_fs: FileSystem, rdb: RDB, threshold=0.5, take_filtered=True,
+                 tmp_fs: Optional[FileSystem] = None):
         self._mapping_fs = mapping_fs
         self._take_filtered = take_filtered
+        if tmp_fs is None:
+            tmp_fs = mapping_fs
         messy_feature_engineer = MessyFeatureEngineer(
             meta,
             PandasStorage(subgraph_fs),
-            PandasStorage(mapping_fs),
+            table_storage(tmp_fs),
             model_fs=None,
             take_filtered=self._take_filtered
         )
         messy_blocker = MessyBlocker(
             meta,
-            PandasStorage(mapping_fs),
-            PandasStorage(mapping_fs),
+            table_storage(tmp_fs),
+            table_storage(tmp_fs),
             model_fs=model_fs
         )
         messy_entity_map = MessyEntityPairer(
             meta,
             rdb,
-            mapping_fs
+            input_fs=tmp_fs,
+            output_fs=mapping_fs
         )
         messy_pair_selector = MessyPairSelector(
             meta,
             PandasStorage(mapping_fs),
             PandasStorage(mapping_fs),
             model_fs=model_fs,
-            threshold=threshold
+            threshold=threshold,
+            make_cache=True
         )
         messy_cluster = MessyClusterer(
             meta,
             PandasStorage(mapping_fs),
             PandasStorage(mapping_fs),
-            model_fs=None
+            model_fs=None,
+            make_cache=True
         )
         self._meta = meta
         super().__init__(
@@ -113,7 +122,7 @@ class MessyFeatureEngineer(MessyOnly, MatcherBase):
     Output node feature table
     """
 
-    def __init__(self, mapping_meta: ERMeta, input_storage: PandasStorage, output_storage: PandasStorage,
+    def __init__(self, mapping_meta: ERMeta, input_storage: PandasStorage, output_storage: Storage,
                  model_fs: FileSystem, threshold: float = 0.25, take_filtered=True):
         self._take_filtered = take_filtered
         super().__init__(mapping_meta, input_storage, output_storage, model_fs=model_fs)
@@ -210,10 +219,11 @@ class MessyEntityPairer(SQLExecutor, MessyOnly):
     """Generate Entity Map from Block Table
     """
 
-    def __init__(self, meta: ERMeta, rdb: RDB, fs: FileSystem):
+    def __init__(self, meta: ERMeta, rdb: RDB,
+                 input_fs: FileSystem, output_fs: FileSystem):
         self._meta = meta
         self.messy_node = meta.messy_node
-        super().__init__(rdb, input_fs=fs, output_fs=fs)
+        super().__init__(rdb, input_fs=input_fs, output_fs=output_fs)
 
     @property
     def input_ids(self):
@@ -273,8 +283,6 @@ class MessyEntityMapValidate(MessyOnly, MatcherBase):
             entity_map_table.a_node_id.tolist()) | set(
             entity_map_table.b_node_id.tolist())
         print('common node ids:', len(feature_node_ids & block_table_nodes))
-        id_pairs_table['from'] = id_pairs_table['from'].map(int)
-        id_pairs_table['to'] = id_pairs_table['to'].map(int)
         id_pairs_nodes = set(
             id_pairs_table['from'].tolist()) | set(
             id_pairs_table['to'].tolist())
@@ -282,15 +290,13 @@ class MessyEntityMapValidate(MessyOnly, MatcherBase):
         return []
 
 
-class MessyPairSelector(MessyOnly, MatcherBase):
+class MessyPairSelector(MessyOnly, MatcherBase, IncrementalProcessor):
     """
     Input Entity Mapping Table
     Output Id-Id Pairing Table
-    """
 
-    def __init__(self, *args, **kwargs):
-        kwargs['make_cache'] = True
-        super().__init__(*args, **kwargs)
+    Only entity pairs added or changed since the previous run are scored.
+    """
 
     def start(self):
         """Load model setting in the beginning
@@ -301,39 +307,35 @@ class MessyPairSelector(MessyOnly, MatcherBase):
         self._deduper = dedupe.StaticDedupe(buff, num_cores=4, in_memory=True)
         print('Finish Creating dedupe.StaticDedupe of MessyMatcher')
 
-    def transform(self, inputs: List[pd.DataFrame],
-                  **kwargs) -> List[pd.DataFrame]:
-        table = inputs[0]
-        print('[MessyPairSelector] table size:', len(table))
-        if self.exists_cache:
-            feedback_input = self.load_cache(self.input_ids[0])
-            feedback_input['id_pairs'] = feedback_input.a_node_id.map(
-                str) + feedback_input.b_node_id.map(str)
-            table['id_pairs'] = table.a_node_id.map(
-                str) + table.b_node_id.map(str)
-            old_id_pairs = set(feedback_input['id_pairs'].tolist())
-            print('# old_id_pairs:', len(old_id_pairs))
-            old_condi = table['id_pairs'].map(lambda x: x in old_id_pairs)
-            new_table = table[~old_condi]
-            print('# new_table:', len(new_table))
-            del new_table['id_pairs']
-            if len(new_table) > 0:
-                new_result = self.do_pairing(new_table)
-                feedback_result = self.load_cache(self.output_ids[0])
-                print('# feedback_result:', len(feedback_result))
-                print('# new_result:', len(new_result))
-                result = pd.concat([feedback_result, new_result])
-                print('Done Append New Pairs')
-            else:
-                result = self.load_cache(self.output_ids[0])
-                print('Done Loading New Pairs')
-        else:
+    @property
+    def keys(self):
+        return {
+            self.input_ids[0]: ['a_node_id', 'b_node_id'],
+            self.output_ids[0]: ['from', 'to']
+        }
+
+    def transform(self, inputs: List[Delta[pd.DataFrame]],
+                  **kwargs) -> List[Delta[pd.DataFrame]]:
+        entity_map = inputs[0]
+        print('[MessyPairSelector] # added:', len(entity_map.added))
+        print('[MessyPairSelector] # removed:', len(entity_map.removed))
+        print('[MessyPairSelector] # changed:', len(entity_map.changed))
+        table = pd.concat([entity_map.added, entity_map.changed])
+        if len(table) > 0:
             result = self.do_pairing(table)
             print('Done Creating Pairs')
+        else:
+            result = pd.DataFrame([], columns=['from', 'to', 'score'])
         result.sort_values('score', ascending=False, inplace=True)
         result.drop_duplicates(subset=['from', 'to'], inplace=True)
-        print('# Final Result:', len(result))
-        return [result]
+        # pairs of changed entities may fall below threshold
+        removed = pd.concat([entity_map.removed, entity_map.changed])
+        removed = pd.DataFrame({
+            'from': removed.a_node_id,
+            'to': removed.b_node_id
+        }, columns=['from', 'to'])
+        print('# New Pairs:', len(result))
+        return [Delta(added=result, removed=removed, changed=result.head(0))]
 
     def do_pairing(self, table: pd.DataFrame) -> pd.DataFrame:
         pairs_with_score = self.calculate_scores(
@@ -388,8 +390,8 @@ class MessyPairSelector(MessyOnly, MatcherBase):
                           for key, value in record.items() if key in _a_fields])
             b_json = dict([(key.replace('b_', ''), value)
                           for key, value in record.items() if key in _b_fields])
-            record_a = (str(record['a_node_id']), a_json)
-            record_b = (str(record['b_node_id']), b_json)
+            record_a = (record['a_node_id'], a_json)
+            record_b = (record['b_node_id'], b_json)
             yield record_a, record_b
 
     @property
@@ -413,36 +415,103 @@ class MessyPairSelector(MessyOnly, MatcherBase):
         return [f'{self.label}_id_pairs']
 
 
-class MessyClusterer(MessyOnly, MatcherBase):
-    """Find Connected Components"""
+def connected_components(sources: np.ndarray,
+                         targets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Connected components of the (undirected) graph of some edges
+
+    The ids are factorised into positions, and a union-find over the
+    positions hooks the larger root of each edge to the smaller one and
+    compresses the paths by pointer jumping, with numpy operations over
+    all the edges at once.
+
+    Args:
+        sources (np.ndarray): source id of each edge
+        targets (np.ndarray): target id of each edge
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: the (sorted) ids and the
+            smallest id of the component of each id
+    """
+    ids, inverse = np.unique(
+        np.concatenate([sources, targets]), return_inverse=True)
+    u, v = inverse[:len(sources)], inverse[len(sources):]
+    parent = np.arange(len(ids))
+    while True:
+        root_u, root_v = parent[u], parent[v]
+        pending = root_u != root_v
+        if not pending.any():
+            break
+        root_u, root_v = root_u[pending], root_v[pending]
+        np.minimum.at(parent, np.maximum(root_u, root_v),
+                      np.minimum(root_u, root_v))
+        while True:
+            grand_parent = parent[parent]
+            if np.array_equal(grand_parent, parent):
+                break
+            parent = grand_parent
+    return ids, ids[parent]
+
+
+class MessyClusterer(MessyOnly, MatcherBase, IncrementalProcessor):
+    """Find Connected Components
+
+    Each cluster is identified by the smallest node id of its members:
+    the node ids are dense integers unique across the graph, so the
+    cluster ids neither collide with other nodes nor change when
+    unrelated clusters change.
+
+    When pairs are only added since the previous run, the added pairs
+    are merged into the previous clusters (each member linked to its
+    cluster id). When pairs are removed, clusters may split, so all the
+    pairs are clustered again. Only the changed mappings are merged
+    into the output.
+    """
     @property
     def input_ids(self):
         return [f'{self.label}_id_pairs']
 
-    def transform(self, inputs: List[pd.DataFrame],
-                  **kwargs) -> List[pd.DataFrame]:
-        id_pair_df = inputs[0]
-        id_pair_df['from'] = id_pair_df['from'].map(int)
-        id_pair_df['to'] = id_pair_df['to'].map(int)
-        node_set_in_pair = set(
-            id_pair_df['from'].tolist()) | set(
-            id_pair_df['to'].tolist())
-        print('node size in pairs:', len(node_set_in_pair))
-        g = ig.Graph.TupleList(
-            id_pair_df.itertuples(index=False), directed=True, weights=False, edge_attrs="score")
-        components = g.connected_components(mode='weak')
-        messy2cluster_mapping = []
-        for cluster_id, cluster_group in enumerate(components):
-            for id in cluster_group:
-                messy2cluster_mapping.append(
-                    (g.vs[id]['name'], MessyClusterer.do_hash(cluster_id))
-                )
-        table = pd.DataFrame(messy2cluster_mapping,
-                             columns=['messy_id', 'cluster_id'])
-        print('# of Cluster:', cluster_id + 1)
-        return [table]
+    @property
+    def keys(self):
+        return {
+            self.input_ids[0]: ['from', 'to'],
+            self.output_ids[0]: ['messy_id']
+        }
 
-    @staticmethod
-    def do_hash(cluster_id: int) -> int:
-        import ctypes
-        return ctypes.c_size_t(hash(f'cluster*id*v1*{cluster_id}')).value
+    def transform(self, inputs: List[Delta[pd.DataFrame]],
+                  **kwargs) -> List[Delta[pd.DataFrame]]:
+        id_pairs = inputs[0]
+        print('[MessyClusterer] # added:', len(id_pairs.added))
+        print('[MessyClusterer] # removed:', len(id_pairs.removed))
+        previous = self._load_previous(self._output_storage, self.output_ids[0])
+        if previous is not None:
+            previous = previous.to_pandas()
+        if previous is None:
+            sources = id_pairs.added['from'].to_numpy()
+            targets = id_pairs.added['to'].to_numpy()
+        elif len(id_pairs.removed) or not previous.cluster_id.isin(
+                previous.messy_id).all():
+            print('[MessyClusterer] Clustering all pairs')
+            all_pairs = self._input_storage.download(self.input_ids[0])
+            sources = all_pairs['from'].to_numpy()
+            targets = all_pairs['to'].to_numpy()
+        else:
+            sources = np.concatenate([
+                id_pairs.added['from'].to_numpy(), previous.messy_id.to_numpy()])
+            targets = np.concatenate([
+                id_pairs.added['to'].to_numpy(), previous.cluster_id.to_numpy()])
+        messy_ids, cluster_ids = connected_components(sources, targets)
+        table = pd.DataFrame({'messy_id': messy_ids, 'cluster_id': cluster_ids})
+        print('node size in pairs:', len(table))
+        print('# of Cluster:', len(np.unique(cluster_ids)))
+        if previous is None:
+            return [Delta(added=table, removed=table[['messy_id']].head(0),
+                          changed=table.head(0))]
+        merged = table.merge(previous, on='messy_id', how='left',
+                             suffixes=('', '_previous'))
+        is_new = merged.cluster_id_previous.isna()
+        is_changed = ~is_new & (merged.cluster_id != merged.cluster_id_previous)
+        removed = previous[~previous.messy_id.isin(table.messy_id)]
+        print('[MessyClusterer] # changed mappings:', int(is_changed.sum()))
+        return [Delta(
+            added=table[is_new.to_numpy()],
+            removed=removed[['messy_id']],
+            changed=table[is_changed.to_numpy()])]
@@ -28,7 +28,7 @@ class ERMeta:
         self.messy_lambda = messy_lambda
         self.canon_node = canon_node
         self.canon_lambda = canon_lambda
-        self.id_convertion_messy_items: List[Tuple[str, str]] = []
+        self.id_convertion_messy_items: List[Tuple[str, List[str]]] = []
 
     @property
     def has_canon(self) -> bool:
@@ -40,21 +40,22 @@ class ERMeta:
 
         In detail,
             1. Read subgraphs and determine which node or link and which columns should be ID converted.
-            2. Add IDConvertor infos to a data variable.
+            2. Add IDConvertor infos (the columns to be converted of each item) to a data variable.
             3. Change meta original links/nodes property to new links/nodes property.
         """
         assert len(
             self.id_convertion_messy_items) == 0, 'def alter_grouping_way should only be called once'
-        self.repeated_items: Dict[str, str] = dict(
-            [(item[0], item[0]) for item in self.messy_items])
-        for messy_item, column in self.messy_items:
-            current_nm = self.repeated_items[messy_item]
-            self.id_convertion_messy_items.append((current_nm, column))
-            new_nm = current_nm + 'Q'
-            if column == 'node_id':
-                meta.alter_input_node(current_nm, new_nm)
+        columns: Dict[str, List[str]] = dict()
+        for messy_item, column in sorted(self.messy_items):
+            columns.setdefault(messy_item, []).append(column)
+        self.repeated_items: Dict[str, str] = dict()
+        for messy_item, item_columns in columns.items():
+            self.id_convertion_messy_items.append((messy_item, item_columns))
+            new_nm = messy_item + 'Q'
+            if 'node_id' in item_columns:
+                meta.alter_input_node(messy_item, new_nm)
             else:
-                meta.alter_input_link(current_nm, new_nm)
+                meta.alter_input_link(messy_item, new_nm)
             self.repeated_items[messy_item] = new_nm
         return meta
 
@@ -1,10 +1,12 @@
-from typing import List
-from batch_framework.etl import SQLExecutor
+from typing import List, Optional
+from batch_framework.etl import SQLExecutor, DictionaryEncoder
 from batch_framework.rdb import RDB
 from batch_framework.filesystem import FileSystem
 from ..metagraph import MetaGraph
 
-__all__ = ['LinkExtractor', 'NodeExtractor']
+__all__ = ['LinkExtractor', 'NodeExtractor', 'NodeIdEncoder']
+
+HASHED_SUFFIX = '_hashed'
 
 
 class ExtractorBase(SQLExecutor):
@@ -21,16 +23,39 @@ class ExtractorBase(SQLExecutor):
 class NodeExtractor(ExtractorBase):
     @property
     def output_ids(self):
-        return self._metagraph.nodes
+        return [node + HASHED_SUFFIX for node in self._metagraph.nodes]
 
     def sqls(self, **kwargs):
-        return self._metagraph.node_sqls
+        return dict([(node + HASHED_SUFFIX, sql)
+                    for node, sql in self._metagraph.node_sqls.items()])
 
 
 class LinkExtractor(ExtractorBase):
     @property
     def output_ids(self):
-        return self._metagraph.links
+        return [link + HASHED_SUFFIX for link in self._metagraph.links]
 
     def sqls(self, **kwargs):
-        return self._metagraph.link_sqls
+        return dict([(link + HASHED_SUFFIX, sql)
+                    for link, sql in self._metagraph.link_sqls.items()])
+
+
+class NodeIdEncoder(DictionaryEncoder):
+    """
+    Replace the (hashed) node ids of the extracted nodes and links
+    by dense integer ids of a dictionary shared by all the subgraphs,
+    so the ER, grouping and export stages work on compact integers.
+    """
+
+    def __init__(self, metagraph: MetaGraph, rdb: RDB,
+                 input_fs: FileSystem, output_fs: FileSystem,
+                 dictionary_fs: Optional[FileSystem] = None):
+        columns = dict(
+            [(node + HASHED_SUFFIX, ['node_id']) for node in metagraph.nodes] +
+            [(link + HASHED_SUFFIX, ['from_id', 'to_id']) for link in metagraph.links])
+        super().__init__('node_id_dictionary', columns, rdb,
+                         input_fs=input_fs, output_fs=output_fs,
+                         dictionary_fs=dictionary_fs)
+
+    def encoded_id(self, id: str) -> str:
+        return id[:-len(HASHED_SUFFIX)]
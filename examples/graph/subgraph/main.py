@@ -1,9 +1,9 @@
-from typing import List
+from typing import List, Optional
 from batch_framework.rdb import RDB
 from batch_framework.etl import ETLGroup
 from batch_framework.storage import PandasStorage
 from batch_framework.filesystem import FileSystem
-from .extractor import NodeExtractor, LinkExtractor
+from .extractor import NodeExtractor, LinkExtractor, NodeIdEncoder
 from .validate import Validator
 from ..metagraph import MetaGraph
 
@@ -11,17 +11,24 @@ from ..metagraph import MetaGraph
 class SubgraphExtractor(ETLGroup):
     """
     Extract Link and Node from Raw Tabular Data
+
+    The node ids are encoded as dense integers by a dictionary
+    persisted on `dictionary_fs` (output_fs by default).
     """
 
     def __init__(self, metagraph: MetaGraph, rdb: RDB,
-                 input_fs: FileSystem, output_fs: FileSystem):
+                 input_fs: FileSystem, output_fs: FileSystem,
+                 dictionary_fs: Optional[FileSystem] = None):
         self._metagraph = metagraph
         link_op = LinkExtractor(
             metagraph=metagraph, rdb=rdb, input_fs=input_fs, output_fs=output_fs)
         node_op = NodeExtractor(
             metagraph=metagraph, rdb=rdb, input_fs=input_fs, output_fs=output_fs)
+        encode_op = NodeIdEncoder(
+            metagraph=metagraph, rdb=rdb, input_fs=output_fs, output_fs=output_fs,
+            dictionary_fs=dictionary_fs)
         val_op = Validator(metagraph, PandasStorage(output_fs))
-        super().__init__(link_op, node_op, val_op)
+        super().__init__(link_op, node_op, encode_op, val_op)
 
     @property
     def input_ids(self) -> List[str]:
@@ -13,9 +13,9 @@ class GraphConstructor(ETLGroup):
     def __init__(self, test_count: Optional[int] = None):
         self.pypi_table_loader = SimplePyPiCanonicalize(
             raw_df=DropboxBackend('/data/canon/raw/'),
-            tmp_fs=DropboxBackend('/data/canon/tmp/'),
+            tmp_fs=DropboxBackend('/data/canon/tmp/', temporary=True),
             output_fs=DropboxBackend('/data/canon/output/'),
-            partition_fs=DropboxBackend('/data/canon/partition/'),
+            partition_fs=DropboxBackend('/data/canon/partition/', temporary=True),
             download_worker_count=16,
             update_worker_count=16,
             test_count=test_count,
@@ -32,7 +32,8 @@ class GraphConstructor(ETLGroup):
                 copy.deepcopy(er_meta_requirement)],
             mapping_fs=DropboxBackend('/data/mapping/'),
             model_fs=DropboxBackend('/data/model/'),
-            rdb=DuckDBBackend()
+            rdb=DuckDBBackend(),
+            tmp_fs=DropboxBackend('/data/graph_tmp/', temporary=True)
         )
         super().__init__(
             self.pypi_table_loader,
@@ -103,7 +103,7 @@ class TestFlow(ETLGroup):
             input_storage,
             output_storage
         ), SPLIT_COUNT,
-            tmp_fs=LocalBackend('./data/parallel/partition/'),
+            tmp_fs=LocalBackend('./data/parallel/partition/', temporary=True),
             has_external_input=True
         )
         expect_flow = ExpectFlow(
@@ -125,7 +125,7 @@ class MemoryIntenseFlow(ETLGroup):
     def __init__(self):
         src_storage = PandasStorage(LocalBackend('./data/parallel/'))
         target_storage = PandasStorage(LocalBackend('./data/parallel/'))
-        tmp_fs = LocalBackend('./data/parallel/partition/')
+        tmp_fs = LocalBackend('./data/parallel/partition/', temporary=True)
         process1 = MapReduce(TestSmallToLargeProcess(
             src_storage,
             target_storage,
@@ -0,0 +1,25 @@
+import os
+import hashlib
+from batch_framework.chunking import content_chunks, dropbox_content_hash
+
+
+def test_content_chunks():
+    data = os.urandom(3000000)
+    chunks = list(content_chunks([data], avg_size=100000))
+    assert b''.join(chunks) == data
+    assert all(25000 <= len(chunk) <= 400000 for chunk in chunks[:-1])
+    blocks = [data[i:i + 123457] for i in range(0, len(data), 123457)]
+    assert list(content_chunks(blocks, avg_size=100000)) == chunks
+    edited = data[:1500000] + b'new rows' + data[1500000:]
+    edited_chunks = list(content_chunks([edited], avg_size=100000))
+    assert b''.join(edited_chunks) == edited
+    assert len(set(edited_chunks) - set(chunks)) <= 2
+    assert list(content_chunks([], avg_size=100000)) == [b'']
+
+
+def test_dropbox_content_hash():
+    assert dropbox_content_hash(b'') == hashlib.sha256(b'').hexdigest()
+    data = b'a' * (4 * 1024 * 1024 + 1)
+    digests = hashlib.sha256(data[:4 * 1024 * 1024]).digest() + \
+        hashlib.sha256(b'a').digest()
+    assert dropbox_content_hash(data) == hashlib.sha256(digests).hexdigest()
@@ -0,0 +1,48 @@
+import pytest
+from paradag import DAGCycleError, DAGVertexNotFoundError, SequentialProcessor, MultiThreadProcessor
+from batch_framework.dag import CompiledDAG, run_dag
+
+
+class RecordExecutor:
+    def __init__(self):
+        self.executed = []
+
+    def param(self, vertex):
+        return vertex
+
+    def execute(self, param):
+        self.executed.append(param)
+
+
+def test_compiled_dag():
+    dag = CompiledDAG()
+    dag.add_vertex('a', 'b', 'c', 'd')
+    dag.add_edge('a', 'b', 'c')
+    dag.add_edge('b', 'd')
+    dag.add_edge('c', 'd')
+    order = dag.order
+    assert order[0] == 'a' and order[-1] == 'd'
+    assert dag.all_starts() == {'a'}
+    assert dag.all_terminals() == {'d'}
+    assert dag.predecessors('d') == {'b', 'c'}
+    assert dag.edge_size() == 4
+    with pytest.raises(DAGVertexNotFoundError):
+        dag.add_edge('e', 'a')
+    dag.add_edge('d', 'b')
+    with pytest.raises(DAGCycleError, match='b -> d -> b|d -> b -> d'):
+        dag.compile()
+
+
+def test_run_dag():
+    for processor in [SequentialProcessor(), MultiThreadProcessor()]:
+        dag = CompiledDAG()
+        units = [f'unit{i}' for i in range(1000)]
+        dag.add_vertex('start', 'end', *units)
+        dag.add_edge('start', *units)
+        for unit in units:
+            dag.add_edge(unit, 'end')
+        executor = RecordExecutor()
+        completed = run_dag(dag, processor=processor, executor=executor)
+        assert completed[0] == 'start' and completed[-1] == 'end'
+        assert sorted(executor.executed) == sorted(completed)
+        assert len(completed) == 1002
@@ -0,0 +1,58 @@
+import pytest
+import pandas as pd
+from batch_framework.etl import DiffProcessor
+from batch_framework.diff import diff_tables, delta_tables, upsert_table
+from batch_framework.filesystem import LocalBackend
+from batch_framework.rdb import DuckDBBackend
+from batch_framework.storage import PandasStorage
+
+
+@pytest.fixture
+def fs():
+    return LocalBackend('./data/diff/')
+
+
+def test_diff_tables():
+    current = pd.DataFrame({'name': ['a', 'b', 'c'], 'value': [1, 2, 3]})
+    previous = pd.DataFrame({'name': ['b', 'c', 'd']})
+    result = diff_tables(current, previous, keys=['name'])
+    assert sorted(result['added'].column('name').to_pylist()) == ['a']
+    assert sorted(result['removed'].column('name').to_pylist()) == ['d']
+    assert sorted(result['unchanged'].column(
+        'name').to_pylist()) == ['b', 'c']
+    assert result['added'].column_names == ['name']
+
+
+def test_keyword_keys():
+    previous = pd.DataFrame({'from': [1, 2], 'to': [2, 3], 'score': [.5, .5]})
+    current = pd.DataFrame({'from': [2, 3], 'to': [3, 4], 'score': [.9, .5]})
+    delta = delta_tables(current, previous, keys=['from', 'to'])
+    assert delta['added'].to_pydict() == {'from': [3], 'to': [4], 'score': [.5]}
+    assert delta['removed'].to_pydict() == {'from': [1], 'to': [2]}
+    assert delta['changed'].to_pydict() == {'from': [2], 'to': [3], 'score': [.9]}
+    merged = upsert_table(previous, current, delta['removed'], keys=['from', 'to'])
+    assert merged.sort_by('from').to_pydict() == current.to_dict('list')
+
+
+def test_diff_processor(fs):
+    storage = PandasStorage(fs)
+    op = DiffProcessor('names', ['name'], DuckDBBackend(),
+                       input_fs=fs, output_fs=fs)
+    assert op.output_ids == ['names_added', 'names_removed', 'names_unchanged']
+    for id in op.input_ids + op.output_ids:
+        op.drop(id)
+        storage.drop(id + '_cache')
+    # First run: no previous version, all names are added
+    storage.upload(pd.DataFrame({'name': ['a', 'b']}), 'names')
+    op.execute()
+    assert sorted(storage.download('names_added').name) == ['a', 'b']
+    assert len(storage.download('names_removed')) == 0
+    # Second run: compare with the cache of the first run
+    storage.upload(pd.DataFrame({'name': ['b', 'c']}), 'names')
+    op.execute()
+    assert sorted(storage.download('names_added').name) == ['c']
+    assert sorted(storage.download('names_removed').name) == ['a']
+    assert sorted(storage.download('names_unchanged').name) == ['b']
+    for id in op.input_ids + op.output_ids:
+        op.drop(id)
+        storage.drop(id + '_cache')
@@ -1,10 +1,14 @@
 import pytest
-from batch_framework.etl import ETL, ETLGroup
+from batch_framework.etl import ETL, ETLGroup, ObjProcessor
+from batch_framework.filesystem import LocalBackend
+from batch_framework.storage import PandasStorage
 from paradag import DAG
-from paradag import DAGVertexNotFoundError
+from paradag import DAGVertexNotFoundError, VertexExecutionError
 from datetime import datetime
 import os
 import time
+import pandas as pd
+from typing import List
 
 
 class ETL1(ETL):
@@ -104,3 +108,103 @@ def test_group_execute():
         ETL1(data=data),
         ETL2(data=data))
     etl_group.execute()
+
+
+class CountStep(ObjProcessor):
+    def __init__(self, storage, input_ids, output_id, calls, fail=False):
+        self._input_ids = input_ids
+        self._output_id = output_id
+        self.calls = calls
+        self.fail = fail
+        super().__init__(storage, storage)
+
+    @property
+    def input_ids(self):
+        return self._input_ids
+
+    @property
+    def output_ids(self):
+        return [self._output_id]
+
+    def transform(self, inputs: List[pd.DataFrame],
+                  **kwargs) -> List[pd.DataFrame]:
+        self.calls.append(self._output_id)
+        assert not self.fail, 'failed on purpose'
+        return [pd.DataFrame({'a': [len(self.calls)]})]
+
+
+class ResumeGroup(ETLGroup):
+    @property
+    def input_ids(self):
+        return []
+
+    @property
+    def output_ids(self):
+        return ['resume_c']
+
+
+def test_group_resume():
+    storage = PandasStorage(LocalBackend('./data/resume/'))
+    journal_fs = LocalBackend('./data/resume_journal/')
+    journal_fs.drop_file('ResumeGroup_journal.json')
+    calls = []
+    step_c = CountStep(storage, ['resume_b'], 'resume_c', calls, fail=True)
+    group = ResumeGroup(
+        CountStep(storage, [], 'resume_a', calls),
+        CountStep(storage, ['resume_a'], 'resume_b', calls),
+        step_c
+    )
+    with pytest.raises(VertexExecutionError):
+        group.execute(sequential=True, resume=True, journal_fs=journal_fs)
+    assert calls == ['resume_a', 'resume_b', 'resume_c']
+    assert journal_fs.check_exists('ResumeGroup_journal.json')
+    step_c.fail = False
+    group.execute(sequential=True, resume=True, journal_fs=journal_fs)
+    assert calls == ['resume_a', 'resume_b', 'resume_c', 'resume_c']
+    assert not journal_fs.check_exists('ResumeGroup_journal.json')
+    assert storage.check_exists('resume_c')
+    assert not storage.check_exists('resume_b')
+    storage.drop('resume_c')
+
+
+class ChainGroup(ETLGroup):
+    @property
+    def input_ids(self):
+        return []
+
+    @property
+    def output_ids(self):
+        return ['chain_c']
+
+
+class ExistStep(CountStep):
+    """Record which objects exist when the step runs"""
+
+    def __init__(self, storage, input_ids, output_id, calls, watch_ids):
+        self.watch_ids = watch_ids
+        self.seen = dict()
+        super().__init__(storage, input_ids, output_id, calls)
+
+    def transform(self, inputs: List[pd.DataFrame],
+                  **kwargs) -> List[pd.DataFrame]:
+        self.seen = dict([(id, self._input_storage.check_exists(id))
+                          for id in self.watch_ids])
+        return super().transform(inputs, **kwargs)
+
+
+def test_group_early_drop():
+    storage = PandasStorage(LocalBackend('./data/'))
+    calls = []
+    step_c = ExistStep(storage, ['chain_b'], 'chain_c', calls,
+                       watch_ids=['chain_a', 'chain_b'])
+    group = ChainGroup(
+        CountStep(storage, [], 'chain_a', calls),
+        CountStep(storage, ['chain_a'], 'chain_b', calls),
+        step_c
+    )
+    group.execute(sequential=True)
+    # chain_a is dropped once chain_b (its only consumer) is done
+    assert step_c.seen == {'chain_a': False, 'chain_b': True}
+    assert not storage.check_exists('chain_b')
+    assert storage.check_exists('chain_c')
+    storage.drop('chain_c')
@@ -1,10 +1,10 @@
 import pytest
 import os
-from typing import Dict
-from batch_framework.etl import SQLExecutor
+from typing import Dict, List
+from batch_framework.etl import ObjProcessor, SQLExecutor, ETLGroup, FusedSQLExecutor
 from batch_framework.rdb import DuckDBBackend
 from batch_framework.storage import PyArrowStorage, PandasStorage
-from batch_framework.filesystem import LocalBackend
+from batch_framework.filesystem import LocalBackend, VersionedBackend
 import pandas as pd
 
 
@@ -91,3 +91,233 @@ def test_execute(op, op_with_fs_input, op_with_fs_output):
             result = operator._output_storage.download('output3').to_pandas()
             pd.testing.assert_frame_equal(result, in_table)
             os.remove('./data/output3')
+
+
+def test_scan_inputs():
+    in_table = pd.DataFrame(
+        [[1, 2, 3]], columns=['a', 'b', 'c']
+    )
+    input_fs = VersionedBackend(LocalBackend('./data/versioned/'))
+    PandasStorage(input_fs).upload(in_table, 'input5')
+    PandasStorage(input_fs).upload(in_table, 'input6')
+    db = DuckDBBackend()
+    assert PyArrowStorage(input_fs).scan('input5', db) == \
+        "read_parquet('versionedbackend0://input5.parquet')"
+    output_fs = LocalBackend('./data/')
+    op = MyExecutor(rdb=db, input_fs=input_fs, output_fs=output_fs)
+    op.execute()
+    result = op._output_storage.download('output3').to_pandas()
+    pd.testing.assert_frame_equal(result, in_table)
+    assert PyArrowStorage(output_fs).scan('output3', db) == \
+        f"read_parquet('{os.path.abspath('./data/output3.parquet')}')"
+    input_fs.drop_file('input5.parquet')
+    input_fs.drop_file('input6.parquet')
+    input_fs.backend.drop_file('_manifest.json')
+    output_fs.drop_file('output3.parquet')
+
+
+def test_catalog_tables():
+    in_table = pd.DataFrame(
+        [[1, 2, 3]], columns=['a', 'b', 'c']
+    )
+    db = DuckDBBackend()
+    PandasStorage(db).upload(in_table, 'input5')
+    PandasStorage(db).upload(in_table, 'input6')
+    op = MyExecutor(rdb=db, input_fs=db, output_fs=db)
+    assert op._input_storage.scan('input5', db) == 'input5'
+    op.execute()
+    assert db.table_types()['output3'] == 'BASE TABLE'
+    result = op._output_storage.download('output3').to_pandas()
+    pd.testing.assert_frame_equal(result, in_table)
+
+
+def test_catalog_chain():
+    in_table = pd.DataFrame(
+        [[1, 2, 3]], columns=['a', 'b', 'c']
+    )
+    db = DuckDBBackend()
+    PandasStorage(db).upload(in_table, 'input5')
+
+    class Double(ObjProcessor):
+        @property
+        def input_ids(self):
+            return ['passed5']
+
+        @property
+        def output_ids(self):
+            return ['doubled5']
+
+        def transform(self, inputs: List[pd.DataFrame], **kwargs) -> List[pd.DataFrame]:
+            assert db.table_types()['passed5'] == 'BASE TABLE'
+            return [inputs[0] * 2]
+
+    class CatalogGroup(ETLGroup):
+        @property
+        def input_ids(self):
+            return ['input5']
+
+        @property
+        def external_input_ids(self):
+            return self.input_ids
+
+        @property
+        def output_ids(self):
+            return ['output3']
+
+    group = CatalogGroup(
+        PassExecutor(db, 'input5', 'passed5', input_fs=db, output_fs=db),
+        Double(PyArrowStorage(db), PyArrowStorage(db)),
+        PassExecutor(db, 'doubled5', 'output3', input_fs=db, output_fs=db))
+    group.execute(sequential=True)
+    # the outputs are native tables of the catalog and the internal ones are dropped
+    assert db.table_types() == {'input5': 'BASE TABLE', 'output3': 'BASE TABLE'}
+    result = PyArrowStorage(db).download('output3').to_pandas()
+    pd.testing.assert_frame_equal(result, in_table * 2)
+
+
+def test_sqls_generated_once():
+    class CountingExecutor(MyExecutor):
+        calls = 0
+
+        def sqls(self, **kwargs):
+            CountingExecutor.calls += 1
+            return super().sqls(**kwargs)
+
+    op = CountingExecutor(rdb=DuckDBBackend())
+    for _ in range(2):
+        PandasStorage(op._rdb).upload(pd.DataFrame([[1]], columns=['a']), 'input5')
+        PandasStorage(op._rdb).upload(pd.DataFrame([[2]], columns=['a']), 'input6')
+        op.execute()
+    assert CountingExecutor.calls == 1
+
+    class BrokenExecutor(MyExecutor):
+        def sqls(self, **kwargs):
+            return {'output3': 'SELECT * FRM input5'}
+
+    with pytest.raises(ValueError):
+        BrokenExecutor(rdb=DuckDBBackend())
+
+
+class PassExecutor(SQLExecutor):
+    def __init__(self, rdb, input_id, output_id, **kwargs):
+        self._input_id = input_id
+        self._output_id = output_id
+        super().__init__(rdb, **kwargs)
+
+    @property
+    def input_ids(self):
+        return [self._input_id]
+
+    @property
+    def output_ids(self):
+        return [self._output_id]
+
+    def sqls(self, **kwargs) -> Dict[str, str]:
+        return {self._output_id: f'SELECT * FROM {self._input_id}'}
+
+
+class FusionGroup(ETLGroup):
+    fuse_sql = True
+
+    @property
+    def input_ids(self):
+        return ['input5', 'input6']
+
+    @property
+    def external_input_ids(self):
+        return self.input_ids
+
+    @property
+    def output_ids(self):
+        return ['output3']
+
+
+def test_identity_copy():
+    in_table = pd.DataFrame(
+        [[1, 2, 3]], columns=['a', 'b', 'c']
+    )
+    input_fs = LocalBackend('./data/')
+    output_fs = VersionedBackend(LocalBackend('./data/versioned/'))
+    PandasStorage(input_fs).upload(in_table, 'input5')
+    op = PassExecutor(DuckDBBackend(), 'input5', 'passed5',
+                      input_fs=input_fs, output_fs=output_fs)
+    op.execute()
+    assert output_fs.download_core('passed5.parquet').getvalue() == \
+        input_fs.download_core('input5.parquet').getvalue()
+    input_fs.drop_file('input5.parquet')
+    output_fs.drop_file('passed5.parquet')
+    output_fs.backend.drop_file('_manifest.json')
+
+
+def test_fuse_sql_executors():
+    in_table = pd.DataFrame(
+        [[1, 2, 3]], columns=['a', 'b', 'c']
+    )
+    fs = LocalBackend('./data/')
+    PandasStorage(fs).upload(in_table, 'input5')
+    PandasStorage(fs).upload(in_table, 'input6')
+    db = DuckDBBackend()
+
+    class Union(MyExecutor):
+        @property
+        def input_ids(self):
+            return ['passed5', 'input6']
+
+        def sqls(self, **kwargs):
+            return {'output3': 'SELECT * FROM passed5 UNION SELECT * FROM input6'}
+    group = FusionGroup(
+        PassExecutor(db, 'input5', 'passed5', input_fs=fs, output_fs=fs),
+        Union(rdb=db, input_fs=fs, output_fs=fs))
+    units = [vertex for vertex in group.compiled_dag.order
+             if isinstance(vertex, SQLExecutor)]
+    assert len(units) == 1 and isinstance(units[0], FusedSQLExecutor)
+    assert 'passed5' not in group.compiled_dag.vertices()
+    group.execute(sequential=True)
+    assert not fs.check_exists('passed5.parquet')
+    result = PandasStorage(fs).download('output3')
+    pd.testing.assert_frame_equal(result, in_table)
+    for id in ['input5', 'input6', 'output3']:
+        fs.drop_file(id + '.parquet')
+
+
+def test_fused_hooks():
+    in_table = pd.DataFrame(
+        [[1, 2, 3]], columns=['a', 'b', 'c']
+    )
+    fs = LocalBackend('./data/')
+    PandasStorage(fs).upload(in_table, 'input5')
+    PandasStorage(fs).upload(in_table, 'input6')
+    db = DuckDBBackend()
+    calls = []
+
+    class HookedPass(PassExecutor):
+        def start(self, **kwargs):
+            calls.append('A.start')
+
+        def end(self, **kwargs):
+            calls.append('A.end')
+
+    class HookedUnion(MyExecutor):
+        @property
+        def input_ids(self):
+            return ['passed5', 'input6']
+
+        def sqls(self, **kwargs):
+            return {'output3': 'SELECT * FROM passed5 UNION SELECT * FROM input6'}
+
+        def start(self, **kwargs):
+            calls.append('B.start')
+
+        def end(self, **kwargs):
+            calls.append('B.end')
+
+    group = FusionGroup(
+        HookedPass(db, 'input5', 'passed5', input_fs=fs, output_fs=fs),
+        HookedUnion(rdb=db, input_fs=fs, output_fs=fs))
+    assert any([isinstance(vertex, FusedSQLExecutor)
+                for vertex in group.compiled_dag.order])
+    group.execute(sequential=True)
+    assert calls == ['A.start', 'B.start', 'A.end', 'B.end']
+    pd.testing.assert_frame_equal(PandasStorage(fs).download('output3'), in_table)
+    for id in ['input5', 'input6', 'output3']:
+        fs.drop_file(id + '.parquet')
@@ -1,8 +1,15 @@
 import pytest
 import pandas as pd
 import io
-from batch_framework.filesystem import DropboxBackend, LocalBackend
-from dropbox.exceptions import ApiError
+import os
+import threading
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from batch_framework.filesystem import DropboxBackend, DropboxMetadata, LocalBackend, VersionedBackend, StagingArea, TransferController
+from dropbox.exceptions import ApiError, RateLimitError
+from batch_framework.rdb import DuckDBBackend
+from batch_framework.fake_dropbox import FakeDropboxFS, FakeServer, fake_dropbox
 
 
 @pytest.fixture
@@ -15,6 +22,23 @@ def local():
     return LocalBackend('./data/')
 
 
+@pytest.fixture
+def fake_fs():
+    return fake_dropbox(FakeServer(latency=0, capacity=64))
+
+
+@pytest.fixture
+def fake_links(fake_fs, monkeypatch):
+    # temporary links of the fake dropbox are served by its client
+    monkeypatch.setattr('batch_framework.filesystem.requests.get', fake_fs.dbx.get)
+
+
+@pytest.fixture
+def fake(fake_fs):
+    return DropboxBackend('/bench', chunksize=1000, root_fs=fake_fs,
+                          staging=StagingArea('./data/staging/'))
+
+
 def test_upload_download_core(dropbox, local):
     for backend in [dropbox, local]:
         data = io.BytesIO()
@@ -32,3 +56,318 @@ def test_dropbox_file_not_exists(dropbox):
     assert not dropbox.check_exists('something-does-not-exist')
     dropbox.upload_core(io.BytesIO(), '123')
     assert dropbox.check_exists('123')
+
+
+def test_local_copy_snapshot(local):
+    data = io.BytesIO(b'version-1')
+    local.upload_core(data, 'snapshot.txt')
+    local.copy_files([('snapshot.txt', 'snapshot_cache.txt')])
+    assert local.download_core('snapshot_cache.txt').getvalue() == b'version-1'
+    local.upload_core(io.BytesIO(b'version-2'), 'snapshot.txt')
+    assert local.download_core('snapshot.txt').getvalue() == b'version-2'
+    assert local.download_core('snapshot_cache.txt').getvalue() == b'version-1'
+    local.drop_file('snapshot.txt')
+    local.drop_file('snapshot_cache.txt')
+
+
+def test_versioned_backend(local):
+    versioned = VersionedBackend(LocalBackend('./data/versioned/'), keep=2)
+    for version in [b'v1', b'v2', b'v3']:
+        versioned.upload_core(io.BytesIO(version), 'obj.txt')
+    assert versioned.download_core('obj.txt').getvalue() == b'v3'
+    assert versioned.resolve('obj.txt') == 'obj__v3.txt'
+    assert not versioned.backend.check_exists('obj__v1.txt')
+    versioned.copy_files([('obj.txt', 'obj_cache.txt')])
+    versioned.rollback('obj.txt')
+    assert versioned.download_core('obj.txt').getvalue() == b'v2'
+    assert versioned.download_core('obj_cache.txt').getvalue() == b'v3'
+    versioned.drop_file('obj.txt')
+    versioned.drop_file('obj_cache.txt')
+    assert not versioned.check_exists('obj.txt')
+    assert versioned.load_manifest() == dict()
+    assert not versioned.backend.check_exists('obj__v3.txt')
+    versioned.backend.drop_file('_manifest.json')
+
+
+def test_staging_area(local):
+    staging = StagingArea('./data/staging/', max_bytes=15)
+    local.upload_core(io.BytesIO(b'0123456789'), 'staged_a.txt')
+    local.upload_core(io.BytesIO(b'abcdefghij'), 'staged_b.txt')
+    path_a = staging.stage(local, 'staged_a.txt')
+    assert open(path_a, 'rb').read() == b'0123456789'
+    assert staging.stage(local, 'staged_a.txt') == path_a
+    staging.unpin(path_a)
+    staging.unpin(path_a)
+    path_b = staging.stage(local, 'staged_b.txt')
+    assert open(path_b, 'rb').read() == b'abcdefghij'
+    assert not os.path.exists(path_a)
+    staging.unpin(path_b)
+    local.drop_file('staged_a.txt')
+    local.drop_file('staged_b.txt')
+    os.remove(path_b)
+
+
+def test_staging_pins(local):
+    staging = StagingArea('./data/staging/', max_bytes=1)
+    pq.write_table(pa.table({'a': [1, 2, 3]}), local.local_path('staged_a.parquet'))
+    pq.write_table(pa.table({'b': [4, 5, 6]}), local.local_path('staged_b.parquet'))
+    path_a = staging.stage(local, 'staged_a.parquet')
+    lazy_a = pl.scan_parquet(path_a)
+    # staging another input does not evict the pinned one
+    path_b = staging.stage(local, 'staged_b.parquet')
+    assert lazy_a.collect()['a'].to_list() == [1, 2, 3]
+    # releasing a pinned file is deferred until it is unpinned
+    staging.release(local, 'staged_b.parquet')
+    assert os.path.exists(path_b)
+    staging.unpin(path_b)
+    assert not os.path.exists(path_b)
+    staging.unpin(path_a)
+    staging.evict()
+    assert not os.path.exists(path_a)
+    local.drop_file('staged_a.parquet')
+    local.drop_file('staged_b.parquet')
+
+
+@pytest.mark.parametrize('same_client', [True, False])
+def test_staging_shared_directory(fake_fs, same_client):
+    staging = StagingArea('./data/staging/')
+    other_fs = fake_fs if same_client else FakeDropboxFS(
+        fake_fs.server, skip_instance_cache=True)
+    writer = DropboxBackend('/bench', chunksize=1000, root_fs=fake_fs)
+    reader = DropboxBackend('/bench', chunksize=1000, root_fs=other_fs, staging=staging)
+    writer.upload_core(io.BytesIO(b'v1' * 1000), 'x.bin')
+    path_v1 = reader.stage('x.bin')
+    assert open(path_v1, 'rb').read() == b'v1' * 1000
+    reader.unpin(path_v1)
+    # the copy of the former content is not handed out after a rewrite
+    writer.upload_core(io.BytesIO(b'v2' * 1000), 'x.bin')
+    path = reader.stage('x.bin')
+    assert open(path, 'rb').read() == b'v2' * 1000
+    reader.unpin(path)
+    reader.drop_file('x.bin')
+    os.remove(path_v1)
+    assert os.listdir('./data/staging/') == []
+
+
+def test_exists_many(local):
+    local.upload_core(io.BytesIO(b'a'), 'exists_a.txt')
+    assert local.exists_many(
+        ['exists_a.txt', 'exists_b.txt']) == [True, False]
+    versioned = VersionedBackend(LocalBackend('./data/versioned/'))
+    versioned.upload_core(io.BytesIO(b'a'), 'exists_a.txt')
+    assert versioned.exists_many(
+        ['exists_a.txt', 'exists_b.txt']) == [True, False]
+    versioned.drop_file('exists_a.txt')
+    versioned.backend.drop_file('_manifest.json')
+    local.drop_file('exists_a.txt')
+
+
+def test_transfer_controller():
+    transfer = TransferController(min_chunksize=10, max_chunksize=100,
+                                  initial_concurrency=2, max_concurrency=4, backoff=0)
+    assert transfer.chunksize_for(None) == 10
+    assert transfer.chunksize_for(100) == 25
+    assert transfer.chunksize_for(10000) == 100
+    with transfer.transfer() as token:
+        for _ in range(20):
+            transfer.run(token, lambda: None, 10)
+        assert transfer.concurrency == 4
+        attempts = []
+
+        def throttled():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise RateLimitError('request-id', None, backoff=0)
+            return 'done'
+        assert transfer.run(token, throttled, 10) == 'done'
+        # halved twice, then increased by the successful retry
+        assert transfer.concurrency == 2
+
+
+def test_transfer_fair_share():
+    transfer = TransferController(initial_concurrency=2, max_concurrency=2)
+    started = threading.Event()
+    release = threading.Event()
+    order = []
+    with transfer.transfer() as token_a, transfer.transfer() as token_b:
+        def hold():
+            started.set()
+            release.wait()
+        thread = threading.Thread(
+            target=transfer.run, args=(token_a, hold, 1))
+        thread.start()
+        started.wait()
+        # token_a may exceed its share only while token_b is not waiting
+        assert transfer._may_start(token_a)
+        transfer._waiting[token_b] += 1
+        assert not transfer._may_start(token_a)
+        assert transfer._may_start(token_b)
+        transfer._waiting[token_b] -= 1
+        transfer.run(token_b, lambda: order.append('b'), 1)
+        release.set()
+        thread.join()
+    assert order == ['b']
+
+
+def test_dedup_round_trip(fake):
+    data = os.urandom(20000)
+    fake.upload_core(io.BytesIO(data), 'obj.bin')
+    chunks = fake._chunks('obj.bin')
+    assert len(chunks) > 1
+    assert sum([size for _, size in chunks]) == len(data)
+    assert fake.download_core('obj.bin').getvalue() == data
+    assert fake.size('obj.bin') == len(data)
+
+
+def test_dedup_reupload(fake, fake_fs):
+    data = os.urandom(20000)
+    fake.upload_core(io.BytesIO(data), 'obj.bin')
+    before = set([name for name, _ in fake._chunks('obj.bin')])
+    written = fake_fs.server.written
+    edited = data[:10000] + b'a few new rows' + data[10000:]
+    fake.upload_core(io.BytesIO(edited), 'obj.bin')
+    after = set([name for name, _ in fake._chunks('obj.bin')])
+    # only the chunks around the edit are transferred again
+    assert len(before & after) > 0
+    assert fake_fs.server.written - written < len(edited) / 2
+    # the chunks no longer referenced are deleted
+    assert set(fake_fs.ls('/bench/obj', detail=False)) == set(
+        [f'/bench/obj/{name}' for name in after | {'_index.json'}])
+    assert fake.download_core('obj.bin').getvalue() == edited
+
+
+# content-defined chunks are up to 4 times the average size,
+# and the chunker buffers two of them and a block before cutting
+@pytest.mark.parametrize('dedup, limit', [
+    (False, 2 * 2 * 1000), (True, 2 * 2 * 4000 + 2 * 4000 + 1000)])
+def test_upload_stream_backpressure(dedup, limit):
+    fs = fake_dropbox(FakeServer(latency=0.005, capacity=64))
+    backend = DropboxBackend('/bench', root_fs=fs, dedup=dedup, transfer=TransferController(
+        min_chunksize=1000, initial_concurrency=2, max_concurrency=2))
+    ahead = []
+
+    def chunks():
+        for i in range(120):
+            # bytes produced ahead of the completed uploads
+            ahead.append((i + 1) * 1000 - fs.server.written)
+            yield os.urandom(1000)
+    backend.upload_stream(chunks(), 'obj.bin')
+    assert backend.size('obj.bin') == 120000
+    assert max(ahead) <= limit
+
+
+def test_dedup_copy_source_deleted(fake, fake_fs, monkeypatch, capsys):
+    data = os.urandom(5000)
+    fake.upload_core(io.BytesIO(data), 'a.bin')
+    copy = fake_fs.dbx.files_copy_v2
+
+    def copy_deleted(from_path, to_path):
+        # deleted by the upload of another backend since it was listed
+        fake_fs.rm(from_path)
+        return copy(from_path, to_path)
+    monkeypatch.setattr(fake_fs.dbx, 'files_copy_v2', copy_deleted)
+    fake.upload_core(io.BytesIO(data), 'b.bin')
+    assert fake.download_core('b.bin').getvalue() == data
+    assert '0 copied' in capsys.readouterr().out
+
+
+def test_read_numbered_chunks(fake, fake_fs):
+    fake_fs.mkdir('/bench/legacy')
+    parts = [b'0' * 1000, b'1' * 1000, b'2' * 500]
+    for i, part in enumerate(parts):
+        with fake_fs.open(f'/bench/legacy/{i}.bin', 'wb') as f:
+            f.write(part)
+    assert fake._chunks('legacy.bin') == [
+        ('0.bin', 1000), ('1.bin', 1000), ('2.bin', 500)]
+    assert fake.download_core('legacy.bin').getvalue() == b''.join(parts)
+
+
+def test_dropbox_metadata(fake_fs):
+    for path, content in [('/bench/a.txt', b'a'), ('/bench/dir/b.txt', b'bb'),
+                          ('/bench/dir/c.txt', b'ccc')]:
+        with fake_fs.open(path, 'wb') as f:
+            f.write(content)
+    metadata = DropboxMetadata(fake_fs.dbx, '/Bench/')
+    assert metadata.get('/bench/a.txt').size == 1
+    assert sorted([entry.name for entry in metadata.list_files('/bench/dir')]) == [
+        'b.txt', 'c.txt']
+    b_hash = metadata.get('/bench/dir/b.txt').content_hash
+    assert metadata.find(b_hash) == '/bench/dir/b.txt'
+    # later lookups only apply the changes listed from the cursor
+    fake_fs.dbx.files_list_folder = None
+    fake_fs.rm('/bench/dir')
+    with fake_fs.open('/bench/a.txt', 'wb') as f:
+        f.write(b'aaaa')
+    with fake_fs.open('/bench/d.txt', 'wb') as f:
+        f.write(b'd')
+    # the cache is kept until invalidated
+    assert metadata.get('/bench/dir/b.txt') is not None
+    assert metadata.get('/bench/d.txt') is None
+    metadata.invalidate()
+    # the content of a deleted folder is removed with it
+    assert metadata.get('/bench/dir') is None
+    assert metadata.get('/bench/dir/b.txt') is None
+    assert metadata.list_files('/bench/dir') == []
+    assert metadata.find(b_hash) is None
+    assert metadata.get('/bench/a.txt').size == 4
+    assert metadata.get('/BENCH/d.txt').size == 1
+    assert sorted([entry.name for entry in metadata.list_files('/bench')]) == [
+        'a.txt', 'd.txt']
+
+
+def test_read_range(fake, fake_fs, fake_links):
+    fake_fs.mkdir('/bench/legacy')
+    data = bytes(range(250)) * 10
+    for i in range(3):
+        with fake_fs.open(f'/bench/legacy/{i}.bin', 'wb') as f:
+            f.write(data[i * 1000: (i + 1) * 1000])
+    assert fake.read_range('legacy.bin', 10, 20) == data[10:20]
+    # spanning the three chunks
+    assert fake.read_range('legacy.bin', 990, 2010) == data[990:2010]
+    assert fake.read_range('legacy.bin', 2400, 2500) == data[2400:2500]
+    # expired links are requested again
+    fake_fs.dbx.links.clear()
+    assert fake.read_range('legacy.bin', 1500, 2500) == data[1500:2500]
+    fake.upload_core(io.BytesIO(data), 'dedup.bin')
+    assert fake.read_range('dedup.bin', 0, len(data)) == data
+    assert fake.read_range('dedup.bin', 777, 2222) == data[777:2222]
+
+
+@pytest.mark.parametrize('same_client', [True, False])
+def test_dropbox_shared_directory(fake_fs, fake_links, same_client):
+    # a second backend on the directory (of another process if not `same_client`)
+    other_fs = fake_fs if same_client else FakeDropboxFS(
+        fake_fs.server, skip_instance_cache=True)
+    writer = DropboxBackend('/bench', chunksize=1000, root_fs=fake_fs)
+    reader = DropboxBackend('/bench', chunksize=1000, root_fs=other_fs)
+    assert not reader.check_exists('x.parquet')
+    writer.upload_core(io.BytesIO(os.urandom(5000)), 'x.parquet')
+    assert reader.check_exists('x.parquet')
+    assert reader.exists_many(['x.parquet', 'y.parquet']) == [True, False]
+    assert reader.download_core('x.parquet').getvalue() == writer.download_core(
+        'x.parquet').getvalue()
+    # rewritten: the chunks listed by the reader are deleted
+    data = os.urandom(5000)
+    writer.upload_core(io.BytesIO(data), 'x.parquet')
+    assert reader.download_core('x.parquet').getvalue() == data
+    data = os.urandom(5000)
+    writer.upload_core(io.BytesIO(data), 'x.parquet')
+    assert reader.read_range('x.parquet', 100, 4900) == data[100:4900]
+
+
+def test_read_parquet_dropbox(fake, fake_fs, fake_links):
+    table = pa.table({'i': list(range(20000)), 's': [str(i) for i in range(20000)]})
+    buff = io.BytesIO()
+    pq.write_table(table, buff, row_group_size=5000)
+    fake.upload_core(buff, 'table.parquet')
+    assert len(fake._chunks('table.parquet')) > 1
+    db = DuckDBBackend()
+    path = db.path_of(fake, 'table.parquet')
+    result = db.execute(
+        f"SELECT i, s FROM read_parquet('{path}') WHERE i >= 12000 ORDER BY i").arrow()
+    assert result == table.slice(12000)
+    read = []
+    fake_fs.server.request = lambda nbytes: read.append(nbytes)
+    # projection reads only part of the file
+    assert db.execute(f"SELECT SUM(i) FROM read_parquet('{path}')").fetchone()[0] == sum(range(20000))
+    assert 0 < sum(read) < len(buff.getvalue())
@@ -0,0 +1,37 @@
+import os
+import importlib.util
+
+# load the module alone: the `graph` package imports the entity resolution dependencies
+_spec = importlib.util.spec_from_file_location('grouping_meta', os.path.join(
+    os.path.dirname(__file__), '..', 'examples', 'graph', 'group', 'meta.py'))
+grouping_meta = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(grouping_meta)
+
+
+def test_alter_input_node():
+    meta = grouping_meta.GroupingMeta(
+        node_grouping={'package': ['package', 'requirement'], 'license': ['license']},
+        link_grouping={'has_license': ['has_license']},
+        node_grouping_sqls={'package': 't0.node_id, t1.name'})
+    assert sorted(meta.input_nodes) == ['license', 'package', 'requirement']
+    sqls = meta.node_grouping_sqls
+    assert 'FROM license' in sqls['node_license_final']
+    meta.alter_input_node('license', 'licenseQ')
+    meta.alter_input_node('requirement', 'requirementQ')
+    # the derived properties reflect the alterations
+    assert sorted(meta.input_nodes) == ['licenseQ', 'package', 'requirementQ']
+    sqls = meta.node_grouping_sqls
+    assert 'FROM licenseQ' in sqls['node_license_final']
+    assert 'requirementQ' in sqls['node_package_final']
+    assert meta.output_nodes == ['node_package_final', 'node_license_final']
+
+
+def test_alter_input_link():
+    meta = grouping_meta.GroupingMeta(
+        node_grouping={'package': ['package']},
+        link_grouping={'has_license': ['has_license']})
+    assert meta.input_links == ['has_license']
+    assert 'FROM has_license' in meta.link_grouping_sqls['link_has_license_final']
+    meta.alter_input_link('has_license', 'has_licenseQ')
+    assert meta.input_links == ['has_licenseQ']
+    assert 'FROM has_licenseQ' in meta.link_grouping_sqls['link_has_license_final']
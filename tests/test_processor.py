@@ -5,13 +5,14 @@ TODO:
 """
 
 import pytest
-from batch_framework.etl import ObjProcessor
+from batch_framework.etl import ObjProcessor, IncrementalProcessor, Delta
 from typing import List
 import pandas as pd
+import pyarrow as pa
 import vaex as vx
 import os
 from batch_framework.filesystem import LocalBackend
-from batch_framework.storage import PandasStorage, VaexStorage
+from batch_framework.storage import PandasStorage, VaexStorage, convert, is_convertible
 
 
 class PDOperator(ObjProcessor):
@@ -111,3 +112,80 @@ def test_execute(pd_op, vx_op):
     os.remove('./data/input4')
     os.remove('./data/output1')
     os.remove('./data/output2')
+
+
+class IncOperator(IncrementalProcessor):
+    def __init__(self, *args, **kwargs):
+        self.processed = []
+        super().__init__(*args, **kwargs)
+
+    @property
+    def input_ids(self):
+        return ['inc_input']
+
+    @property
+    def output_ids(self):
+        return ['inc_output']
+
+    @property
+    def keys(self):
+        return {'inc_input': ['k'], 'inc_output': ['k']}
+
+    def transform(self, inputs: List[Delta[pd.DataFrame]],
+                  **kwargs) -> List[Delta[pd.DataFrame]]:
+        delta = inputs[0]
+        rows = pd.concat([delta.added, delta.changed])
+        self.processed.append(sorted(rows.k.tolist()))
+        rows['v'] = rows['v'] * 10
+        return [Delta(added=rows, removed=delta.removed,
+                      changed=rows.head(0))]
+
+
+def test_incremental_execute():
+    storage = PandasStorage(LocalBackend('./data/'))
+    for id in ['inc_input', 'inc_output']:
+        storage.drop(id)
+        storage.drop(id + '_cache')
+    op = IncOperator(storage)
+    assert op.get_input_type() == pd.DataFrame
+    storage.upload(pd.DataFrame({'k': [1, 2, 3], 'v': [1, 2, 3]}), 'inc_input')
+    op.execute()
+    storage.upload(pd.DataFrame({'k': [2, 3, 4], 'v': [2, 5, 4]}), 'inc_input')
+    op.execute()
+    assert op.processed == [[1, 2, 3], [3, 4]]
+    output = storage.download('inc_output').sort_values('k')
+    assert output.k.tolist() == [2, 3, 4]
+    assert output.v.tolist() == [20, 50, 40]
+    for id in ['inc_input', 'inc_output']:
+        storage.drop(id)
+        storage.drop(id + '_cache')
+
+
+class ArrowOperator(ObjProcessor):
+    @property
+    def input_ids(self):
+        return ['convert_input']
+
+    @property
+    def output_ids(self):
+        return ['convert_output']
+
+    def transform(self, inputs: List[pa.Table],
+                  **kwargs) -> List[pa.Table]:
+        return [inputs[0].append_column('b', pa.array([1, 1, 1]))]
+
+
+def test_convert_storage_type():
+    storage = PandasStorage(LocalBackend('./data/'))
+    storage.upload(pd.DataFrame({'a': [1, 2, 3]}), 'convert_input')
+    op = ArrowOperator(storage, VaexStorage(LocalBackend('./data/')))
+    op.execute()
+    result = storage.download('convert_output')
+    assert result['a'].tolist() == [1, 2, 3]
+    assert result['b'].tolist() == [1, 1, 1]
+    for id in ['convert_input', 'convert_output']:
+        storage.drop(id)
+    table = pa.table({'a': [1, 2]})
+    assert convert(table, pd.DataFrame)['a'].dtype == pd.ArrowDtype(pa.int64())
+    assert convert(convert(table, vx.DataFrame), pa.Table).equals(table)
+    assert not is_convertible(dict, pa.Table)
@@ -4,10 +4,11 @@ TODO:
 """
 import pytest
 from batch_framework.rdb import DuckDBBackend
-from batch_framework.filesystem import LocalBackend, DropboxBackend
+from batch_framework.filesystem import LocalBackend, DropboxBackend, VersionedBackend
 import pyarrow as pa
 from duckdb.duckdb import ConnectionException, CatalogException
 import os
+import shutil
 
 
 @pytest.fixture
@@ -89,3 +90,41 @@ def test_dropbox_persistent_commit():
     with pytest.raises(CatalogException):
         duckdb2.execute('select * from test2').arrow()
     os.remove(f'./{db_name}')
+
+
+def test_catalog_tables(duckdb):
+    in_table = pa.Table.from_pydict({'i': [1, 2, 3]})
+    duckdb.create_table('catalog_a', in_table)
+    assert duckdb.check_exists('catalog_a')
+    duckdb.copy('catalog_a', 'catalog_b')
+    assert duckdb.execute('select * from catalog_b').arrow() == in_table
+    duckdb.drop('catalog_a')
+    duckdb.drop('catalog_a')
+    assert not duckdb.check_exists('catalog_a')
+    assert duckdb.check_exists('catalog_b')
+
+
+def test_incremental_commit():
+    db_name = 'data/catalog.duckdb'
+    os.makedirs('./data/catalog_remote/data/catalog_export', exist_ok=True)
+    remote = VersionedBackend(LocalBackend('./data/catalog_remote/'))
+    duckdb = DuckDBBackend(persist_fs=remote, db_name=db_name)
+    duckdb.create_table('kept', pa.Table.from_pydict({'i': [1, 2]}))
+    duckdb.create_table('changed', pa.Table.from_pydict({'i': [1]}))
+    duckdb.commit()
+    manifest = remote.load_manifest()
+    duckdb.create_table('changed', pa.Table.from_pydict({'i': [1, 2, 3]}))
+    duckdb.commit()
+    duckdb.close()
+    # only the changed table is uploaded again
+    assert remote.load_manifest()['data/catalog_export/kept.parquet'] == \
+        manifest['data/catalog_export/kept.parquet']
+    assert remote.load_manifest()['data/catalog_export/changed.parquet'] != \
+        manifest['data/catalog_export/changed.parquet']
+    os.remove(f'./{db_name}')
+    duckdb2 = DuckDBBackend(persist_fs=remote, db_name=db_name)
+    assert duckdb2.execute('select count(*) from changed').fetchone()[0] == 3
+    assert duckdb2.execute('select count(*) from kept').fetchone()[0] == 2
+    duckdb2.close()
+    os.remove(f'./{db_name}')
+    shutil.rmtree('./data/catalog_remote')
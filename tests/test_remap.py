@@ -0,0 +1,90 @@
+import pyarrow as pa
+from batch_framework.etl import DictionaryEncoder
+from batch_framework.filesystem import LocalBackend
+from batch_framework.rdb import DuckDBBackend
+from batch_framework.storage import PyArrowStorage
+from batch_framework.remap import remap_macro_sql, remap_sql, IdRemapper
+
+
+def test_remap_sql():
+    db = DuckDBBackend()
+    storage = PyArrowStorage(db)
+    storage.upload(pa.table({
+        'messy_id': [1, 3, 5],
+        'new_id': [10, 30, 50]
+    }), 'mapping')
+    storage.upload(pa.table({
+        'from_id': [1, 2, 3],
+        'to_id': [5, 4, None],
+        'weight': [0.1, 0.2, 0.3]
+    }), 'link')
+    cursor = db.get_conn()
+    cursor.execute(remap_macro_sql('mapping'))
+    result = cursor.execute(
+        remap_sql('link', ['from_id', 'to_id'])).arrow().to_pydict()
+    assert result == {
+        'from_id': [10, 2, 30],
+        'to_id': [50, 4, None],
+        'weight': [0.1, 0.2, 0.3]
+    }
+
+
+def test_id_remapper():
+    table = pa.table({
+        'from_id': [1, 2, 3],
+        'to_id': [5, 4, None],
+        'weight': [0.1, 0.2, 0.3]
+    })
+    for mapping in [
+        pa.table({'messy_id': [5, 1, 3], 'new_id': [50, 10, 30]}),
+        pa.table({'messy_id': [5, 1, 3], 'new_id': [50, 10, 30]}).cast(
+            pa.schema([('messy_id', pa.int32()), ('new_id', pa.int64())]))
+    ]:
+        result = IdRemapper(mapping).remap(table, ['from_id', 'to_id'])
+        assert result.column_names == table.column_names
+        assert result.to_pydict() == {
+            'from_id': [10, 2, 30],
+            'to_id': [50, 4, None],
+            'weight': [0.1, 0.2, 0.3]
+        }
+    big = 2 ** 63 + 5
+    mapping = pa.table({'messy_id': pa.array([big, 7], pa.uint64()),
+                        'new_id': pa.array([1, 2], pa.uint64())})
+    result = IdRemapper(mapping).remap(
+        pa.table({'node_id': pa.array([7, big, big + 1, None], pa.uint64())}),
+        ['node_id'])
+    assert result.column('node_id').to_pylist() == [2, 1, big + 1, None]
+    mapping = pa.table({'messy_id': ['a', 'c'], 'new_id': ['x', 'y']})
+    result = IdRemapper(mapping).remap(
+        pa.table({'node_id': ['a', 'b', None, 'c']}), ['node_id'])
+    assert result.column('node_id').to_pylist() == ['x', 'b', None, 'y']
+    empty = pa.table({'messy_id': pa.array([], pa.int64()),
+                      'new_id': pa.array([], pa.int64())})
+    assert IdRemapper(empty).remap(table, ['from_id']).equals(table)
+
+
+def test_dictionary_encoder():
+    fs = LocalBackend('./data/')
+    storage = PyArrowStorage(fs)
+    op = DictionaryEncoder(
+        'ids', {'node': ['node_id'], 'link': ['from_id', 'to_id']},
+        DuckDBBackend(), input_fs=fs, output_fs=fs)
+    assert op.output_ids == ['node_encoded', 'link_encoded']
+    storage.drop('ids')
+    storage.upload(pa.table({'node_id': [30, 10], 'name': ['c', 'a']}), 'node')
+    storage.upload(pa.table({'from_id': [10], 'to_id': [20]}), 'link')
+    op.execute()
+    assert storage.download('ids').to_pydict() == {
+        'key': [10, 20, 30], 'id': [0, 1, 2]}
+    assert storage.download('node_encoded').to_pydict() == {
+        'node_id': [2, 0], 'name': ['c', 'a']}
+    assert storage.download('link_encoded').to_pydict() == {
+        'from_id': [0], 'to_id': [1]}
+    # Second run: existing keys keep their ids
+    storage.upload(pa.table({'node_id': [5, 30], 'name': ['e', 'c']}), 'node')
+    op.execute()
+    assert storage.download('node_encoded').to_pydict() == {
+        'node_id': [3, 2], 'name': ['e', 'c']}
+    assert storage.download('ids').num_rows == 4
+    for id in op.input_ids + op.output_ids + ['ids']:
+        storage.drop(id)
@@ -1,11 +1,20 @@
 import pytest
 import pandas as pd
 import vaex as vx
+import polars as pl
 import pyarrow as pa
-from batch_framework.filesystem import LocalBackend
+import pyarrow.parquet as pq
+import io
+import gc
+import time
+import threading
+from batch_framework.filesystem import LocalBackend, VersionedBackend
 from batch_framework.rdb import DuckDBBackend
 from batch_framework.storage import PandasStorage, VaexStorage, PyArrowStorage, JsonStorage
+from batch_framework.storage import conform_to_schema, parquet_chunks, WritePolicy
+from batch_framework.storage import ArrowIPCStorage, PolarsStorage, table_storage
 from datetime import datetime
+import json
 
 
 @pytest.fixture
@@ -50,3 +59,170 @@ def test_json_storage():
     js.upload(data, 'json_test.json')
     result = js.download('json_test.json')
     assert data == result
+
+
+def test_schema_storage():
+    schema = pa.schema([
+        ('name', pa.string()),
+        ('latest', pa.struct([
+            ('info', pa.struct([
+                ('version', pa.string()),
+                ('requires_dist', pa.list_(pa.string()))
+            ]))
+        ]))
+    ])
+    backend = LocalBackend('./data/')
+    in_table = pd.DataFrame({
+        'name': ['a', 'b'],
+        'latest': [
+            {'info': {'version': '1.0', 'requires_dist': ['x'], 'extra': 1}},
+            {'info': {'version': '2.0'}}
+        ]
+    })
+    PandasStorage(backend, schema=schema).upload(in_table, 'test_schema')
+    out_table = PyArrowStorage(backend, schema=schema).download('test_schema')
+    assert out_table.schema.equals(schema)
+    assert out_table.column('latest').to_pylist() == [
+        {'info': {'version': '1.0', 'requires_dist': ['x']}},
+        {'info': {'version': '2.0', 'requires_dist': None}}
+    ]
+    out_table = VaexStorage(backend, schema=schema).download('test_schema')
+    assert len(out_table) == 2
+    PyArrowStorage(backend).drop('test_schema')
+
+
+def test_conform_to_schema():
+    schema = pa.schema([
+        ('name', pa.string()),
+        ('info', pa.struct([('version', pa.string()), ('size', pa.int64())])),
+        ('etag', pa.string())
+    ])
+    legacy = pa.Table.from_pydict({
+        'name': ['a', 'b'],
+        'info': [json.dumps({'version': '1.0', 'size': 3}), None],
+        'unused': [1, 2]
+    })
+    result = conform_to_schema(legacy, schema)
+    assert result.schema.equals(schema)
+    assert result.column('info').to_pylist() == [
+        {'version': '1.0', 'size': 3}, None]
+    assert result.column('etag').to_pylist() == [None, None]
+
+
+def test_versioned_storage():
+    backend = VersionedBackend(LocalBackend('./data/versioned/'))
+    table = pd.DataFrame({'a': [1, 2, 3]})
+    for storage in [PandasStorage(backend), VaexStorage(backend)]:
+        PandasStorage(backend).upload(table, 'versioned')
+        storage.copy('versioned', 'versioned_cache')
+        assert storage.check_exists('versioned_cache')
+        result = storage.download('versioned_cache')
+        if isinstance(result, vx.DataFrame):
+            result = result.to_pandas_df()
+        pd.testing.assert_frame_equal(result, table)
+        storage.drop('versioned')
+        storage.drop('versioned_cache')
+        assert not storage.check_exists('versioned')
+    backend.backend.drop_file('_manifest.json')
+
+
+def test_parquet_chunks():
+    table = pa.table({'a': list(range(10000)), 'b': ['x'] * 10000})
+    chunks = list(parquet_chunks(table, 1024, row_group_size=1000))
+    assert all([len(chunk) == 1024 for chunk in chunks[:-1]])
+    parquet_file = pq.ParquetFile(io.BytesIO(b''.join(chunks)))
+    assert parquet_file.num_row_groups == 10
+    assert parquet_file.read().equals(table)
+
+
+def test_parquet_chunks_closed():
+    table = pa.table({'a': list(range(10000)), 'b': ['x'] * 10000})
+    before = set(threading.enumerate())
+    chunks = parquet_chunks(table, 1024, row_group_size=100)
+    assert len(next(chunks)) == 1024
+    time.sleep(0.2)
+    # the encoder waits for the consumer rather than encoding all the chunks
+    encoders = set(threading.enumerate()) - before
+    assert len(encoders) == 1 and encoders.pop().is_alive()
+    # and stops when the consumer is gone
+    chunks.close()
+    assert set(threading.enumerate()) - before == set()
+
+
+def test_write_policy():
+    backend = LocalBackend('./data/')
+    storage = PyArrowStorage(backend, policy=WritePolicy(
+        'zstd', compression_level=3, row_group_size=100))
+    storage.set_policy('write_policy_sorted', WritePolicy(
+        'lz4', sorting_columns=['a'], bloom_filter_columns=['a']))
+    table = pa.table({'a': list(range(1000))[::-1]})
+    storage.upload(table, 'write_policy')
+    storage.upload(table, 'write_policy_sorted')
+    parquet_file = pq.ParquetFile('./data/write_policy.parquet')
+    assert parquet_file.num_row_groups == 10
+    assert parquet_file.metadata.row_group(0).column(0).compression == 'ZSTD'
+    assert storage.download('write_policy').equals(table)
+    parquet_file = pq.ParquetFile('./data/write_policy_sorted.parquet')
+    assert parquet_file.metadata.row_group(0).column(0).compression == 'LZ4'
+    assert storage.download('write_policy_sorted').column(
+        'a').to_pylist() == list(range(1000))
+    storage.drop('write_policy')
+    storage.drop('write_policy_sorted')
+
+
+def test_auto_tune():
+    table = pa.table({'a': [str(i) * 50 for i in range(10000)]})
+    storage = PandasStorage(LocalBackend('./data/'))
+    policy = storage.tune_policy('auto_tune', table, bandwidth=1024)
+    assert policy.compression != 'none'
+    assert storage.get_policy('auto_tune') is policy
+    assert storage.get_policy('others').compression == 'snappy'
+
+
+def test_arrow_ipc_storage():
+    table = pa.table({'a': list(range(1000)), 'b': ['x'] * 1000})
+    temp_fs = LocalBackend('./data/ipc/', temporary=True)
+    storage = table_storage(temp_fs)
+    assert isinstance(storage, ArrowIPCStorage)
+    assert isinstance(table_storage(LocalBackend('./data/')), PyArrowStorage)
+    storage.upload(table, 'ipc')
+    assert storage.check_exists('ipc')
+    # measure the download only: buffers of earlier tests may be freed meanwhile
+    gc.collect()
+    before = pa.total_allocated_bytes()
+    result = storage.download('ipc')
+    assert pa.total_allocated_bytes() == before
+    assert result.equals(table)
+    lz4_storage = ArrowIPCStorage(temp_fs, compression='lz4')
+    lz4_storage.upload(table, 'ipc_lz4')
+    assert lz4_storage.download('ipc_lz4').equals(table)
+    storage.drop('ipc')
+    storage.drop('ipc_lz4')
+    assert not storage.check_exists('ipc')
+
+
+def test_polars_storage():
+    storage = PolarsStorage(LocalBackend('./data/'))
+    frame = pl.DataFrame({'a': [3, 1, 2], 'b': ['x', 'y', 'z']}).lazy()
+    storage.upload(frame.filter(pl.col('a') > 1), 'polars')
+    result = storage.download('polars')
+    assert isinstance(result, pl.LazyFrame)
+    assert result.sort('a').collect()['a'].to_list() == [2, 3]
+    schema_storage = PolarsStorage(LocalBackend('./data/'), schema=pa.schema(
+        [('a', pa.int64()), ('c', pa.string())]))
+    schema_storage.upload(frame, 'polars_schema')
+    assert schema_storage.download('polars_schema').collect().columns == ['a', 'c']
+    # sorting columns are applied by the streaming sink
+    storage.set_policy('polars_sorted', WritePolicy(sorting_columns=['a']))
+    storage.upload(frame, 'polars_sorted')
+    assert storage.download('polars_sorted').collect()['a'].to_list() == [1, 2, 3]
+    # options of columns fall back to the pyarrow writer
+    storage.set_policy('polars_bloom', WritePolicy(
+        use_dictionary=['b'], bloom_filter_columns=['b'], sorting_columns=['a']))
+    storage.upload(frame, 'polars_bloom')
+    metadata = pq.ParquetFile('./data/polars_bloom.parquet').metadata
+    assert metadata.row_group(0).sorting_columns == (pq.SortingColumn(0),)
+    assert 'RLE_DICTIONARY' in metadata.row_group(0).column(1).encodings
+    assert 'RLE_DICTIONARY' not in metadata.row_group(0).column(0).encodings
+    for id in ['polars', 'polars_schema', 'polars_sorted', 'polars_bloom']:
+        storage.drop(id)